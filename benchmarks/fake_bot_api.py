@@ -0,0 +1,178 @@
+# Локальная замена Telegram Bot API для нагрузочных тестов.
+# Поддерживает методы, которыми пользуется бот, отдает обновления через getUpdates,
+# добавляет настраиваемую задержку и с заданной вероятностью отвечает 429.
+import asyncio
+import itertools
+import json
+import random
+import time
+from collections import Counter
+
+import tornado.netutil
+import tornado.web
+from tornado.httpserver import HTTPServer
+
+BOT_USER = {"id": 1000000, "is_bot": True, "first_name": "BenchBot", "username": "bench_bot"}
+
+
+def user_dict(user_id: int) -> dict:
+    return {"id": user_id, "is_bot": False, "first_name": f"User{user_id}"}
+
+
+class FakeBotApi:
+    """
+    Состояние тестового сервера: очередь обновлений, счетчики вызовов,
+    параметры задержки и отказов.
+    """
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, rate_limit_probability: float = 0.0,
+                 retry_after: int = 1, seed: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit_probability = rate_limit_probability
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.calls: Counter[str] = Counter()
+        self.rate_limited: Counter[str] = Counter()
+        self._updates: list[dict] = []
+        self._update_ids = itertools.count(1)
+        self._new_updates = asyncio.Event()
+        self._message_ids = itertools.count(1)
+        # update_id -> время постановки в очередь (для подсчета сквозной задержки)
+        self.enqueued_at: dict[int, float] = {}
+        self._server: HTTPServer | None = None
+
+    # --- Обновления ---
+
+    def push_update(self, payload: dict) -> int:
+        """Ставит обновление в очередь getUpdates. Возвращает его update_id."""
+        update_id = next(self._update_ids)
+        self._updates.append({"update_id": update_id, **payload})
+        self.enqueued_at[update_id] = time.perf_counter()
+        self._new_updates.set()
+        return update_id
+
+    def push_command(self, user_id: int, text: str) -> int:
+        return self.push_update({"message": {
+            "message_id": next(self._message_ids), "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"}, "from": user_dict(user_id),
+            "text": text, "entities": [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}],
+        }})
+
+    def push_join(self, user_id: int, channel_id: int, via_bot_link: bool = True) -> int:
+        member = {
+            "chat": {"id": channel_id, "type": "channel", "title": f"Channel {channel_id}"},
+            "from": user_dict(user_id), "date": int(time.time()),
+            "old_chat_member": {"status": "left", "user": user_dict(user_id)},
+            "new_chat_member": {"status": "member", "user": user_dict(user_id)},
+        }
+        if via_bot_link:
+            member["invite_link"] = {
+                "invite_link": f"https://t.me/+bench{channel_id}", "creator": BOT_USER,
+                "creates_join_request": False, "is_primary": False, "is_revoked": False,
+            }
+        return self.push_update({"chat_member": member})
+
+    async def get_updates(self, offset: int, limit: int, timeout: float) -> list[dict]:
+        # Подтвержденные обновления (id < offset) больше не нужны
+        if offset:
+            self._updates = [update for update in self._updates if update["update_id"] >= offset]
+        if not self._updates and timeout > 0:
+            self._new_updates.clear()
+            try:
+                await asyncio.wait_for(self._new_updates.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self._updates[:limit]
+
+    # --- Ответы методов ---
+
+    def _message(self, chat_id, text: str | None = None) -> dict:
+        message = {"message_id": next(self._message_ids), "date": int(time.time()),
+                   "chat": {"id": int(chat_id), "type": "private"}}
+        if text is not None:
+            message["text"] = text
+        return message
+
+    async def call(self, method: str, params: dict):
+        """Выполняет метод Bot API. Возвращает (HTTP-код, тело ответа)."""
+        self.calls[method] += 1
+        if method != "getUpdates":
+            if self.latency or self.jitter:
+                await asyncio.sleep(self.latency + self.random.uniform(0, self.jitter))
+            if self.rate_limit_probability and self.random.random() < self.rate_limit_probability:
+                self.rate_limited[method] += 1
+                return 429, {"ok": False, "error_code": 429,
+                             "description": f"Too Many Requests: retry after {self.retry_after}",
+                             "parameters": {"retry_after": self.retry_after}}
+        handler = getattr(self, f"_api_{method}", None)
+        if handler is None:
+            # Служебные методы (setMyCommands, deleteWebhook, answerCallbackQuery, ...)
+            return 200, {"ok": True, "result": True}
+        return 200, {"ok": True, "result": await handler(params)}
+
+    async def _api_getMe(self, params):
+        return BOT_USER
+
+    async def _api_getUpdates(self, params):
+        return await self.get_updates(int(params.get("offset", 0) or 0), int(params.get("limit", 100) or 100),
+                                      float(params.get("timeout", 0) or 0))
+
+    async def _api_sendMessage(self, params):
+        return self._message(params["chat_id"], params.get("text"))
+
+    async def _api_copyMessage(self, params):
+        return {"message_id": next(self._message_ids)}
+
+    async def _api_sendMediaGroup(self, params):
+        media = json.loads(params.get("media", "[]"))
+        return [self._message(params["chat_id"]) for _ in media]
+
+    async def _api_getChatMember(self, params):
+        user_id = int(params["user_id"])
+        # Детерминированно: каждый второй пользователь подписан
+        status = "member" if user_id % 2 else "left"
+        return {"status": status, "user": user_dict(user_id)}
+
+    async def _api_createChatInviteLink(self, params):
+        return {"invite_link": f"https://t.me/+bench{params['chat_id']}_{next(self._message_ids)}",
+                "creator": BOT_USER, "creates_join_request": False, "is_primary": False, "is_revoked": False}
+
+    # --- HTTP-сервер ---
+
+    async def start(self, port: int = 0, address: str = "127.0.0.1") -> str:
+        """Запускает сервер и возвращает его адрес (для BOT_API_BASE_URL)."""
+        app = tornado.web.Application([(r"/bot[^/]+/(\w+)", _ApiHandler, {"api": self})])
+        self._server = HTTPServer(app)
+        sockets = tornado.netutil.bind_sockets(port, address)
+        self._server.add_sockets(sockets)
+        return f"http://{address}:{sockets[0].getsockname()[1]}"
+
+    async def stop(self):
+        # Отпускаем висящий long polling, чтобы соединение закрылось без ошибок
+        self._new_updates.set()
+        if self._server is not None:
+            self._server.stop()
+            await self._server.close_all_connections()
+            self._server = None
+
+
+class _ApiHandler(tornado.web.RequestHandler):
+    def initialize(self, api: FakeBotApi):
+        self.api = api
+
+    def check_xsrf_cookie(self):
+        pass
+
+    def _params(self) -> dict:
+        if self.request.headers.get("Content-Type", "").startswith("application/json") and self.request.body:
+            return json.loads(self.request.body)
+        return {key: self.get_body_argument(key) for key in self.request.body_arguments}
+
+    async def post(self, method: str):
+        status, body = await self.api.call(method, self._params())
+        self.set_status(status)
+        self.set_header("Content-Type", "application/json")
+        self.finish(json.dumps(body))
+
+    get = post
@@ -0,0 +1,262 @@
+# Нагрузочные сценарии: настоящее приложение из bot.py работает против локального
+# тестового Bot API (benchmarks/fake_bot_api.py) и временной БД.
+#
+#   python -m benchmarks.run                      # все сценарии
+#   python -m benchmarks.run --scenario start --users 5000 --latency 0.02
+#   python -m benchmarks.run --rate-limit-probability 0.01 --json bench.json
+#
+# Для каждого сценария выводятся: число элементов, длительность, пропускная способность,
+# p50/p99 задержки и число вызовов Bot API по методам. Ограничители скорости бота по
+# умолчанию подняты, чтобы измерялся код бота, а не лимиты Telegram (--respect-limits
+# оставляет настройки из окружения).
+import argparse
+import asyncio
+import json
+import logging
+import os
+import socket
+import statistics
+import sys
+import tempfile
+import time
+from collections import Counter
+from dataclasses import dataclass, asdict, field
+
+# Каналы тестовой конфигурации
+BENCH_CHANNEL_IDS = ["-1001000000001", "-1001000000002"]
+ADMIN_CHAT_ID = 999999999
+
+SCENARIOS = ("start", "join", "broadcast", "sync")
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _configure_environment(args: argparse.Namespace, port: int):
+    """Переменные окружения читаются config.py при импорте, поэтому задаются до импорта бота."""
+    os.environ["BOT_API_BASE_URL"] = f"http://127.0.0.1:{port}"
+    os.environ.setdefault("BOT_TOKEN", "123456:bench")
+    os.environ["SUPER_ADMIN_ID"] = str(ADMIN_CHAT_ID)
+    os.environ["GROUP_ID_LIVE"], os.environ["GROUP_ID_BUY"] = BENCH_CHANNEL_IDS
+    for name in ("GROUP_ID_SELL", "GROUP_ID_DETAILING"):
+        os.environ[name] = ""
+    os.environ["SYNC_DAILY_TIME"] = ""
+    os.environ["METRICS_ENABLED"] = "0"
+    if not args.respect_limits:
+        for name in ("OUTBOUND_RATE_LIMIT", "BROADCAST_RATE_LIMIT", "SYNC_RATE_LIMIT", "COMMANDS_RATE_LIMIT"):
+            os.environ[name] = "1000000"
+
+
+@dataclass
+class ScenarioResult:
+    name: str
+    items: int
+    duration: float
+    throughput: float
+    p50_ms: float | None
+    p99_ms: float | None
+    api_calls: dict = field(default_factory=dict)
+    rate_limited: dict = field(default_factory=dict)
+
+    def render(self) -> str:
+        latency = (
+            f"p50 {self.p50_ms:.1f} мс, p99 {self.p99_ms:.1f} мс"
+            if self.p50_ms is not None else "задержка —"
+        )
+        calls = ", ".join(f"{method}={count}" for method, count in sorted(self.api_calls.items())) or "—"
+        text = (
+            f"[{self.name}] {self.items} за {self.duration:.2f} с — {self.throughput:.0f}/с, {latency}\n"
+            f"    вызовы API: {calls}"
+        )
+        if self.rate_limited:
+            text += "\n    ответы 429: " + ", ".join(f"{m}={c}" for m, c in sorted(self.rate_limited.items()))
+        return text
+
+
+def _percentiles(samples: list[float]) -> tuple[float | None, float | None]:
+    if len(samples) < 2:
+        return (samples[0] * 1000, samples[0] * 1000) if samples else (None, None)
+    cuts = statistics.quantiles(samples, n=100, method='inclusive')
+    return cuts[49] * 1000, cuts[98] * 1000
+
+
+async def run_benchmarks(args: argparse.Namespace) -> list[ScenarioResult]:
+    # Импорты после настройки окружения
+    from telegram import Update
+    from telegram.request import HTTPXRequest
+
+    import bot
+    from config import UPDATE_CONCURRENCY, UPDATE_MAX_PENDING
+    from services import database
+    from services.async_database import run_in_db_thread, create_broadcast_job, write_buffer
+    from services.broadcast import start_broadcast_job
+    from services.sync import run_subscriber_sync
+    from services.update_processor import PerChatUpdateProcessor
+
+    from benchmarks.fake_bot_api import FakeBotApi
+
+    class MeasuredUpdateProcessor(PerChatUpdateProcessor):
+        """Запоминает момент окончания обработки каждого обновления."""
+
+        def __init__(self, *a, **kw):
+            super().__init__(*a, **kw)
+            self.completed: dict[int, float] = {}
+
+        async def do_process_update(self, update, coroutine):
+            try:
+                await super().do_process_update(update, coroutine)
+            finally:
+                if isinstance(update, Update):
+                    self.completed[update.update_id] = time.perf_counter()
+
+    class RecordingRequest(HTTPXRequest):
+        """Запоминает время каждого запроса к Bot API по методу."""
+
+        def __init__(self, *a, **kw):
+            super().__init__(*a, **kw)
+            self.durations: dict[str, list[float]] = {}
+
+        async def do_request(self, url, method, *a, **kw):
+            started = time.perf_counter()
+            try:
+                return await super().do_request(url, method, *a, **kw)
+            finally:
+                self.durations.setdefault(url.rsplit('/', 1)[-1], []).append(time.perf_counter() - started)
+
+    api = FakeBotApi(latency=args.latency, jitter=args.jitter, rate_limit_probability=args.rate_limit_probability)
+    await api.start(port=args.port)
+
+    database.DB_NAME = os.path.join(args.workdir, "bench.db")
+    database.init_db()
+    processor = MeasuredUpdateProcessor(UPDATE_CONCURRENCY, UPDATE_MAX_PENDING)
+    request = RecordingRequest(connection_pool_size=256)
+    application = bot.build_application(update_processor=processor, request=request)
+
+    await application.initialize()
+    await application.post_init(application)
+    await application.updater.start_polling(poll_interval=0, timeout=5, allowed_updates=Update.ALL_TYPES)
+    await application.start()
+
+    def snapshot():
+        return Counter(api.calls), Counter(api.rate_limited)
+
+    def result(name: str, items: int, started: float, before, latencies: list[float]) -> ScenarioResult:
+        duration = time.perf_counter() - started
+        calls, limited = snapshot()
+        calls.subtract(before[0])
+        limited.subtract(before[1])
+        calls.pop("getUpdates", None)
+        p50, p99 = _percentiles(latencies)
+        return ScenarioResult(
+            name, items, duration, items / duration if duration else 0.0, p50, p99,
+            {k: v for k, v in calls.items() if v > 0}, {k: v for k, v in limited.items() if v > 0},
+        )
+
+    async def wait_processed(update_ids: list[int]) -> list[float]:
+        """Ждет обработки обновлений и возвращает их сквозные задержки."""
+        deadline = time.monotonic() + args.timeout
+        while any(update_id not in processor.completed for update_id in update_ids):
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Обработано {sum(u in processor.completed for u in update_ids)} из {len(update_ids)}")
+            await asyncio.sleep(0.01)
+        return [processor.completed[u] - api.enqueued_at[u] for u in update_ids]
+
+    async def seed_users(count: int):
+        page = 10000
+        for start in range(1, count + 1, page):
+            users = [(user_id, None, f"User{user_id}") for user_id in range(start, min(start + page, count + 1))]
+            await run_in_db_thread(database.apply_write_batch, users, [], [])
+
+    async def scenario_start() -> ScenarioResult:
+        before, started = snapshot(), time.perf_counter()
+        ids = [api.push_command(user_id, "/start") for user_id in range(1, args.users + 1)]
+        return result("start", len(ids), started, before, await wait_processed(ids))
+
+    async def scenario_join() -> ScenarioResult:
+        before, started = snapshot(), time.perf_counter()
+        ids = [
+            api.push_join(user_id, int(BENCH_CHANNEL_IDS[user_id % len(BENCH_CHANNEL_IDS)]))
+            for user_id in range(1, args.users + 1)
+        ]
+        latencies = await wait_processed(ids)
+        # Записи подписок уходят в БД отложенно — учитываем и их
+        await write_buffer.flush()
+        return result("join", len(ids), started, before, latencies)
+
+    async def scenario_broadcast() -> ScenarioResult:
+        await seed_users(args.broadcast_users)
+        request.durations.clear()
+        before, started = snapshot(), time.perf_counter()
+        job_id = await create_broadcast_job(ADMIN_CHAT_ID, 'all', {'type': 'copy', 'from_chat_id': ADMIN_CHAT_ID, 'message_id': 1})
+        await start_broadcast_job(application.bot, job_id)
+        recipients = (await run_in_db_thread(database.get_broadcast_job, job_id))['success_count']
+        return result("broadcast", recipients, started, before, request.durations.get("copyMessage", []))
+
+    async def scenario_sync() -> ScenarioResult:
+        await seed_users(args.sync_users)
+        request.durations.clear()
+        before, started = snapshot(), time.perf_counter()
+        sync_result = await run_subscriber_sync(application.bot, BENCH_CHANNEL_IDS)
+        return result("sync", sync_result.checked, started, before, request.durations.get("getChatMember", []))
+
+    scenarios = {
+        "start": scenario_start,
+        "join": scenario_join,
+        "broadcast": scenario_broadcast,
+        "sync": scenario_sync,
+    }
+    results = []
+    try:
+        for name in args.scenario:
+            scenario_result = await scenarios[name]()
+            print(scenario_result.render(), flush=True)
+            results.append(scenario_result)
+    finally:
+        await application.updater.stop()
+        await application.stop()
+        await application.shutdown()
+        await application.post_shutdown(application)
+        await api.stop()
+    return results
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Нагрузочные сценарии бота против локального Bot API.")
+    parser.add_argument("--scenario", action="append", choices=SCENARIOS + ("all",),
+                        help="сценарий (можно несколько раз); по умолчанию все")
+    parser.add_argument("--users", type=int, default=2000, help="обновлений в сценариях start и join")
+    parser.add_argument("--broadcast-users", type=int, default=100000, help="получателей рассылки")
+    parser.add_argument("--sync-users", type=int, default=5000, help="пользователей для полной синхронизации")
+    parser.add_argument("--latency", type=float, default=0.0, help="задержка ответа Bot API, с")
+    parser.add_argument("--jitter", type=float, default=0.0, help="случайная добавка к задержке, с")
+    parser.add_argument("--rate-limit-probability", type=float, default=0.0, help="вероятность ответа 429")
+    parser.add_argument("--respect-limits", action="store_true", help="не поднимать лимиты скорости бота")
+    parser.add_argument("--timeout", type=float, default=600.0, help="предельное время сценария, с")
+    parser.add_argument("--port", type=int, default=0, help="порт тестового Bot API (0 — свободный)")
+    parser.add_argument("--json", help="сохранить результаты в JSON-файл")
+    args = parser.parse_args(argv)
+    if not args.scenario or "all" in args.scenario:
+        args.scenario = list(SCENARIOS)
+    return args
+
+
+def main(argv: list[str] | None = None):
+    args = parse_args(argv)
+    args.port = args.port or _free_port()
+    _configure_environment(args, args.port)
+    logging.basicConfig(format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.WARNING)
+    # Ответы 429 тестового сервера — ожидаемая часть сценария, а не предупреждение
+    logging.getLogger("tornado.access").setLevel(logging.ERROR)
+    with tempfile.TemporaryDirectory(prefix="bot-bench-") as workdir:
+        args.workdir = workdir
+        results = asyncio.run(run_benchmarks(args))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump([asdict(r) for r in results], f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
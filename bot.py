@@ -1,74 +1,107 @@
+import asyncio
 import logging
-from telegram.ext import Application, CommandHandler, ChatMemberHandler, filters
-from telegram import BotCommand, BotCommandScopeChat
+from telegram.ext import Application, BaseUpdateProcessor, CommandHandler, ChatMemberHandler, filters
+from telegram.request import BaseRequest
 
 # Импортируем все необходимые компоненты
-from config import TOKEN, SUPER_ADMIN_ID
-from services.database import init_db, get_all_admins
+from config import TOKEN, BOT_MODE, BOT_API_BASE_URL, UPDATE_CONCURRENCY, UPDATE_MAX_PENDING
+from services.database import init_db
+from services.async_database import admin_cache, close_db
+from services.broadcast import resume_broadcast_jobs, stop_broadcast_jobs
+from services.invite_links import prune_invite_links
+from services.update_processor import PerChatUpdateProcessor
+from services.outbound import outbound_scheduler
+from services.commands import sync_admin_commands
+from services.metrics import instrument_application, make_request, start_metrics_server, stop_metrics_server
+from services.profiling import stall_monitor
 from filters.custom_filters import is_admin  # <-- Импортируем наш новый динамический фильтр
 from handlers.start import start
 from handlers.admin import admin_handler
-from handlers.errors import error_handler
-from handlers.members import track_channel_members
+from handlers.errors import error_handler, schedule_error_digest
+from handlers.members import track_channel_members, member_events
 from handlers.admin_management import manage_admins_handler
+from handlers.sync import sync_status_handler, sync_cancel_handler, schedule_subscriber_sync
+from handlers.profiling import profile_handler
+from handlers.inline_calculator import inline_calculator_handler
 
 async def post_init(application: Application):
     """
     Выполняется один раз при запуске бота.
-    1. Очищает кэш ссылок-приглашений, чтобы подхватить изменения из .env.
-    2. Устанавливает команды для всех админов и супер-админа.
+    0. Загружает кэш администраторов (фильтрам не придется читать БД в цикле событий).
+    1. Удаляет сохраненные ссылки-приглашения каналов, убранных из .env.
+    2. Устанавливает команды для админов и супер-админа (только изменившиеся).
+    3. Возобновляет рассылки, прерванные перезапуском.
+    4. Запускает эндпоинт метрик (если включен).
+    5. Запускает монитор блокировок цикла событий.
     """
     logger = logging.getLogger(__name__)
 
-    # --- 1. Очистка кэша ссылок-приглашений ---
-    # Это гарантирует, что при каждом перезапуске бот будет создавать свежие
-    # ссылки на основе актуального .env файла, решая проблему "старых" ссылок.
-    logger.info("Очистка кэша ссылок-приглашений...")
-    # Ключами в кэше являются ID каналов (строки вида "-100...").
-    keys_to_clear = [key for key in application.bot_data if isinstance(key, str) and key.startswith('-100')]
-    for key in keys_to_clear:
-        del application.bot_data[key]
-    logger.info(f"Кэш ссылок очищен. Удалено ключей: {len(keys_to_clear)}.")
+    # --- 0. Кэш администраторов ---
+    await admin_cache.refresh()
+
+    # --- 1. Очистка ссылок-приглашений удаленных каналов ---
+    # Ссылки хранятся в БД и переживают перезапуск; ссылки каналов с измененной
+    # записью в конфигурации пересоздаются при первом обращении.
+    removed = await prune_invite_links()
+    if removed:
+        logger.info(f"Удалено ссылок-приглашений каналов, убранных из конфигурации: {removed}.")
     
     # --- 2. Установка команд ---
+    # Запросы отправляются только для чатов, у которых изменился набор команд
     logger.info("Установка команд для администраторов...")
-    admin_commands = [BotCommand("admin", "Открыть панель администратора")]
-    # Предполагаем, что команда для управления админами - /manage_admins
-    super_admin_commands = admin_commands + [
-        BotCommand("manage_admins", "Управление администраторами"),
-    ]
-
-    # Установка команд для супер-админа
-    if SUPER_ADMIN_ID:
-        try:
-            await application.bot.set_my_commands(super_admin_commands, scope=BotCommandScopeChat(chat_id=SUPER_ADMIN_ID))
-            logger.info(f"Команды для супер-админа {SUPER_ADMIN_ID} установлены.")
-        except Exception as e:
-            logger.warning(f"Не удалось установить команды для супер-админа {SUPER_ADMIN_ID}: {e}")
-
-    # Установка команд для обычных админов из БД
-    for admin_id in get_all_admins():
-        # Сравниваем как строки, чтобы избежать проблем с типами данных (int из БД и str из .env)
-        if str(admin_id) == str(SUPER_ADMIN_ID): continue # Не перезаписываем команды для супер-админа
-        try:
-            await application.bot.set_my_commands(admin_commands, scope=BotCommandScopeChat(chat_id=admin_id))
-        except Exception as e:
-            logger.warning(f"Не удалось установить команды для админа {admin_id}: {e}")
+    await sync_admin_commands(application.bot)
 
-def main() -> None:
-    """Запускает бота."""
-    # Настройка логирования для вывода информации в консоль
-    logging.basicConfig(
-        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO
-    )
-    logger = logging.getLogger(__name__)
+    # --- 3. Возобновление незавершенных рассылок ---
+    resumed = await resume_broadcast_jobs(application.bot)
+    if resumed:
+        logger.info(f"Возобновлено незавершенных рассылок: {resumed}.")
 
-    # Инициализация базы данных
-    init_db()
+    # --- 4. Эндпоинт метрик ---
+    await start_metrics_server()
 
-    # Создание экземпляра бота
-    # Добавляем post_init для установки команд при старте
-    application = Application.builder().token(TOKEN).post_init(post_init).build()
+    # --- 5. Поиск блокировок цикла событий ---
+    stall_monitor.start()
+
+async def post_shutdown(application: Application):
+    """
+    Выполняется при остановке бота: останавливает монитор и эндпоинт метрик, прием событий
+    каналов, прерывает рассылки (они продолжатся после перезапуска) и закрывает соединение
+    с базой данных (с записью накопленных изменений).
+    """
+    stall_monitor.stop()
+    await stop_metrics_server()
+    await member_events.close()
+    await stop_broadcast_jobs()
+    await close_db()
+
+def build_application(
+    update_processor: BaseUpdateProcessor | None = None,
+    request: BaseRequest | None = None,
+) -> Application:
+    """
+    Создает приложение и регистрирует все обработчики и фоновые задания.
+    Параметры позволяют подменить обработчик очереди обновлений и HTTP-клиент
+    (используется нагрузочными тестами в benchmarks/).
+    """
+    # Добавляем post_init для установки команд при старте и post_shutdown для закрытия БД.
+    # Обновления разных чатов обрабатываются параллельно, одного чата — по очереди.
+    builder = (
+        Application.builder()
+        .token(TOKEN)
+        .concurrent_updates(update_processor or PerChatUpdateProcessor(UPDATE_CONCURRENCY, UPDATE_MAX_PENDING))
+        # Все исходящие сообщения проходят через общий планировщик с приоритетами
+        .rate_limiter(outbound_scheduler)
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+    )
+    # Собственный сервер Bot API (или тестовый) вместо api.telegram.org
+    if BOT_API_BASE_URL:
+        builder = builder.base_url(f"{BOT_API_BASE_URL.rstrip('/')}/bot")
+    # При включенных метриках запросы к Bot API идут через измеряющий HTTP-клиент
+    request = request or make_request()
+    if request is not None:
+        builder = builder.request(request)
+    application = builder.build()
 
     # --- Регистрация обработчиков ---
     
@@ -90,10 +123,50 @@ def main() -> None:
 
     # Обработчик для управления администраторами (только для супер-админа)
     application.add_handler(manage_admins_handler)
-    
+
+    # Команды для контроля фоновой синхронизации подписчиков (только для админов)
+    application.add_handler(sync_status_handler)
+    application.add_handler(sync_cancel_handler)
+
+    # Профилирование работающего бота (только для админов)
+    application.add_handler(profile_handler)
+
+    # Inline-калькулятор комиссии: @bot 1500000 (только для админов; inline-режим включается в @BotFather)
+    application.add_handler(inline_calculator_handler)
+
+    # Ежедневная фоновая синхронизация подписчиков
+    schedule_subscriber_sync(application)
+
+    # Периодическая сводка повторяющихся ошибок для администраторов
+    schedule_error_digest(application)
+
+    # Метрики обработчиков (после регистрации всех обработчиков)
+    instrument_application(application)
+    return application
+
+def main() -> None:
+    """Запускает бота."""
+    # Настройка логирования для вывода информации в консоль
+    logging.basicConfig(
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO
+    )
+    logger = logging.getLogger(__name__)
+
+    # Инициализация базы данных
+    init_db()
+
+    # Создание экземпляра бота и регистрация обработчиков
+    application = build_application()
+
     # Запускаем бота
-    logger.info("Бот запущен...")
-    application.run_polling()
+    if BOT_MODE == "webhook":
+        # Импортируем здесь: режиму webhook нужен tornado из python-telegram-bot[webhooks]
+        from services.webhook import serve_webhook
+        logger.info("Бот запущен в режиме webhook...")
+        asyncio.run(serve_webhook(application))
+    else:
+        logger.info("Бот запущен...")
+        application.run_polling()
 
 if __name__ == "__main__":
     main()
@@ -14,6 +14,46 @@ if not TOKEN:
     # Это сообщение будет видно в логах systemd или screen
     raise ValueError("ОШИБКА: Токен бота не найден. Проверьте .env файл и имя переменной (должно быть BOT_TOKEN).")
 
+# --- Режим получения обновлений ---
+# "polling" (по умолчанию) или "webhook"
+BOT_MODE = os.getenv("BOT_MODE", "polling").lower()
+# Адрес сервера Bot API (например, собственного telegram-bot-api или тестового из benchmarks/).
+# Пустое значение — https://api.telegram.org
+BOT_API_BASE_URL = os.getenv("BOT_API_BASE_URL", "")
+# Публичный адрес бота за обратным прокси, например https://bot.example.com.
+# В режиме webhook без WEBHOOK_URL webhook в Telegram не регистрируется (для локальной проверки).
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+# Адрес и порт, на которых слушает встроенный HTTP-сервер
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "127.0.0.1")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+# Путь для обновлений от Telegram и путь проверки состояния
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram")
+WEBHOOK_HEALTH_PATH = os.getenv("WEBHOOK_HEALTH_PATH", "/health")
+# Секрет из заголовка X-Telegram-Bot-Api-Secret-Token (1-256 символов A-Z, a-z, 0-9, _ и -).
+# Если не задан, генерируется при каждом запуске.
+WEBHOOK_SECRET_TOKEN = os.getenv("WEBHOOK_SECRET_TOKEN", "")
+# Сколько одновременных соединений Telegram может открыть к webhook (1-100)
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40"))
+
+# --- Параллельная обработка обновлений ---
+# Сколько обработчиков может выполняться одновременно (обновления одного чата всегда идут по очереди)
+UPDATE_CONCURRENCY = int(os.getenv("UPDATE_CONCURRENCY", "32"))
+# Сколько обновлений может быть принято в работу одновременно, включая ожидающие очереди своего чата
+UPDATE_MAX_PENDING = int(os.getenv("UPDATE_MAX_PENDING", "512"))
+
+# --- Метрики ---
+# METRICS_ENABLED=1 включает сбор метрик и эндпоинт http://METRICS_LISTEN:METRICS_PORT/metrics (формат Prometheus)
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "0").lower() in ("1", "true", "yes")
+METRICS_LISTEN = os.getenv("METRICS_LISTEN", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))
+
+# Писать в лог стек, если цикл событий заблокирован дольше стольких секунд (0 — отключить)
+LOOP_STALL_THRESHOLD = float(os.getenv("LOOP_STALL_THRESHOLD", "0.5"))
+# Максимальная длительность сеанса профилирования /profile, секунды (в том числе для режима <N>u)
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "600"))
+# Максимальное число обновлений для /profile <N>u
+PROFILE_MAX_UPDATES = int(os.getenv("PROFILE_MAX_UPDATES", "100000"))
+
 # --- Конфигурация кнопок-ссылок для стартового меню ---
 # Формат: (GROUP_ID_from_env, "Текст кнопки", "Эмодзи")
 # Бот должен быть администратором в этих каналах с правом приглашения пользователей.
@@ -23,3 +63,75 @@ CHANNEL_BUTTONS_CONFIG = [
     (os.getenv("GROUP_ID_SELL"), "Продажа/помощь в продаже", "💸"),
     (os.getenv("GROUP_ID_DETAILING"), "BT Detailing Ставрополь", "✨"),
 ]
+
+# Сколько часов бот переиспользует созданную ссылку-приглашение, прежде чем создать новую.
+# Ссылки хранятся в БД и переживают перезапуск; при изменении записи канала в конфигурации создаются заново.
+INVITE_LINK_TTL = int(float(os.getenv("INVITE_LINK_TTL_HOURS", "168")) * 3600)
+
+# --- Исходящие сообщения ---
+# Общий лимит всех исходящих сообщений бота в секунду (лимит Telegram ~30/с).
+# При нехватке лимита первыми отправляются ответы пользователям, затем приветствия,
+# уведомления об ошибках и в последнюю очередь рассылка.
+OUTBOUND_RATE_LIMIT = float(os.getenv("OUTBOUND_RATE_LIMIT", "25"))
+# Минимальный интервал между фоновыми сообщениями в один чат, секунды (ответы пользователю не ждут)
+OUTBOUND_PER_CHAT_INTERVAL = float(os.getenv("OUTBOUND_PER_CHAT_INTERVAL", "1"))
+# Сколько раз повторять запрос после RetryAfter, прежде чем вернуть ошибку вызывающему коду
+OUTBOUND_MAX_RETRIES = int(os.getenv("OUTBOUND_MAX_RETRIES", "3"))
+
+# --- Настройки рассылки ---
+# Сколько сообщений рассылки может находиться «в полете» одновременно
+BROADCAST_CONCURRENCY = int(os.getenv("BROADCAST_CONCURRENCY", "10"))
+# Лимит скорости рассылки, сообщений в секунду (внутри общего лимита OUTBOUND_RATE_LIMIT)
+BROADCAST_RATE_LIMIT = float(os.getenv("BROADCAST_RATE_LIMIT", "25"))
+# Сколько раз повторять отправку одному пользователю после RetryAfter/сетевой ошибки
+BROADCAST_MAX_RETRIES = int(os.getenv("BROADCAST_MAX_RETRIES", "3"))
+# Как часто (через сколько получателей) сохранять прогресс рассылки в БД
+BROADCAST_CHECKPOINT_EVERY = int(os.getenv("BROADCAST_CHECKPOINT_EVERY", "100"))
+
+# --- Настройки синхронизации подписчиков ---
+# Сколько запросов get_chat_member выполняется одновременно
+SYNC_CONCURRENCY = int(os.getenv("SYNC_CONCURRENCY", "20"))
+# Общий лимит запросов get_chat_member в секунду (на все каналы вместе)
+SYNC_RATE_LIMIT = float(os.getenv("SYNC_RATE_LIMIT", "25"))
+# Сколько пользователей читать из БД и проверять за одну порцию
+SYNC_PAGE_SIZE = int(os.getenv("SYNC_PAGE_SIZE", "500"))
+# Как часто (в секундах) обновлять сообщение с прогрессом синхронизации
+SYNC_PROGRESS_INTERVAL = float(os.getenv("SYNC_PROGRESS_INTERVAL", "5"))
+# Инкрементальная синхронизация перепроверяет подписки, проверенные раньше, чем столько часов назад
+SYNC_MAX_AGE = int(float(os.getenv("SYNC_MAX_AGE_HOURS", "24")) * 3600)
+# Время ежедневной инкрементальной синхронизации (UTC, ЧЧ:ММ). Пустое значение отключает расписание.
+SYNC_DAILY_TIME = os.getenv("SYNC_DAILY_TIME", "03:00")
+
+# --- Отложенная запись пользователей и подписок в БД ---
+# Накопленные записи сбрасываются в БД раз в столько секунд...
+WRITE_BUFFER_FLUSH_INTERVAL = float(os.getenv("WRITE_BUFFER_FLUSH_INTERVAL", "1"))
+# ...или сразу, как только их накопится столько
+WRITE_BUFFER_MAX_SIZE = int(os.getenv("WRITE_BUFFER_MAX_SIZE", "500"))
+
+# --- Уведомления об ошибках ---
+# Как часто (в секундах) отправлять администраторам сводку повторяющихся ошибок
+ERROR_DIGEST_INTERVAL = float(os.getenv("ERROR_DIGEST_INTERVAL", "600"))
+# Сколько разных ошибок помнить для подсчета повторов
+ERROR_STORE_SIZE = int(os.getenv("ERROR_STORE_SIZE", "200"))
+# Максимальная длина одного сообщения об ошибке (лимит Telegram — 4096 символов)
+ERROR_REPORT_MAX_LENGTH = int(os.getenv("ERROR_REPORT_MAX_LENGTH", "4000"))
+
+# Лимит запросов set_my_commands/delete_my_commands в секунду при обновлении команд администраторов
+COMMANDS_RATE_LIMIT = float(os.getenv("COMMANDS_RATE_LIMIT", "10"))
+
+# Через сколько секунд перечитывать список администраторов из БД (0 — только при изменениях через бота)
+ADMIN_CACHE_TTL = float(os.getenv("ADMIN_CACHE_TTL", "300"))
+
+# --- Inline-калькулятор комиссии (@bot 1500000, только для админов) ---
+# Сколько секунд Telegram может отдавать сохраненный ответ на тот же запрос, не обращаясь к боту
+INLINE_CALCULATOR_CACHE_TIME = int(os.getenv("INLINE_CALCULATOR_CACHE_TIME", "3600"))
+# Сколько последних рассчитанных ответов бот хранит в памяти
+INLINE_CALCULATOR_CACHE_SIZE = int(os.getenv("INLINE_CALCULATOR_CACHE_SIZE", "1024"))
+
+# --- События вступления/выхода из каналов ---
+# Окно (секунды), в котором копятся приветствия и сводка для лога; вышедшим за окно приветствие не отправляется
+MEMBER_EVENTS_WINDOW = float(os.getenv("MEMBER_EVENTS_WINDOW", "2"))
+# Сколько приветствий отправляется одновременно (темп задает планировщик исходящих сообщений)
+WELCOME_CONCURRENCY = int(os.getenv("WELCOME_CONCURRENCY", "5"))
+# Сколько приветствий может ждать отправки; сверх этого (например, при накрутке) приветствия пропускаются
+WELCOME_QUEUE_MAX = int(os.getenv("WELCOME_QUEUE_MAX", "10000"))
@@ -2,7 +2,7 @@ from telegram import Update
 from telegram.ext import filters
 
 # Импортируем зависимости из вашего проекта
-from services.database import get_all_admins
+from services.async_database import admin_cache
 from config import SUPER_ADMIN_ID
 
 class AdminFilter(filters.BaseFilter):
@@ -12,7 +12,8 @@ class AdminFilter(filters.BaseFilter):
     def filter(self, update: Update) -> bool:
         """
         Проверяет, является ли пользователь администратором (супер-админ или админ из БД).
-        Фильтр запрашивает актуальный список админов из БД при каждой проверке.
+        Список админов берется из общего кэша, который сбрасывается при изменении
+        состава админов, поэтому проверка не обращается к БД.
         """
         # Если в обновлении нет информации о пользователе, доступ запрещен
         if not update.effective_user:
@@ -21,11 +22,11 @@ class AdminFilter(filters.BaseFilter):
         user_id = update.effective_user.id
 
         # Супер-админ всегда имеет доступ
-        if SUPER_ADMIN_ID and user_id == SUPER_ADMIN_ID:
+        if SUPER_ADMIN_ID and user_id == int(SUPER_ADMIN_ID):
             return True
 
-        # Получаем АКТУАЛЬНЫЙ список ID администраторов из базы данных
-        return user_id in get_all_admins()
+        # Проверяем права по кэшу администраторов
+        return admin_cache.contains(user_id)
 
 # Создаем один экземпляр фильтра для удобного импорта и использования в проекте
 is_admin = AdminFilter()
\ No newline at end of file
@@ -1,7 +1,6 @@
+import asyncio
 import logging
-import time
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, InputMediaPhoto, InputMediaVideo
-from telegram.constants import ParseMode
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import (
     ContextTypes,
     CommandHandler,
@@ -14,13 +13,19 @@ from telegram.ext import (
 logger = logging.getLogger(__name__)
 
 from config import CHANNEL_BUTTONS_CONFIG
-from services.database import get_all_users, get_channel_stats, get_user_ids_by_channel, full_resync_channel_members
+from services.async_database import get_user_count, get_channel_stats, create_broadcast_job, get_audience_size
+from services.broadcast import start_broadcast_job
+from services.segments import SegmentError, parse_segment, dump_segment, describe_segment
+from keyboards.registry import keyboards
+
+from .sync import request_subscriber_sync, get_sync_status_text
 
 # Импортируем логику калькулятора из соседнего файла
 try:
     from .calculate import (
         commission_calculator_start,
         commission_calculator_receive_price,
+        commission_calculator_receive_file,
         back_to_main_admin_menu as calculator_back_to_main,
         COMMISSION_CALCULATOR_INPUT,
         CB_ADMIN_COMMISSION_CALCULATOR,
@@ -34,6 +39,7 @@ except ImportError:
         return ConversationHandler.END
     commission_calculator_start = _dummy_unavailable_handler
     commission_calculator_receive_price = _dummy_unavailable_handler
+    commission_calculator_receive_file = _dummy_unavailable_handler
     calculator_back_to_main = _dummy_unavailable_handler
     COMMISSION_CALCULATOR_INPUT = -99
     CB_ADMIN_COMMISSION_CALCULATOR = "calculator_unavailable"
@@ -48,30 +54,72 @@ except ImportError:
     CHOOSE_TYPE,
     GET_CONTENT,
     CONFIRM_BROADCAST,
-) = range(6)
+    CHOOSE_SEGMENT,
+) = range(7)
 
 # --- ДАННЫЕ ДЛЯ КНОПОК (CALLBACK DATA) ---
 CB_BROADCAST_START = "broadcast_start"
 CB_SHOW_STATS = "show_stats"
 CB_BACK_TO_MAIN = "admin_back_to_main"
 CB_SYNC_SUBSCRIBERS = "sync_subscribers"
+CB_SYNC_SUBSCRIBERS_FULL = "sync_subscribers_full"
 CB_BROADCAST_CANCEL = "broadcast_cancel"
+CB_TARGET_SEGMENT = "target_segment"
 
-# === ГЛАВНОЕ МЕНЮ И НАВИГАЦИЯ ===
-async def get_main_admin_menu_keyboard() -> InlineKeyboardMarkup:
-    """Создает и возвращает клавиатуру главного меню админа."""
+# === КЛАВИАТУРЫ ===
+# Собираются один раз и раздаются из реестра; меню целевой аудитории пересобирается при изменении каналов
+KB_ADMIN_MAIN = "admin_main"
+KB_ADMIN_STATS = "admin_stats"
+KB_BROADCAST_TARGET = "broadcast_target"
+KB_BROADCAST_TYPE = "broadcast_type"
+KB_BROADCAST_GROUP = "broadcast_group"
+KB_BROADCAST_CONFIRM = "broadcast_confirm"
+
+def _build_main_admin_menu_keyboard(_) -> InlineKeyboardMarkup:
     keyboard = [
         [InlineKeyboardButton("Создать рассылку 📬", callback_data=CB_BROADCAST_START)],
         [InlineKeyboardButton("Статистика 📊", callback_data=CB_SHOW_STATS)],
         [InlineKeyboardButton("Калькулятор комиссии 🧮", callback_data=CB_ADMIN_COMMISSION_CALCULATOR)],
         [InlineKeyboardButton("🔄 Синхронизировать подписчиков", callback_data=CB_SYNC_SUBSCRIBERS)],
+        [InlineKeyboardButton("♻️ Полная синхронизация", callback_data=CB_SYNC_SUBSCRIBERS_FULL)],
     ]
     return InlineKeyboardMarkup(keyboard)
 
+def _build_broadcast_target_keyboard(channels: tuple[tuple[str, str, str], ...]) -> InlineKeyboardMarkup:
+    keyboard = [[InlineKeyboardButton("Всем пользователям", callback_data="target_all")]]
+    for group_id, text, emoji in channels:
+        if group_id:
+            keyboard.append([InlineKeyboardButton(f"Подписчикам «{emoji} {text}»", callback_data=f"target_{group_id}")])
+    keyboard.append([InlineKeyboardButton("🎯 Сегмент (выражение над каналами)", callback_data=CB_TARGET_SEGMENT)])
+    keyboard.append([InlineKeyboardButton("Отмена", callback_data=CB_BROADCAST_CANCEL)])
+    return InlineKeyboardMarkup(keyboard)
+
+keyboards.register(KB_ADMIN_MAIN, _build_main_admin_menu_keyboard)
+keyboards.register(KB_ADMIN_STATS, lambda _: InlineKeyboardMarkup([[InlineKeyboardButton("⬅️ Назад", callback_data=CB_BACK_TO_MAIN)]]))
+keyboards.register(KB_BROADCAST_TARGET, _build_broadcast_target_keyboard, inputs=lambda: tuple(CHANNEL_BUTTONS_CONFIG))
+keyboards.register(KB_BROADCAST_TYPE, lambda _: InlineKeyboardMarkup([
+    [InlineKeyboardButton("Одиночное сообщение", callback_data="type_single")],
+    [InlineKeyboardButton("Группа фото/видео", callback_data="type_group")],
+    [InlineKeyboardButton("Отмена", callback_data=CB_BROADCAST_CANCEL)],
+]))
+keyboards.register(KB_BROADCAST_GROUP, lambda _: InlineKeyboardMarkup([
+    [InlineKeyboardButton("✅ Готово, я все отправил(а)", callback_data="group_done")],
+    [InlineKeyboardButton("❌ Отмена", callback_data=CB_BROADCAST_CANCEL)],
+]))
+keyboards.register(KB_BROADCAST_CONFIRM, lambda _: InlineKeyboardMarkup([
+    [InlineKeyboardButton("✅ Начать рассылку", callback_data="broadcast_confirm")],
+    [InlineKeyboardButton("❌ Отмена", callback_data=CB_BROADCAST_CANCEL)],
+]))
+
+# === ГЛАВНОЕ МЕНЮ И НАВИГАЦИЯ ===
+def get_main_admin_menu_keyboard() -> InlineKeyboardMarkup:
+    """Возвращает клавиатуру главного меню админа (общий экземпляр из реестра)."""
+    return keyboards.get(KB_ADMIN_MAIN)
+
 async def admin_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Точка входа в админ-панель. Отправляет главное меню."""
     text = "Добро пожаловать в админ-панель!"
-    reply_markup = await get_main_admin_menu_keyboard()
+    reply_markup = get_main_admin_menu_keyboard()
     if update.message:
         await update.message.reply_text(text, reply_markup=reply_markup)
     elif update.callback_query:
@@ -84,8 +132,8 @@ async def show_stats(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Показывает статистику и кнопку 'Назад'."""
     query = update.callback_query
     await query.answer()
-    total_bot_users = len(get_all_users())
-    channel_stats = get_channel_stats()
+    total_bot_users = await get_user_count()
+    channel_stats = await get_channel_stats()
     channel_names = {config[0]: f"{config[2]} {config[1]}" for config in CHANNEL_BUTTONS_CONFIG if config[0]}
     
     stats_text = f"📊 <b>Статистика</b>\n\n"
@@ -98,35 +146,27 @@ async def show_stats(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     else:
         stats_text += "<i>Пока нет данных о подписчиках в каналах.</i>"
     
-    keyboard = [[InlineKeyboardButton("⬅️ Назад", callback_data=CB_BACK_TO_MAIN)]]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    reply_markup = keyboards.get(KB_ADMIN_STATS)
     await query.edit_message_text(stats_text, parse_mode='HTML', reply_markup=reply_markup)
     return SHOWING_STATS
 
 # === СЕКЦИЯ СИНХРОНИЗАЦИИ ===
 async def sync_subscribers(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    """Принудительно синхронизирует базу данных с текущими подписчиками каналов."""
+    """
+    Ставит синхронизацию подписчиков в фоновую очередь или сообщает о уже идущей.
+    По умолчанию синхронизация инкрементальная (только устаревшие и непроверенные записи),
+    кнопка полной синхронизации перепроверяет всех пользователей во всех каналах.
+    """
     query = update.callback_query
-    await query.answer("Начинаю синхронизацию... Это может занять несколько минут.")
-    all_bot_users = get_all_users()
-    channels_to_sync = [config[0] for config in CHANNEL_BUTTONS_CONFIG if config[0]]
-    total_synced_count = 0
-    for channel_id in channels_to_sync:
-        current_channel_members = []
-        for user_id in all_bot_users:
-            try:
-                member = await context.bot.get_chat_member(chat_id=channel_id, user_id=user_id)
-                if member.status in ['member', 'administrator', 'creator']:
-                    current_channel_members.append(user_id)
-            except Exception:
-                continue
-        full_resync_channel_members(channel_id, current_channel_members)
-        total_synced_count += len(current_channel_members)
-        logger.info(f"Синхронизация для канала {channel_id} завершена. Найдено {len(current_channel_members)} подписчиков.")
-    await query.edit_message_text(
-        f"✅ Синхронизация завершена!\n\nВсего найдено и записано в базу: {total_synced_count} подписок.",
-        reply_markup=await get_main_admin_menu_keyboard()
-    )
+    full_sync = query.data == CB_SYNC_SUBSCRIBERS_FULL
+    if request_subscriber_sync(context.application, full=full_sync, chat_id=update.effective_chat.id):
+        await query.answer("Синхронизация запущена в фоне. Ход выполнения придет отдельным сообщением.", show_alert=True)
+    else:
+        await query.answer()
+        await context.bot.send_message(
+            chat_id=update.effective_chat.id,
+            text=get_sync_status_text() + "\n\nОтменить: /sync_cancel"
+        )
     return CHOOSING_ACTION
 
 # === СЕКЦИЯ РАССЫЛКИ ===
@@ -134,12 +174,7 @@ async def start_broadcast_dialog(update: Update, context: ContextTypes.DEFAULT_T
     """Начало диалога рассылки: спрашивает целевую аудиторию."""
     query = update.callback_query
     await query.answer()
-    keyboard = [[InlineKeyboardButton("Всем пользователям", callback_data="target_all")]]
-    for group_id, text, emoji in CHANNEL_BUTTONS_CONFIG:
-        if group_id:
-            keyboard.append([InlineKeyboardButton(f"Подписчикам «{emoji} {text}»", callback_data=f"target_{group_id}")])
-    keyboard.append([InlineKeyboardButton("Отмена", callback_data=CB_BROADCAST_CANCEL)])
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    reply_markup = keyboards.get(KB_BROADCAST_TARGET)
     await query.edit_message_text(text="Кому вы хотите отправить рассылку?", reply_markup=reply_markup)
     return CHOOSE_TARGET
 
@@ -149,15 +184,57 @@ async def choose_broadcast_target(update: Update, context: ContextTypes.DEFAULT_
     target = query.data.replace("target_", "")
     context.user_data['broadcast_target'] = target
     await query.answer()
-    keyboard = [
-        [InlineKeyboardButton("Одиночное сообщение", callback_data="type_single")],
-        [InlineKeyboardButton("Группа фото/видео", callback_data="type_group")],
-        [InlineKeyboardButton("Отмена", callback_data=CB_BROADCAST_CANCEL)],
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    reply_markup = keyboards.get(KB_BROADCAST_TYPE)
     await query.edit_message_text(text="Какой тип рассылки вы хотите создать?", reply_markup=reply_markup)
     return CHOOSE_TYPE
 
+def _segment_channels() -> list[tuple[str, int, str]]:
+    """Каналы для выражений сегмента: (буква, ID канала, название) в порядке конфигурации."""
+    configured = [(group_id, f"{emoji} {text}") for group_id, text, emoji in CHANNEL_BUTTONS_CONFIG if group_id]
+    return [(chr(ord('A') + i), int(group_id), name) for i, (group_id, name) in enumerate(configured)]
+
+async def ask_for_segment(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Запрашивает выражение сегмента аудитории."""
+    query = update.callback_query
+    await query.answer()
+    channels = "\n".join(f"{letter} — {name}" for letter, _, name in _segment_channels())
+    await query.edit_message_text(
+        text=(
+            "Отправьте выражение сегмента. Каналы:\n"
+            f"{channels}\n\n"
+            "Операции: & — и, | — или, - — кроме, ! — не, скобки.\n"
+            "ALL — все пользователи бота, ANY — подписчики любого канала.\n\n"
+            "Примеры:\n"
+            "A - B — в канале A, но не в B\n"
+            "A | C — хотя бы в одном из A, C\n"
+            "ALL - ANY — запустили бота, но не подписаны ни на один канал\n\n"
+            "Для отмены введите /cancel."
+        )
+    )
+    return CHOOSE_SEGMENT
+
+async def receive_segment(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Разбирает выражение сегмента, показывает размер аудитории и спрашивает тип контента."""
+    channels = _segment_channels()
+    try:
+        segment = parse_segment(update.message.text, {letter: channel_id for letter, channel_id, _ in channels})
+    except SegmentError as e:
+        await update.message.reply_text(f"❌ {e}\n\nИсправьте выражение или введите /cancel.")
+        return CHOOSE_SEGMENT
+    target = dump_segment(segment)
+    # Размер считается одним запросом в БД, без выгрузки пользователей
+    audience_size = await get_audience_size(target)
+    description = describe_segment(segment, {channel_id: name for _, channel_id, name in channels})
+    if not audience_size:
+        await update.message.reply_text(f"В сегменте {description} нет пользователей. Введите другое выражение или /cancel.")
+        return CHOOSE_SEGMENT
+    context.user_data['broadcast_target'] = target
+    await update.message.reply_text(
+        f"🎯 Сегмент: {description}\nПолучателей: {audience_size}\n\nКакой тип рассылки вы хотите создать?",
+        reply_markup=keyboards.get(KB_BROADCAST_TYPE)
+    )
+    return CHOOSE_TYPE
+
 async def ask_for_content(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Запрашивает контент в зависимости от выбора типа."""
     query = update.callback_query
@@ -168,11 +245,7 @@ async def ask_for_content(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     if choice == 'type_single':
         await query.edit_message_text(text="Пришлите сообщение для рассылки (текст, фото, видео, и т.д.).\n\nДля отмены введите /cancel.")
     elif choice == 'type_group':
-        keyboard = [
-            [InlineKeyboardButton("✅ Готово, я все отправил(а)", callback_data="group_done")],
-            [InlineKeyboardButton("❌ Отмена", callback_data=CB_BROADCAST_CANCEL)],
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        reply_markup = keyboards.get(KB_BROADCAST_GROUP)
         await query.edit_message_text(
             text="Отправьте до 10 фото и видео одним альбомом. Текст, отправленный с первым файлом, станет общей подписью.\n\n"
                  "Когда закончите, нажмите 'Готово'.",
@@ -211,11 +284,7 @@ async def finish_group_collection(update: Update, context: ContextTypes.DEFAULT_
 
 async def ask_for_confirmation(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Отправляет сообщение с запросом на подтверждение рассылки."""
-    keyboard = [
-        [InlineKeyboardButton("✅ Начать рассылку", callback_data="broadcast_confirm")],
-        [InlineKeyboardButton("❌ Отмена", callback_data=CB_BROADCAST_CANCEL)]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    reply_markup = keyboards.get(KB_BROADCAST_CONFIRM)
     num_messages = len(context.user_data.get('broadcast_messages', []))
     message_type = f"группу из {num_messages} медиа" if num_messages > 1 else "это сообщение"
     chat_id = update.effective_chat.id
@@ -235,52 +304,34 @@ async def process_broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE)
         await query.edit_message_text("Ошибка: не найден контент или целевая аудитория для рассылки.")
         context.user_data.clear()
         return await admin_start(update, context)
-    if target_group == 'all':
-        user_ids = get_all_users()
-    else:
-        channel_id = int(target_group)
-        user_ids = get_user_ids_by_channel(channel_id)
-    if not user_ids:
+    # Размер аудитории берется из счетчиков, сами получатели читаются постранично во время рассылки
+    audience_size = await get_audience_size(target_group)
+    if not audience_size:
         await query.edit_message_text("В выбранной аудитории нет пользователей для рассылки.")
         context.user_data.clear()
         return await admin_start(update, context)
-    await query.edit_message_text(f"Начинаю рассылку для {len(user_ids)} пользователей. Это может занять некоторое время...")
-    success_count = 0
-    error_count = 0
     if len(messages) > 1:
-        media_list = []
-        caption = next((msg.caption for msg in messages if msg.caption), "")
-        for i, msg in enumerate(messages):
-            extra_args = {'caption': caption, 'parse_mode': ParseMode.HTML} if i == 0 and caption else {}
+        # Сохраняем только file_id, чтобы рассылку можно было возобновить после перезапуска
+        items = []
+        for msg in messages:
             if msg.photo:
-                media_list.append(InputMediaPhoto(media=msg.photo[-1].file_id, **extra_args))
+                items.append(('photo', msg.photo[-1].file_id))
             elif msg.video:
-                media_list.append(InputMediaVideo(media=msg.video.file_id, **extra_args))
-        if not media_list:
+                items.append(('video', msg.video.file_id))
+        if not items:
             await context.bot.send_message(chat_id=update.effective_chat.id, text="Ошибка: не удалось собрать медиагруппу.")
-        else:
-            for user_id in user_ids:
-                try:
-                    await context.bot.send_media_group(chat_id=user_id, media=media_list, read_timeout=30, write_timeout=30)
-                    success_count += 1
-                    time.sleep(0.1)
-                except Exception as e:
-                    error_count += 1
-                    logging.error(f"Не удалось отправить медиагруппу пользователю {user_id}: {e}")
+            context.user_data.clear()
+            return ConversationHandler.END
+        caption = next((msg.caption for msg in messages if msg.caption), "")
+        payload = {'type': 'media_group', 'items': items, 'caption': caption}
     else:
         message_to_send = messages[0]
-        for user_id in user_ids:
-            try:
-                await message_to_send.copy(chat_id=user_id)
-                success_count += 1
-                time.sleep(0.1)
-            except Exception as e:
-                error_count += 1
-                logging.error(f"Не удалось отправить сообщение пользователю {user_id}: {e}")
-    await context.bot.send_message(
-        chat_id=update.effective_chat.id,
-        text=f"✅ Рассылка завершена!\n\n👍 Отправлено: {success_count}\n👎 Ошибок: {error_count}"
-    )
+        payload = {'type': 'copy', 'from_chat_id': message_to_send.chat_id, 'message_id': message_to_send.message_id}
+    await query.edit_message_text(f"Начинаю рассылку для {audience_size} пользователей. Это может занять некоторое время...")
+    # Рассылка сохраняется в БД и идет в фоне, чтобы бот продолжал обрабатывать остальные обновления
+    job_id = await create_broadcast_job(update.effective_chat.id, target_group, payload)
+    start_broadcast_job(context.bot, job_id)
+    logger.info(f"Рассылка #{job_id} запущена для {audience_size} пользователей.")
     context.user_data.clear()
     return ConversationHandler.END
 
@@ -293,7 +344,7 @@ async def cancel_action(update: Update, context: ContextTypes.DEFAULT_TYPE) -> i
     else:
         await update.message.reply_text("Действие отменено.")
     context.user_data.clear()
-    time.sleep(1)
+    await asyncio.sleep(1)
     return await admin_start(update, context)
 
 # === ЕДИНЫЙ ОБРАБОТЧИК АДМИН-ПАНЕЛИ ===
@@ -303,15 +354,20 @@ admin_handler = ConversationHandler(
         CHOOSING_ACTION: [
             CallbackQueryHandler(start_broadcast_dialog, pattern=f"^{CB_BROADCAST_START}$"),
             CallbackQueryHandler(show_stats, pattern=f"^{CB_SHOW_STATS}$"),
-            CallbackQueryHandler(sync_subscribers, pattern=f"^{CB_SYNC_SUBSCRIBERS}$"),
+            CallbackQueryHandler(sync_subscribers, pattern=f"^({CB_SYNC_SUBSCRIBERS}|{CB_SYNC_SUBSCRIBERS_FULL})$"),
             CallbackQueryHandler(commission_calculator_start, pattern=f"^{CB_ADMIN_COMMISSION_CALCULATOR}$"),
         ],
         SHOWING_STATS: [CallbackQueryHandler(admin_start, pattern=f"^{CB_BACK_TO_MAIN}$")],
         COMMISSION_CALCULATOR_INPUT: [
             MessageHandler(filters.TEXT & ~filters.COMMAND, commission_calculator_receive_price),
+            MessageHandler(filters.Document.ALL, commission_calculator_receive_file),
             CallbackQueryHandler(calculator_back_to_main, pattern=f"^{CB_ADMIN_BACK_TO_MAIN_FROM_CALCULATOR}$"),
         ],
-        CHOOSE_TARGET: [CallbackQueryHandler(choose_broadcast_target, pattern='^target_')],
+        CHOOSE_TARGET: [
+            CallbackQueryHandler(ask_for_segment, pattern=f"^{CB_TARGET_SEGMENT}$"),
+            CallbackQueryHandler(choose_broadcast_target, pattern='^target_'),
+        ],
+        CHOOSE_SEGMENT: [MessageHandler(filters.TEXT & ~filters.COMMAND, receive_segment)],
         CHOOSE_TYPE: [CallbackQueryHandler(ask_for_content, pattern='^type_(single|group)$')],
         GET_CONTENT: [
             MessageHandler(filters.ALL & ~filters.COMMAND, get_content),
@@ -9,7 +9,9 @@ from telegram.ext import (
     filters,
 )
 from config import SUPER_ADMIN_ID
-from services.database import add_admin, remove_admin, get_all_admins
+from services.async_database import add_admin, remove_admin, get_all_admins
+from keyboards.registry import keyboards
+from services.commands import update_admin_commands
 
 logger = logging.getLogger(__name__)
 
@@ -22,15 +24,20 @@ CB_REMOVE_ADMIN = "remove_admin"
 CB_LIST_ADMINS = "list_admins"
 CB_BACK_TO_MANAGE_MENU = "back_to_manage_menu"
 
+# Статичные клавиатуры собираются один раз и раздаются из реестра
+KB_MANAGE_MENU = "manage_admins_menu"
+KB_BACK_TO_MANAGE_MENU = "manage_admins_back"
+keyboards.register(KB_MANAGE_MENU, lambda _: InlineKeyboardMarkup([
+    [InlineKeyboardButton("➕ Добавить админа", callback_data=CB_ADD_ADMIN)],
+    [InlineKeyboardButton("➖ Удалить админа", callback_data=CB_REMOVE_ADMIN)],
+    [InlineKeyboardButton("📋 Список админов", callback_data=CB_LIST_ADMINS)],
+]))
+keyboards.register(KB_BACK_TO_MANAGE_MENU, lambda _: InlineKeyboardMarkup([[InlineKeyboardButton("⬅️ Назад", callback_data=CB_BACK_TO_MANAGE_MENU)]]))
+
 
 async def manage_admins_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Начало диалога управления администраторами."""
-    keyboard = [
-        [InlineKeyboardButton("➕ Добавить админа", callback_data=CB_ADD_ADMIN)],
-        [InlineKeyboardButton("➖ Удалить админа", callback_data=CB_REMOVE_ADMIN)],
-        [InlineKeyboardButton("📋 Список админов", callback_data=CB_LIST_ADMINS)],
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    reply_markup = keyboards.get(KB_MANAGE_MENU)
     await update.message.reply_text("Меню управления администраторами:", reply_markup=reply_markup)
     return CHOOSING_MANAGE_ACTION
 
@@ -47,9 +54,10 @@ async def process_add_admin(update: Update, context: ContextTypes.DEFAULT_TYPE)
     """Обрабатывает ID и добавляет нового админа."""
     try:
         user_id = int(update.message.text)
-        if add_admin(user_id):
+        if await add_admin(user_id):
             await update.message.reply_text(f"✅ Пользователь с ID {user_id} успешно назначен администратором.")
             logger.info(f"SuperAdmin {update.effective_user.id} added new admin: {user_id}")
+            await update_admin_commands(context.bot, user_id)
         else:
             await update.message.reply_text(f"⚠️ Пользователь с ID {user_id} уже является администратором.")
     except (ValueError, TypeError):
@@ -64,10 +72,10 @@ async def show_admins_for_removal(update: Update, context: ContextTypes.DEFAULT_
     """Показывает список админов с кнопками для удаления."""
     query = update.callback_query
     await query.answer()
-    admins = get_all_admins()
+    admins = await get_all_admins()
 
     if not admins:
-        await query.edit_message_text("Список администраторов пуст.", reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("⬅️ Назад", callback_data=CB_BACK_TO_MANAGE_MENU)]]))
+        await query.edit_message_text("Список администраторов пуст.", reply_markup=keyboards.get(KB_BACK_TO_MANAGE_MENU))
         return CHOOSING_MANAGE_ACTION
 
     keyboard = []
@@ -86,9 +94,10 @@ async def process_remove_admin(update: Update, context: ContextTypes.DEFAULT_TYP
     query = update.callback_query
     user_id_to_remove = int(query.data.split('_')[1])
 
-    if remove_admin(user_id_to_remove):
+    if await remove_admin(user_id_to_remove):
         await query.answer(f"Администратор {user_id_to_remove} удален.", show_alert=True)
         logger.info(f"SuperAdmin {update.effective_user.id} removed admin: {user_id_to_remove}")
+        await update_admin_commands(context.bot, user_id_to_remove)
     else:
         await query.answer("Не удалось удалить администратора.", show_alert=True)
 
@@ -100,14 +109,14 @@ async def list_admins(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int
     """Показывает список всех администраторов."""
     query = update.callback_query
     await query.answer()
-    admins = get_all_admins()
+    admins = await get_all_admins()
     
     if not admins:
         text = "Список администраторов пуст."
     else:
         text = "Текущие администраторы:\n" + "\n".join([f"• `{admin_id}`" for admin_id in admins])
     
-    reply_markup = InlineKeyboardMarkup([[InlineKeyboardButton("⬅️ Назад", callback_data=CB_BACK_TO_MANAGE_MENU)]])
+    reply_markup = keyboards.get(KB_BACK_TO_MANAGE_MENU)
     await query.edit_message_text(text, reply_markup=reply_markup, parse_mode='MarkdownV2')
     return CHOOSING_MANAGE_ACTION
 
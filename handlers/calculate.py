@@ -1,9 +1,15 @@
+import asyncio
+import io
 import logging
 from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
 from telegram.ext import (
     ContextTypes,
 )
 
+from keyboards.registry import keyboards
+from services.commission import calculate_commission
+from services.price_table import PriceTableError, calculate_price_file
+
 # --- Предполагается, что эти переменные определены в другом месте проекта ---
 # Если у вас нет настроенного логгера, можно использовать logging.basicConfig()
 logger = logging.getLogger(__name__)
@@ -21,11 +27,20 @@ COMMISSION_CALCULATOR_INPUT = 501
 CB_ADMIN_COMMISSION_CALCULATOR = "admin_commission_calculator"
 CB_ADMIN_BACK_TO_MAIN_FROM_CALCULATOR = "admin_back_to_main_from_calculator"
 
+# Статичная клавиатура калькулятора собирается один раз и раздается из реестра
+KB_CALCULATOR = "commission_calculator"
+keyboards.register(KB_CALCULATOR, lambda _: InlineKeyboardMarkup([
+    [InlineKeyboardButton("Назад в меню админа", callback_data=CB_ADMIN_BACK_TO_MAIN_FROM_CALCULATOR)]
+]))
+
+# Бот может скачать файл размером не больше 20 МБ (ограничение Bot API)
+MAX_PRICE_FILE_SIZE = 20 * 1024 * 1024
+
 
 def _calculate_commission(price: float) -> tuple[float, float]:
     """
     Рассчитывает процент и сумму комиссии на основе цены.
-    Изолированная бизнес-логика для простоты тестирования и поддержки.
+    Шкала комиссии и сам расчет находятся в services/commission.py.
 
     Args:
         price: Цена для расчета.
@@ -36,31 +51,7 @@ def _calculate_commission(price: float) -> tuple[float, float]:
     Raises:
         ValueError: Если цена не является положительным числом.
     """
-    if not isinstance(price, (int, float)) or price <= 0:
-        raise ValueError("Сумма должна быть положительным числом.")
-
-    # Правила расчета: (верхняя_граница_цены, процент_или_формула)
-    commission_rules = [
-        (100000, 10.0),
-        (1700000, lambda p: max(10 - ((p - 100000) / 50000) * 0.15, 0)),
-        (1800000, 5.2),
-        (1900000, 5.1),
-        (3050000, 5.0),
-        (6000000, lambda p: max(5 - ((p - 3050000) / 50000) * 0.02, 0)),
-        (float('inf'), 2.8)  # Для всех цен выше 6 000 000
-    ]
-
-    commission_percent = 0.0
-    for max_price, rule in commission_rules:
-        if price <= max_price:
-            if callable(rule):
-                commission_percent = rule(price)
-            else:
-                commission_percent = float(rule)
-            break
-
-    commission_amount = price * commission_percent / 100
-    return commission_percent, commission_amount
+    return calculate_commission(price)
 
 
 async def commission_calculator_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
@@ -68,10 +59,12 @@ async def commission_calculator_start(update: Update, context: ContextTypes.DEFA
     query = update.callback_query
     await query.answer()
 
-    message_to_send = "Введите сумму для расчета комиссии:"
-    reply_markup = InlineKeyboardMarkup([
-        [InlineKeyboardButton("Назад в меню админа", callback_data=CB_ADMIN_BACK_TO_MAIN_FROM_CALCULATOR)]
-    ])
+    message_to_send = (
+        "Введите сумму для расчета комиссии.\n\n"
+        "Чтобы рассчитать сразу много цен, отправьте файл CSV или XLSX: "
+        "в ответ придет тот же файл со столбцами процента и суммы комиссии."
+    )
+    reply_markup = keyboards.get(KB_CALCULATOR)
     await query.edit_message_text(text=message_to_send, reply_markup=reply_markup)
 
     # Сохраняем ID основного сообщения калькулятора для последующего редактирования
@@ -100,10 +93,7 @@ async def commission_calculator_receive_price(update: Update, context: ContextTy
             pass
         return COMMISSION_CALCULATOR_INPUT
 
-    reply_markup = InlineKeyboardMarkup([
-        [InlineKeyboardButton("Назад в меню админа", callback_data=CB_ADMIN_BACK_TO_MAIN_FROM_CALCULATOR)]
-    ])
-
+    reply_markup = keyboards.get(KB_CALCULATOR)
 
     try:
         # Заменяем запятую на точку и убираем пробелы для корректного преобразования
@@ -167,6 +157,47 @@ async def commission_calculator_receive_price(update: Update, context: ContextTy
 
     return COMMISSION_CALCULATOR_INPUT
 
+
+async def commission_calculator_receive_file(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Получает файл с ценами (CSV/XLSX) и отправляет его обратно со столбцами комиссии."""
+    document = update.message.document
+    user = update.effective_user
+    filename = document.file_name or "prices.csv"
+
+    if document.file_size and document.file_size > MAX_PRICE_FILE_SIZE:
+        await update.message.reply_text("❌ Файл слишком большой: бот может обработать файл до 20 МБ.")
+        return COMMISSION_CALCULATOR_INPUT
+
+    try:
+        telegram_file = await document.get_file()
+        data = bytes(await telegram_file.download_as_bytearray())
+        # Разбор и запись файла занимают заметное время — не блокируем цикл событий
+        result, calculated, skipped = await asyncio.to_thread(calculate_price_file, data, filename)
+    except PriceTableError as e:
+        logger.warning(f"Admin [ID: {user.id}] uploaded invalid price file '{filename}': {e}")
+        await update.message.reply_text(f"❌ Не удалось обработать файл: {e}")
+        return COMMISSION_CALCULATOR_INPUT
+    except Exception:
+        # Непредвиденная ошибка разбора или загрузки: администратор все равно получает ответ
+        logger.exception(f"Failed to process price file '{filename}' from admin [ID: {user.id}].")
+        await update.message.reply_text("❌ Не удалось обработать файл. Проверьте, что это корректный CSV или XLSX.")
+        return COMMISSION_CALCULATOR_INPUT
+
+    logger.info(
+        f"Admin [ID: {user.id}, @{user.username}] calculated commission for file '{filename}': "
+        f"{calculated} rows, {skipped} skipped."
+    )
+    caption = f"✅ Рассчитано строк: {calculated}"
+    if skipped:
+        caption += f"\n⚠️ Пропущено строк с некорректной ценой: {skipped}"
+    stem, _, extension = filename.rpartition('.')
+    await update.message.reply_document(
+        document=io.BytesIO(result),
+        filename=f"{stem or extension}_commission.{extension if stem else 'csv'}",
+        caption=caption,
+    )
+    return COMMISSION_CALCULATOR_INPUT
+
 async def back_to_main_admin_menu(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Возвращает в главное меню администратора, вызывая его стартовую функцию."""
     # Локальный импорт для избежания циклических зависимостей
@@ -1,58 +1,154 @@
+import asyncio
 import logging
 import html
 import json
 import traceback
 from telegram import Update
-from telegram.ext import ContextTypes
+from telegram.ext import Application, ContextTypes
 from telegram.constants import ParseMode
 from telegram.error import TelegramError
 
 # Импортируем новую конфигурацию и функции для работы с БД
-from config import SUPER_ADMIN_ID
-from services.database import get_all_admins
+from config import SUPER_ADMIN_ID, ERROR_DIGEST_INTERVAL, ERROR_STORE_SIZE, ERROR_REPORT_MAX_LENGTH
+from services.async_database import admin_cache
+from services.error_reports import ErrorStore, ErrorRecord
+from services.outbound import Lane
 
 logger = logging.getLogger(__name__)
 
-async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """Логирует ошибку и отправляет подробное сообщение всем администраторам."""
-    logger.error("Произошло исключение при обработке обновления:", exc_info=context.error)
+ERROR_DIGEST_JOB_NAME = "error_digest"
+
+# Ограничения на размер частей отчета (символов после экранирования)
+_MESSAGE_LIMIT = 500
+_LOCATION_LIMIT = 300
+_UPDATE_LIMIT = 1000
+_DATA_LIMIT = 300
+_DIGEST_MAX_ITEMS = 20
+
+# Повторяющиеся ошибки: первая отправляется сразу, повторы попадают в периодическую сводку
+error_store = ErrorStore(max_entries=ERROR_STORE_SIZE)
+
+
+def _escape_truncated(text: str, limit: int, tail: bool = False) -> str:
+    """
+    Экранирует текст для HTML и обрезает результат до `limit` символов,
+    не разрывая HTML-сущности (&quot; и т.п.).
+    """
+    escaped = html.escape(text)
+    if len(escaped) <= limit:
+        return escaped
+    if limit <= 1:
+        return "…"[:limit]
+    if tail:
+        cut = escaped[-(limit - 1):]
+        # Начало попало внутрь сущности: отбрасываем ее остаток
+        semicolon = cut.find(";", 0, 6)
+        if semicolon != -1 and "&" not in cut[:semicolon]:
+            cut = cut[semicolon + 1:]
+        return "…" + cut
+    cut = escaped[:limit - 1]
+    ampersand = cut.rfind("&", max(0, len(cut) - 5))
+    if ampersand != -1 and ";" not in cut[ampersand:]:
+        cut = cut[:ampersand]
+    return cut + "…"
 
-    # Форматируем трейсбек для отправки
-    tb_list = traceback.format_exception(None, context.error, context.error.__traceback__)
-    tb_string = "".join(tb_list)
 
-    # Форматируем объект update для наглядности
+def _format_error_report(update: object, context: ContextTypes.DEFAULT_TYPE, record: ErrorRecord) -> str:
+    """
+    Формирует подробный отчет о первой ошибке, укладывающийся в ERROR_REPORT_MAX_LENGTH
+    символов уже после экранирования. Место в первую очередь отдается трейсбеку,
+    затем данным чата и пользователя; JSON обновления обрезается первым.
+    """
+    tb_string = "".join(traceback.format_exception(None, context.error, context.error.__traceback__))
     update_str = update.to_dict() if isinstance(update, Update) else str(update)
-    
-    message = (
-        f"<b>An error occurred in the bot</b>\n\n"
-        f"<b>Error:</b>\n"
-        f"<code>{html.escape(str(context.error))}</code>\n\n"
-        f"<b>Update:</b>\n"
-        f"<code>{html.escape(json.dumps(update_str, indent=2, ensure_ascii=False))}</code>\n\n"
-        f"<b>Chat Data:</b>\n"
-        f"<code>{html.escape(str(context.chat_data))}</code>\n\n"
-        f"<b>User Data:</b>\n"
-        f"<code>{html.escape(str(context.user_data))}</code>\n\n"
-        f"<b>Traceback:</b>\n"
-        f"<code>{html.escape(tb_string)}</code>"
+    update_json = json.dumps(update_str, indent=2, ensure_ascii=False, default=str)
+
+    message = _escape_truncated(record.message, _MESSAGE_LIMIT)
+    location = _escape_truncated(record.location, _LOCATION_LIMIT)
+    template = (
+        "<b>An error occurred in the bot</b>\n\n"
+        "<b>Error:</b>\n"
+        "<code>{message}</code>\n"
+        "<i>{location}</i>\n\n"
+        "<b>Update:</b>\n"
+        "<code>{update}</code>\n\n"
+        "<b>Chat Data:</b>\n"
+        "<code>{chat_data}</code>\n\n"
+        "<b>User Data:</b>\n"
+        "<code>{user_data}</code>\n\n"
+        "<b>Traceback:</b>\n"
+        "<code>{traceback}</code>"
+    )
+    budget = ERROR_REPORT_MAX_LENGTH - len(template.format(
+        message=message, location=location, update="", chat_data="", user_data="", traceback=""
+    ))
+    # Трейсбек обрезается с начала: самое важное — в последних кадрах.
+    # Небольшой запас оставляем остальным частям, чтобы они не пропали целиком
+    tb_text = _escape_truncated(tb_string, max(budget - _DATA_LIMIT, budget // 2), tail=True)
+    budget -= len(tb_text)
+    chat_data = _escape_truncated(str(context.chat_data), min(_DATA_LIMIT, budget // 3))
+    budget -= len(chat_data)
+    user_data = _escape_truncated(str(context.user_data), min(_DATA_LIMIT, budget // 2))
+    budget -= len(user_data)
+    update_text = _escape_truncated(update_json, min(_UPDATE_LIMIT, budget))
+    return template.format(
+        message=message, location=location, update=update_text,
+        chat_data=chat_data, user_data=user_data, traceback=tb_text,
     )
 
-    # Получаем ID всех администраторов (супер-админ + админы из БД)
-    admin_ids = set(get_all_admins())
+
+def _format_digest(digest: list[tuple[ErrorRecord, int]]) -> str:
+    """Формирует сводку повторяющихся ошибок."""
+    lines = [f"<b>Сводка ошибок за последние {int(ERROR_DIGEST_INTERVAL // 60)} мин</b>\n"]
+    digest = sorted(digest, key=lambda item: item[1], reverse=True)
+    # Место под строку «…и еще N видов ошибок»
+    length = len(lines[0]) + 50
+    shown = 0
+    for record, repeats in digest[:_DIGEST_MAX_ITEMS]:
+        line = (
+            f"• <b>×{repeats}</b> <code>{_escape_truncated(record.error_type, 200)}</code> "
+            f"({_escape_truncated(record.location, 200)}): {_escape_truncated(record.message, 150)}"
+        )
+        # Строки не обрезаются посередине, чтобы не разорвать HTML-разметку
+        if length + len(line) + 1 > ERROR_REPORT_MAX_LENGTH:
+            break
+        lines.append(line)
+        length += len(line) + 1
+        shown += 1
+    if len(digest) > shown:
+        lines.append(f"\n…и еще {len(digest) - shown} видов ошибок.")
+    return "\n".join(lines)
+
+
+async def _send_to_admins(context: ContextTypes.DEFAULT_TYPE, text: str):
+    """Отправляет сообщение всем администраторам (супер-админ + админы из БД) параллельно."""
+    admin_ids = set(await admin_cache.get_async())
     if SUPER_ADMIN_ID:
-        admin_ids.add(SUPER_ADMIN_ID)
+        admin_ids.add(int(SUPER_ADMIN_ID))
 
-    # Отправляем отформатированное сообщение об ошибке всем администраторам
-    for admin_id in admin_ids:
+    async def send(admin_id: int):
         try:
-            for i in range(0, len(message), 4096):
-                await context.bot.send_message(
-                    chat_id=admin_id, text=message[i:i + 4096], parse_mode=ParseMode.HTML
-                )
+            await context.bot.send_message(
+                chat_id=admin_id, text=text, parse_mode=ParseMode.HTML, rate_limit_args=Lane.ALERT
+            )
         except TelegramError as e:
             logger.warning(f"Не удалось отправить сообщение об ошибке администратору {admin_id}: {e}")
 
+    await asyncio.gather(*(send(admin_id) for admin_id in admin_ids))
+
+
+async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Логирует ошибку и уведомляет администраторов. Подробный отчет отправляется
+    только при первом появлении ошибки, повторы учитываются в периодической сводке.
+    """
+    logger.error("Произошло исключение при обработке обновления:", exc_info=context.error)
+
+    record, is_new = error_store.record(context.error)
+    if is_new:
+        record.reported_count = record.count
+        await _send_to_admins(context, _format_error_report(update, context, record))
+
     # Также отправляем пользователю-дружелюбное сообщение, если это возможно
     if isinstance(update, Update) and update.effective_chat:
         try:
@@ -63,3 +159,20 @@ async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE) -> N
         except TelegramError as e:
             # Логируем, если не удалось отправить сообщение пользователю (например, бот заблокирован)
             logger.warning(f"Не удалось отправить сообщение об ошибке пользователю {update.effective_chat.id}: {e}")
+
+
+async def error_digest_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Задание JobQueue: отправляет администраторам сводку повторившихся ошибок."""
+    digest = error_store.take_digest()
+    if digest:
+        await _send_to_admins(context, _format_digest(digest))
+
+
+def schedule_error_digest(application: Application):
+    """Регистрирует периодическую отправку сводки ошибок."""
+    if application.job_queue is None:
+        logger.warning("JobQueue недоступна (установите python-telegram-bot[job-queue]), сводка ошибок отключена.")
+        return
+    application.job_queue.run_repeating(
+        error_digest_job, interval=ERROR_DIGEST_INTERVAL, first=ERROR_DIGEST_INTERVAL, name=ERROR_DIGEST_JOB_NAME
+    )
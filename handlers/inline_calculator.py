@@ -0,0 +1,58 @@
+import functools
+import logging
+
+from telegram import Update, InlineQueryResultArticle, InputTextMessageContent
+from telegram.ext import ContextTypes, InlineQueryHandler
+
+from config import INLINE_CALCULATOR_CACHE_TIME, INLINE_CALCULATOR_CACHE_SIZE
+from filters.custom_filters import is_admin
+from services.commission import calculate_commission
+from services.price_table import parse_price
+
+logger = logging.getLogger(__name__)
+
+# Ответ для пользователей без прав и для пустых/некорректных запросов Telegram кэширует недолго,
+# чтобы назначенный администратор сразу получил доступ
+_EMPTY_CACHE_TIME = 10
+
+
+@functools.lru_cache(maxsize=INLINE_CALCULATOR_CACHE_SIZE)
+def _commission_results(price: float) -> tuple[InlineQueryResultArticle, ...]:
+    """Готовый ответ на inline-запрос для цены (тот же расчет, что и в калькуляторе админ-панели)."""
+    commission_percent, commission = calculate_commission(price)
+    text = (
+        f"🧮 <b>Расчет комиссии</b>\n"
+        f"Цена: <code>{price:,.2f} руб.</code>\n"
+        f"Процент комиссии: <code>{commission_percent:.2f}%</code>\n"
+        f"Комиссия: <code>{commission:,.2f} руб.</code>"
+    )
+    return (
+        InlineQueryResultArticle(
+            id=f"commission:{price!r}",
+            title=f"Комиссия {commission:,.2f} руб. ({commission_percent:.2f}%)",
+            description=f"Цена {price:,.2f} руб.",
+            input_message_content=InputTextMessageContent(text, parse_mode='HTML'),
+        ),
+    )
+
+
+async def commission_inline_query(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Inline-режим калькулятора: @bot 1500000 — только для администраторов."""
+    query = update.inline_query
+    # Фильтры PTB не применяются к inline-запросам, поэтому права проверяются здесь
+    if not is_admin.filter(update):
+        await query.answer([], cache_time=_EMPTY_CACHE_TIME, is_personal=True)
+        return
+
+    price = parse_price(query.query)
+    try:
+        results = _commission_results(price)
+    except ValueError:
+        await query.answer([], cache_time=_EMPTY_CACHE_TIME, is_personal=True)
+        return
+
+    # is_personal: сохраненный Telegram ответ не достанется пользователю без прав
+    await query.answer(results, cache_time=INLINE_CALCULATOR_CACHE_TIME, is_personal=True)
+
+
+inline_calculator_handler = InlineQueryHandler(commission_inline_query)
@@ -1,62 +1,67 @@
 import logging
-from telegram import Update, ChatMember, ChatMemberUpdated
+from telegram import Bot, Update, ChatMember, ChatMemberUpdated
 from telegram.ext import ContextTypes
 from telegram.error import Forbidden, BadRequest
-from services.database import add_subscription, remove_subscription
+from config import MEMBER_EVENTS_WINDOW, WELCOME_CONCURRENCY, WELCOME_QUEUE_MAX
+from services.async_database import write_buffer
+from services.member_events import MemberEventIngestor
+from services.outbound import Lane
 
 logger = logging.getLogger(__name__)
 
+_MEMBER_STATUSES = (ChatMember.MEMBER, ChatMember.ADMINISTRATOR, ChatMember.OWNER)
+
+
+async def send_welcome(bot: Bot, user_id: int, first_name: str, channel_title: str):
+    """Отправляет приветствие в ЛС пользователю, вступившему в канал самостоятельно."""
+    welcome_text = (
+        f"Привет, {first_name}! 👋\n\n"
+        f"Спасибо за подписку на наш канал «{channel_title}»! "
+        "Рады видеть вас в нашем сообществе."
+    )
+    try:
+        await bot.send_message(chat_id=user_id, text=welcome_text, rate_limit_args=Lane.WELCOME)
+    except (Forbidden, BadRequest) as e:
+        # Ошибка возникает, если пользователь не запускал бота или заблокировал его.
+        # Это нормальное поведение, просто логируем его.
+        logger.warning(
+            f"Не удалось отправить приветствие пользователю {user_id}. "
+            f"Возможно, он не начинал диалог с ботом. Ошибка: {e}"
+        )
+
+
+# Вступления и выходы копятся и применяются пачками, приветствия отправляются в фоне
+member_events = MemberEventIngestor(
+    subscriptions=write_buffer,
+    send_welcome=send_welcome,
+    window=MEMBER_EVENTS_WINDOW,
+    welcome_concurrency=WELCOME_CONCURRENCY,
+    max_pending_welcomes=WELCOME_QUEUE_MAX,
+)
+
+
 async def track_channel_members(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """
     Отслеживает изменения в составе участников каналов, где бот является админом,
-    и отправляет приветствие тем, кто вступил самостоятельно.
+    и ставит в очередь приветствие тем, кто вступил самостоятельно.
+    Обработчик ничего не ждет: запись в БД и отправка приветствий идут в фоне.
     """
-    result = update.chat_member
+    result: ChatMemberUpdated = update.chat_member
     if not result:
         return
 
     chat = result.chat
     user = result.new_chat_member.user
-    
+
     # Определяем, что пользователь именно ВСТУПИЛ в канал
-    was_member = result.old_chat_member.status in [ChatMember.MEMBER, ChatMember.ADMINISTRATOR, ChatMember.CREATOR]
-    is_member = result.new_chat_member.status in [ChatMember.MEMBER, ChatMember.ADMINISTRATOR, ChatMember.CREATOR]
+    was_member = result.old_chat_member.status in _MEMBER_STATUSES
+    is_member = result.new_chat_member.status in _MEMBER_STATUSES
 
-    # --- Логика для отслеживания вступления ---
     if not was_member and is_member:
-        # Добавляем подписку в базу данных
-        add_subscription(user_id=user.id, channel_id=chat.id)
-        logger.info(f"Пользователь {user.full_name} (ID: {user.id}) вступил в канал '{chat.title}' (ID: {chat.id}). Запись добавлена в БД.")
-
-        # --- Проверяем, как пользователь вступил ---
-        # Мы отправляем сообщение, только если он вступил НЕ по ссылке бота.
-        joined_via_bot_link = result.invite_link and result.invite_link.creator.id == context.bot.id
-
-        if not joined_via_bot_link:
-            logger.info(f"Пользователь вступил самостоятельно. Отправляем приветствие в ЛС.")
-            
-            welcome_text = (
-                f"Привет, {user.first_name}! 👋\n\n"
-                f"Спасибо за подписку на наш канал «{chat.title}»! "
-                "Рады видеть вас в нашем сообществе."
-            )
-            
-            try:
-                # Пытаемся отправить сообщение в личку
-                await context.bot.send_message(chat_id=user.id, text=welcome_text)
-                logger.info(f"Приветственное сообщение успешно отправлено пользователю {user.id}.")
-            except (Forbidden, BadRequest) as e:
-                # Ошибка возникает, если пользователь не запускал бота или заблокировал его.
-                # Это нормальное поведение, просто логируем его.
-                logger.warning(
-                    f"Не удалось отправить приветствие пользователю {user.id}. "
-                    f"Возможно, он не начинал диалог с ботом. Ошибка: {e}"
-                )
-        else:
-            logger.info(f"Пользователь вступил по ссылке бота. Приветствие не отправляем.")
-
-    # --- Логика для отслеживания выхода ---
+        # Приветствие отправляем, только если пользователь вступил НЕ по ссылке бота
+        joined_via_bot_link = bool(result.invite_link and result.invite_link.creator.id == context.bot.id)
+        member_events.joined(
+            context.bot, user.id, user.first_name, chat.id, chat.title, welcome=not joined_via_bot_link
+        )
     elif was_member and not is_member:
-        # Удаляем подписку из базы данных
-        remove_subscription(user_id=user.id, channel_id=chat.id)
-        logger.info(f"Пользователь {user.full_name} (ID: {user.id}) покинул канал '{chat.title}' (ID: {chat.id}). Запись удалена из БД.")
+        member_events.left(user.id, chat.id, chat.title)
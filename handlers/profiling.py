@@ -0,0 +1,87 @@
+import io
+import logging
+
+from telegram import Update
+from telegram.error import TelegramError
+from telegram.ext import ContextTypes, CommandHandler
+
+from config import PROFILE_MAX_SECONDS, PROFILE_MAX_UPDATES
+from filters.custom_filters import is_admin
+from services.profiling import PROFILE_MODES, ProfileSession, profiler
+
+logger = logging.getLogger(__name__)
+
+PROFILE_USAGE = (
+    "Использование: /profile [cprofile|sample] <N>s|<N>u\n\n"
+    "• cprofile — таблица функций, отсортированная по суммарному времени (.txt)\n"
+    "• sample — выборочный профиль в формате collapsed stacks для flamegraph (.folded)\n"
+    f"• 30s — профилировать 30 секунд, 100u — следующие 100 обновлений "
+    f"(не более {PROFILE_MAX_SECONDS:g} с и {PROFILE_MAX_UPDATES} обновлений)\n"
+    "• /profile stop — остановить текущий сеанс и получить отчет\n\n"
+    "Пример: /profile sample 60s"
+)
+
+
+def _parse_profile_args(args: list[str]) -> ProfileSession:
+    """Разбирает аргументы /profile. Бросает ValueError при неверном формате."""
+    mode, limit = 'cprofile', '30s'
+    for arg in args:
+        arg = arg.lower()
+        if arg in PROFILE_MODES:
+            mode = arg
+        else:
+            limit = arg
+    if limit.endswith('u'):
+        updates = int(limit[:-1])
+        if not 0 < updates <= PROFILE_MAX_UPDATES:
+            raise ValueError(limit)
+        return ProfileSession(mode=mode, updates=updates)
+    seconds = float(limit.removesuffix('s'))
+    if not 0 < seconds <= PROFILE_MAX_SECONDS:
+        raise ValueError(limit)
+    return ProfileSession(mode=mode, seconds=seconds)
+
+
+async def _run_profile(context: ContextTypes.DEFAULT_TYPE, chat_id: int, session: ProfileSession):
+    """Выполняет сеанс профилирования в фоне и отправляет отчет документом."""
+    try:
+        filename, report = await profiler.run(session)
+    except RuntimeError as e:
+        await context.bot.send_message(chat_id=chat_id, text=f"⚠️ {e}")
+        return
+    logger.info(f"Профилирование завершено ({session.describe_result()}), отчет {filename}.")
+    try:
+        await context.bot.send_document(
+            chat_id=chat_id,
+            document=io.BytesIO(report),
+            filename=filename,
+            caption=f"📈 Профиль: {session.describe_result()}",
+        )
+    except TelegramError as e:
+        logger.warning(f"Не удалось отправить отчет профилирования: {e}")
+
+
+async def profile(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Команда /profile: запускает профилирование по времени или по числу обновлений, /profile stop — останавливает."""
+    if [arg.lower() for arg in context.args or []] == ['stop']:
+        if profiler.stop():
+            await update.message.reply_text("⏹ Профилирование остановлено, отчет будет отправлен.")
+        else:
+            await update.message.reply_text("Профилирование не выполняется.")
+        return
+    if profiler.session is not None:
+        await update.message.reply_text(
+            f"Профилирование уже выполняется ({profiler.session.describe()}). Остановить: /profile stop"
+        )
+        return
+    try:
+        session = _parse_profile_args(context.args or [])
+    except ValueError:
+        await update.message.reply_text(PROFILE_USAGE)
+        return
+    # Отчет придет отдельным сообщением, обработчик не ждет окончания сеанса
+    context.application.create_task(_run_profile(context, update.effective_chat.id, session))
+    await update.message.reply_text(f"⏱ Профилирование запущено: {session.describe()}.")
+
+
+profile_handler = CommandHandler("profile", profile, filters=is_admin)
@@ -2,17 +2,27 @@ import logging
 from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton, constants
 from telegram.ext import ContextTypes
 from telegram.error import TelegramError
-from services.database import add_user
+from services.async_database import add_user
+from services.invite_links import get_channel_invite_link
 from config import CHANNEL_BUTTONS_CONFIG
+from keyboards.registry import keyboards
 
 logger = logging.getLogger(__name__)
 
+KB_START_CHANNELS = "start_channels"
+
+def _build_channel_keyboard(buttons: tuple[tuple[str, str], ...]) -> InlineKeyboardMarkup:
+    """Собирает клавиатуру из пар (текст кнопки, ссылка)."""
+    return InlineKeyboardMarkup([[InlineKeyboardButton(label, url=url)] for label, url in buttons])
+
+keyboards.register(KB_START_CHANNELS, _build_channel_keyboard)
+
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Отправляет приветственное сообщение с кнопками-ссылками на каналы."""
     user = update.effective_user
     
     # Добавляем пользователя в базу данных при первом запуске
-    add_user(user_id=user.id, username=user.username, first_name=user.first_name)
+    await add_user(user_id=user.id, username=user.username, first_name=user.first_name)
 
     url_buttons = []
     # --- Создаем кнопки-ссылки на каналы ---
@@ -21,16 +31,9 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
             continue  # Пропускаем, если ID канала не задан в .env
         
         try:
-            # Проверяем, есть ли ссылка в кэше
-            url = context.bot_data.get(group_id)
-            if not url:
-                # Если ссылки нет, создаем новую и кэшируем ее
-                link_obj = await context.bot.create_chat_invite_link(chat_id=group_id)
-                url = link_obj.invite_link
-                context.bot_data[group_id] = url
-                logger.info(f"Создана и закэширована новая ссылка-приглашение для канала {group_id}.")
-            
-            url_buttons.append([InlineKeyboardButton(f"{emoji} {text}", url=url)])
+            # Ссылка берется из кэша (память/БД); параллельные промахи разделяют один запрос к API
+            url = await get_channel_invite_link(context.bot, group_id, text, emoji)
+            url_buttons.append((f"{emoji} {text}", url))
         except TelegramError as e:
             # Если бот не админ или нет прав, кнопка не будет добавлена, а в лог запишется ошибка
             logger.error(
@@ -38,8 +41,8 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
                 f"Убедитесь, что бот является администратором с правом приглашения. Ошибка: {e}"
             )
 
-    # Создаем клавиатуру только из кнопок-ссылок на каналы
-    reply_markup = InlineKeyboardMarkup(url_buttons) if url_buttons else None
+    # Клавиатура из кнопок-ссылок на каналы собирается заново только при изменении ссылок
+    reply_markup = keyboards.get(KB_START_CHANNELS, tuple(url_buttons)) if url_buttons else None
 
     welcome_text = (
         f"Привет, {user.mention_html()}!\n\n"
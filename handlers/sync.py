@@ -0,0 +1,178 @@
+import asyncio
+import datetime
+import logging
+from dataclasses import dataclass, field
+
+from telegram import Bot, Update, Message
+from telegram.error import TelegramError
+from telegram.ext import Application, ContextTypes, CommandHandler
+
+from config import CHANNEL_BUTTONS_CONFIG, SYNC_DAILY_TIME
+from filters.custom_filters import is_admin
+from services.sync import SyncProgress, run_subscriber_sync, run_incremental_sync
+
+logger = logging.getLogger(__name__)
+
+SYNC_JOB_NAME = "subscriber_sync"
+SYNC_DAILY_JOB_NAME = "subscriber_sync_daily"
+
+
+@dataclass
+class SyncRun:
+    """Состояние текущего (или ожидающего запуска) задания синхронизации."""
+    full: bool
+    chat_id: int | None = None
+    task: asyncio.Task | None = None
+    progress: SyncProgress | None = None
+    status_message: Message | None = None
+    cancelled: bool = False
+    started_at: datetime.datetime = field(default_factory=datetime.datetime.now)
+
+
+# Одновременно может выполняться только одна синхронизация
+_current_run: SyncRun | None = None
+
+
+def _format_progress(run: SyncRun) -> str:
+    """Формирует текст о ходе синхронизации."""
+    mode = "полная" if run.full else "инкрементальная"
+    text = f"🔄 Синхронизация подписчиков ({mode}), запущена в {run.started_at:%H:%M:%S}\n\n"
+    progress = run.progress
+    if progress is None:
+        return text + "Подготовка..."
+    eta = f"{int(progress.eta) // 60} мин {int(progress.eta) % 60} с" if progress.eta is not None else "—"
+    return text + (
+        f"Проверено: {progress.done}/{progress.total}\n"
+        f"Скорость: {progress.rate:.1f} запр./с\n"
+        f"Осталось: {eta}"
+    )
+
+
+def get_sync_status_text() -> str:
+    """Возвращает текст о состоянии синхронизации для администратора."""
+    if _current_run is None:
+        return "Синхронизация сейчас не выполняется."
+    return _format_progress(_current_run)
+
+
+def request_subscriber_sync(application: Application, full: bool, chat_id: int | None = None) -> bool:
+    """
+    Ставит синхронизацию в очередь JobQueue. Возвращает False, если синхронизация
+    уже выполняется (или ожидает запуска) — тогда новая не создается.
+    """
+    global _current_run
+    if _current_run is not None:
+        return False
+    _current_run = SyncRun(full=full, chat_id=chat_id)
+    if application.job_queue is None:
+        # Без JobQueue синхронизация запускается обычной фоновой задачей
+        application.create_task(_run_sync(application.bot, _current_run), name=SYNC_JOB_NAME)
+    else:
+        application.job_queue.run_once(subscriber_sync_job, when=0, data=_current_run, name=SYNC_JOB_NAME)
+    return True
+
+
+def cancel_subscriber_sync() -> bool:
+    """Отменяет текущую синхронизацию. Возвращает False, если отменять нечего."""
+    if _current_run is None:
+        return False
+    _current_run.cancelled = True
+    if _current_run.task:
+        _current_run.task.cancel()
+    return True
+
+
+async def _notify(bot: Bot, run: SyncRun, text: str):
+    """Отправляет или обновляет сообщение о синхронизации у администратора, запустившего ее."""
+    if run.chat_id is None:
+        return
+    try:
+        if run.status_message is None:
+            run.status_message = await bot.send_message(chat_id=run.chat_id, text=text)
+        else:
+            await run.status_message.edit_text(text)
+    except TelegramError as e:
+        logger.warning(f"Не удалось обновить сообщение о синхронизации: {e}")
+
+
+async def subscriber_sync_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Задание JobQueue: выполняет синхронизацию (по запросу админа или по расписанию)."""
+    global _current_run
+    run = context.job.data
+    if run is None:
+        # Плановый запуск: пропускаем, если синхронизация уже идет
+        if _current_run is not None:
+            logger.info("Плановая синхронизация пропущена: предыдущая еще выполняется.")
+            return
+        run = _current_run = SyncRun(full=False)
+    await _run_sync(context.bot, run)
+
+
+async def _run_sync(bot: Bot, run: SyncRun):
+    """Выполняет синхронизацию и сообщает о ходе и результате администратору."""
+    global _current_run
+    if run.cancelled:
+        _current_run = None
+        return
+    run.task = asyncio.current_task()
+    channels_to_sync = [config[0] for config in CHANNEL_BUTTONS_CONFIG if config[0]]
+
+    async def report_progress(progress: SyncProgress):
+        run.progress = progress
+        await _notify(bot, run, _format_progress(run))
+
+    logger.info(f"Запуск синхронизации подписчиков ({'полная' if run.full else 'инкрементальная'}).")
+    try:
+        await _notify(bot, run, _format_progress(run))
+        if run.full:
+            result = await run_subscriber_sync(bot, channels_to_sync, on_progress=report_progress)
+            text = f"✅ Синхронизация завершена!\n\nВсего найдено и записано в базу: {result.subscriptions} подписок."
+        else:
+            result = await run_incremental_sync(bot, channels_to_sync, on_progress=report_progress)
+            text = (
+                f"✅ Синхронизация завершена!\n\n"
+                f"Перепроверено пар «пользователь–канал»: {result.checked}\n"
+                f"Подтверждено подписок: {result.subscriptions}"
+            )
+    except asyncio.CancelledError:
+        if not run.cancelled:
+            raise
+        logger.info("Синхронизация подписчиков отменена администратором.")
+        text = "⛔️ Синхронизация отменена. Результаты уже проверенных порций сохранены."
+    except Exception as e:
+        # Администратор должен узнать о сбое, а не ждать вечного «Проверено: N/M»
+        logger.error(f"Синхронизация подписчиков прервана ошибкой: {e}", exc_info=True)
+        text = f"❌ Синхронизация прервана: {e}"
+    finally:
+        _current_run = None
+    await _notify(bot, run, text)
+
+
+def schedule_subscriber_sync(application: Application):
+    """Регистрирует ежедневную инкрементальную синхронизацию (время в UTC, формат ЧЧ:ММ)."""
+    if not SYNC_DAILY_TIME:
+        return
+    if application.job_queue is None:
+        logger.warning("JobQueue недоступна (установите python-telegram-bot[job-queue]), плановая синхронизация отключена.")
+        return
+    hours, minutes = map(int, SYNC_DAILY_TIME.split(':'))
+    run_at = datetime.time(hour=hours, minute=minutes, tzinfo=datetime.timezone.utc)
+    application.job_queue.run_daily(subscriber_sync_job, time=run_at, name=SYNC_DAILY_JOB_NAME)
+    logger.info(f"Плановая синхронизация подписчиков запланирована на {SYNC_DAILY_TIME} UTC.")
+
+
+async def sync_status(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Команда /sync_status: показывает состояние синхронизации."""
+    await update.effective_message.reply_text(get_sync_status_text())
+
+
+async def sync_cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Команда /sync_cancel: отменяет текущую синхронизацию."""
+    if cancel_subscriber_sync():
+        await update.effective_message.reply_text("Отменяю синхронизацию...")
+    else:
+        await update.effective_message.reply_text("Синхронизация сейчас не выполняется.")
+
+
+sync_status_handler = CommandHandler("sync_status", sync_status, filters=is_admin)
+sync_cancel_handler = CommandHandler("sync_cancel", sync_cancel, filters=is_admin)
@@ -1,5 +1,7 @@
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
 
+from .registry import keyboards
+
 # Определим названия групп и их callback_data для идентификации
 # В будущем это можно будет загружать из конфига или базы данных
 GROUP_CHOICES = {
@@ -8,9 +10,16 @@ GROUP_CHOICES = {
     "Пляжный отдых 🏖️": "join_group_beach"
 }
 
-def get_group_selection_keyboard() -> InlineKeyboardMarkup:
-    """Создает и возвращает клавиатуру для выбора группы."""
+KB_GROUP_SELECTION = "group_selection"
+
+def _build_group_selection_keyboard(choices: tuple[tuple[str, str], ...]) -> InlineKeyboardMarkup:
     keyboard = [
-        [InlineKeyboardButton(text, callback_data=data)] for text, data in GROUP_CHOICES.items()
+        [InlineKeyboardButton(text, callback_data=data)] for text, data in choices
     ]
     return InlineKeyboardMarkup(keyboard)
+
+keyboards.register(KB_GROUP_SELECTION, _build_group_selection_keyboard, inputs=lambda: tuple(GROUP_CHOICES.items()))
+
+def get_group_selection_keyboard() -> InlineKeyboardMarkup:
+    """Возвращает клавиатуру для выбора группы (общий экземпляр из реестра)."""
+    return keyboards.get(KB_GROUP_SELECTION)
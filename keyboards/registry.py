@@ -0,0 +1,58 @@
+from typing import Any, Callable, Hashable
+
+from telegram import InlineKeyboardMarkup
+
+BuildFunc = Callable[[Any], InlineKeyboardMarkup]
+
+
+def _no_inputs() -> Hashable:
+    return None
+
+
+class KeyboardRegistry:
+    """
+    Реестр готовых клавиатур.
+
+    Каждая клавиатура собирается один раз и раздается всем обработчикам как общий
+    экземпляр (объекты PTB неизменяемы, поэтому это безопасно). Клавиатура
+    пересобирается, только когда меняются ее входные данные (ключ).
+    """
+
+    def __init__(self):
+        # имя -> (функция сборки, функция получения ключа)
+        self._builders: dict[str, tuple[BuildFunc, Callable[[], Hashable]]] = {}
+        # имя -> (ключ, собранная клавиатура)
+        self._built: dict[str, tuple[Hashable, InlineKeyboardMarkup]] = {}
+
+    def register(self, name: str, build: BuildFunc, inputs: Callable[[], Hashable] = _no_inputs):
+        """
+        Регистрирует клавиатуру. `build` получает ключ и возвращает разметку;
+        `inputs` возвращает ключ — входные данные, при изменении которых клавиатуру нужно пересобрать.
+        """
+        self._builders[name] = (build, inputs)
+        self._built.pop(name, None)
+
+    def get(self, name: str, key: Hashable = None) -> InlineKeyboardMarkup:
+        """
+        Возвращает клавиатуру, пересобирая ее при изменении ключа.
+        Ключ можно передать явно (например, список актуальных ссылок), иначе он берется из `inputs`.
+        """
+        build, inputs = self._builders[name]
+        if key is None:
+            key = inputs()
+        built = self._built.get(name)
+        if built is not None and built[0] == key:
+            return built[1]
+        markup = build(key)
+        self._built[name] = (key, markup)
+        return markup
+
+    def invalidate(self, name: str | None = None):
+        """Сбрасывает собранную клавиатуру (или все клавиатуры)."""
+        if name is None:
+            self._built.clear()
+        else:
+            self._built.pop(name, None)
+
+
+keyboards = KeyboardRegistry()
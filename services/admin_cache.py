@@ -0,0 +1,70 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, Iterable
+
+
+class AdminCache:
+    """
+    Кэш множества ID администраторов с проверкой за O(1).
+
+    Сбрасывается явно при добавлении/удалении админа и, если задан `ttl`,
+    периодически перечитывается из БД (на случай изменений из других процессов).
+    """
+
+    def __init__(
+        self,
+        load: Callable[[], Iterable[int]],
+        load_async: Callable[[], Awaitable[Iterable[int]]],
+        ttl: float = 0,
+    ):
+        self._load = load
+        self._load_async = load_async
+        self.ttl = ttl
+        self._admins: frozenset[int] | None = None
+        self._loaded_at = 0.0
+        self._refresh_task: asyncio.Task | None = None
+
+    def _store(self, admin_ids: Iterable[int]) -> frozenset[int]:
+        self._admins = frozenset(admin_ids)
+        self._loaded_at = time.monotonic()
+        return self._admins
+
+    def _is_expired(self) -> bool:
+        return self.ttl > 0 and time.monotonic() - self._loaded_at > self.ttl
+
+    def invalidate(self):
+        """Сбрасывает кэш: следующее обращение перечитает список из БД."""
+        self._admins = None
+
+    async def refresh(self) -> frozenset[int]:
+        """Перечитывает список администраторов из БД."""
+        return self._store(await self._load_async())
+
+    def _schedule_refresh(self):
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.get_running_loop().create_task(self.refresh())
+
+    def get(self) -> frozenset[int]:
+        """
+        Синхронно возвращает множество администраторов (для фильтров PTB).
+        Пустой или устаревший по TTL кэш обновляется в фоне, а до этого отдается текущее
+        значение: пустой кэш — никого не считает админом, зато не блокирует цикл событий
+        запросом к БД. Кэш заполняется при запуске бота (post_init), поэтому на практике
+        пустым он бывает только вне цикла событий — тогда список читается синхронно.
+        """
+        if self._admins is None or self._is_expired():
+            try:
+                self._schedule_refresh()
+            except RuntimeError:
+                # Нет запущенного цикла событий — обновляем синхронно
+                return self._store(self._load())
+        return self._admins if self._admins is not None else frozenset()
+
+    async def get_async(self) -> frozenset[int]:
+        """Возвращает множество администраторов, при необходимости загружая его в потоке БД."""
+        if self._admins is None or self._is_expired():
+            return await self.refresh()
+        return self._admins
+
+    def contains(self, user_id: int) -> bool:
+        return user_id in self.get()
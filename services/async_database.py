@@ -0,0 +1,156 @@
+# Асинхронные обертки над services.database для использования в обработчиках.
+# Все запросы выполняются в одном выделенном потоке, поэтому медленный fsync
+# или блокировка SQLite не останавливают цикл событий. Синхронные функции
+# из services.database остаются доступными для скриптов.
+import asyncio
+import functools
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable
+
+from config import WRITE_BUFFER_FLUSH_INTERVAL, WRITE_BUFFER_MAX_SIZE, ADMIN_CACHE_TTL
+from services import database
+from services.admin_cache import AdminCache
+from services.metrics import db_latency, timed_call
+from services.write_buffer import WriteBehindBuffer
+
+# Один поток: все обращения к общему соединению SQLite идут последовательно
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db")
+
+
+async def run_in_db_thread(func: Callable[..., Any], *args, **kwargs) -> Any:
+    """Выполняет синхронную функцию работы с БД в потоке базы данных."""
+    loop = asyncio.get_running_loop()
+    # timed_call записывает время запроса в метрики (если они включены)
+    return await loop.run_in_executor(
+        _executor, functools.partial(timed_call, db_latency, func.__name__, func, *args, **kwargs)
+    )
+
+
+def _make_async(func: Callable[..., Any], fresh: bool = False) -> Callable[..., Any]:
+    """
+    Делает асинхронную обертку. При fresh=True перед запросом сбрасываются
+    отложенные записи, чтобы он увидел актуальные данные о пользователях и подписках.
+    """
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        if fresh:
+            # Поток БД выполняет задачи по очереди, поэтому запрос пойдет после записи
+            await write_buffer.flush()
+        return await run_in_db_thread(func, *args, **kwargs)
+    return wrapper
+
+
+# Отложенная запись пользователей и подписок: частые одиночные записи из /start
+# и chat_member объединяются в одну транзакцию
+write_buffer = WriteBehindBuffer(
+    apply=_make_async(database.apply_write_batch),
+    flush_interval=WRITE_BUFFER_FLUSH_INTERVAL,
+    max_size=WRITE_BUFFER_MAX_SIZE,
+)
+
+# Кэш множества администраторов для проверки прав без обращения к БД
+admin_cache = AdminCache(
+    load=database.get_all_admins,
+    load_async=_make_async(database.get_all_admins),
+    ttl=ADMIN_CACHE_TTL,
+)
+
+
+async def close_db():
+    """Сбрасывает отложенные записи, закрывает соединение с БД и останавливает поток базы данных."""
+    await write_buffer.close()
+    await run_in_db_thread(database.close_db)
+    _executor.shutdown(wait=True)
+
+
+# --- Пользователи и подписки ---
+async def add_user(user_id: int, username: str, first_name: str):
+    write_buffer.add_user(user_id, username, first_name)
+
+async def add_subscription(user_id: int, channel_id: int):
+    write_buffer.set_subscription(user_id, channel_id, True)
+
+async def remove_subscription(user_id: int, channel_id: int):
+    write_buffer.set_subscription(user_id, channel_id, False)
+
+get_user_ids_by_channel = _make_async(database.get_user_ids_by_channel, fresh=True)
+get_all_users = _make_async(database.get_all_users, fresh=True)
+get_user_count = _make_async(database.get_user_count, fresh=True)
+get_channel_stats = _make_async(database.get_channel_stats, fresh=True)
+full_resync_channel_members = _make_async(database.full_resync_channel_members, fresh=True)
+
+# --- Синхронизация подписок ---
+count_stale_users = _make_async(database.count_stale_users, fresh=True)
+get_stale_users_page = _make_async(database.get_stale_users_page, fresh=True)
+count_stale_subscriptions = _make_async(database.count_stale_subscriptions, fresh=True)
+get_stale_subscriptions_page = _make_async(database.get_stale_subscriptions_page, fresh=True)
+apply_subscription_checks = _make_async(database.apply_subscription_checks, fresh=True)
+remove_unknown_users_subscriptions = _make_async(database.remove_unknown_users_subscriptions, fresh=True)
+
+async def iter_stale_users(max_age_seconds: int, page_size: int = database.AUDIENCE_PAGE_SIZE) -> AsyncIterator[array]:
+    """Постранично перебирает пользователей с устаревшей проверкой подписок."""
+    after_user_id = 0
+    while page := await get_stale_users_page(max_age_seconds, after_user_id, page_size):
+        yield page
+        after_user_id = page[-1]
+
+async def iter_stale_subscriptions(
+    max_age_seconds: int,
+    channel_ids: list[int],
+    page_size: int = database.AUDIENCE_PAGE_SIZE,
+) -> AsyncIterator[list[tuple[int, int]]]:
+    """Постранично перебирает пары (channel_id, user_id) с устаревшей проверкой подписки."""
+    after = (0, 0)
+    while page := await get_stale_subscriptions_page(max_age_seconds, channel_ids, after, page_size):
+        yield page
+        channel_id, user_id = page[-1]
+        after = (user_id, channel_id)
+
+# --- Задания рассылки ---
+create_broadcast_job = _make_async(database.create_broadcast_job)
+update_broadcast_checkpoint = _make_async(database.update_broadcast_checkpoint)
+finish_broadcast_job = _make_async(database.finish_broadcast_job)
+get_broadcast_job = _make_async(database.get_broadcast_job)
+get_unfinished_broadcast_jobs = _make_async(database.get_unfinished_broadcast_jobs)
+
+# --- Аудитория рассылок ---
+get_audience_page = _make_async(database.get_audience_page, fresh=True)
+get_audience_size = _make_async(database.get_audience_size, fresh=True)
+
+async def iter_audience(target: str, after_user_id: int = 0, page_size: int = database.AUDIENCE_PAGE_SIZE) -> AsyncIterator[array]:
+    """
+    Постранично перебирает получателей (по возрастанию ID) порциями в компактных массивах,
+    не загружая всю аудиторию в память. `target` — 'all' или ID канала.
+    """
+    while page := await get_audience_page(target, after_user_id, page_size):
+        yield page
+        after_user_id = page[-1]
+
+# --- Ссылки-приглашения ---
+get_invite_link = _make_async(database.get_invite_link)
+save_invite_link = _make_async(database.save_invite_link)
+delete_invite_links_except = _make_async(database.delete_invite_links_except)
+
+# --- Команды бота ---
+get_command_hashes = _make_async(database.get_command_hashes)
+save_command_hash = _make_async(database.save_command_hash)
+delete_command_hash = _make_async(database.delete_command_hash)
+
+# --- Администраторы ---
+async def add_admin(user_id: int) -> bool:
+    added = await run_in_db_thread(database.add_admin, user_id)
+    if added:
+        # Кэш не сбрасывается: до окончания чтения фильтры видят прежний список, а не пустой
+        await admin_cache.refresh()
+    return added
+
+async def remove_admin(user_id: int) -> bool:
+    removed = await run_in_db_thread(database.remove_admin, user_id)
+    if removed:
+        # Кэш не сбрасывается: до окончания чтения фильтры видят прежний список, а не пустой
+        await admin_cache.refresh()
+    return removed
+
+get_all_admins = _make_async(database.get_all_admins)
+is_admin = _make_async(database.is_admin)
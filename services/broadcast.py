@@ -0,0 +1,211 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import AsyncIterable, Awaitable, Callable, Sequence
+
+from telegram import Bot, InputMedia, InputMediaPhoto, InputMediaVideo
+from telegram.constants import ParseMode
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter, TelegramError
+
+from config import BROADCAST_CONCURRENCY, BROADCAST_MAX_RETRIES, BROADCAST_CHECKPOINT_EVERY
+from services.async_database import (
+    get_broadcast_job,
+    get_unfinished_broadcast_jobs,
+    iter_audience,
+    update_broadcast_checkpoint,
+    finish_broadcast_job,
+)
+from services.outbound import Lane
+
+logger = logging.getLogger(__name__)
+
+# Экспоненциальная задержка при сетевых ошибках (секунды)
+_BACKOFF_BASE = 1.0
+_BACKOFF_MAX = 30.0
+
+SendFunc = Callable[[int], Awaitable[object]]
+CheckpointFunc = Callable[[int, "BroadcastResult"], Awaitable[None]]
+
+# Запущенные задания рассылки: job_id -> задача asyncio
+_active_jobs: dict[int, asyncio.Task] = {}
+
+
+@dataclass
+class BroadcastResult:
+    """Итог рассылки."""
+    success_count: int = 0
+    error_count: int = 0
+
+
+def make_copy_sender(bot: Bot, from_chat_id: int, message_id: int) -> SendFunc:
+    """Возвращает функцию, копирующую одно сообщение пользователю."""
+    async def send(chat_id: int):
+        return await bot.copy_message(
+            chat_id=chat_id, from_chat_id=from_chat_id, message_id=message_id, rate_limit_args=Lane.BULK
+        )
+    return send
+
+
+def make_media_group_sender(bot: Bot, media: list[InputMedia]) -> SendFunc:
+    """Возвращает функцию, отправляющую медиагруппу пользователю."""
+    async def send(chat_id: int):
+        return await bot.send_media_group(
+            chat_id=chat_id, media=media, read_timeout=30, write_timeout=30, rate_limit_args=Lane.BULK
+        )
+    return send
+
+
+def make_sender(bot: Bot, payload: dict) -> SendFunc:
+    """Восстанавливает функцию отправки из сохраненного в задании содержимого."""
+    if payload['type'] == 'media_group':
+        media = []
+        caption = payload.get('caption')
+        for i, (kind, file_id) in enumerate(payload['items']):
+            extra_args = {'caption': caption, 'parse_mode': ParseMode.HTML} if i == 0 and caption else {}
+            media_cls = InputMediaPhoto if kind == 'photo' else InputMediaVideo
+            media.append(media_cls(media=file_id, **extra_args))
+        return make_media_group_sender(bot, media)
+    return make_copy_sender(bot, payload['from_chat_id'], payload['message_id'])
+
+
+async def deliver(send: SendFunc, chat_id: int, max_retries: int = BROADCAST_MAX_RETRIES) -> bool:
+    """
+    Отправляет одно сообщение. Темп и паузы после RetryAfter обеспечивает планировщик
+    исходящих сообщений (services/outbound.py); здесь повторяются попытки после сетевых
+    ошибок и после RetryAfter, если планировщик исчерпал свои повторы. Возвращает True при успехе.
+    """
+    for attempt in range(max_retries + 1):
+        try:
+            await send(chat_id)
+            return True
+        except RetryAfter as e:
+            # Все отправки уже приостановлены планировщиком — просто пробуем снова
+            logger.warning(f"Флуд-контроль при отправке пользователю {chat_id} (повтор через {e.retry_after} с).")
+        except (Forbidden, BadRequest) as e:
+            # Пользователь заблокировал бота или чат недоступен — повторять бессмысленно
+            logger.warning(f"Не удалось отправить сообщение пользователю {chat_id}: {e}")
+            return False
+        except NetworkError as e:
+            delay = min(_BACKOFF_BASE * 2 ** attempt, _BACKOFF_MAX)
+            logger.warning(f"Сетевая ошибка при отправке пользователю {chat_id}: {e}. Повтор через {delay} с.")
+            await asyncio.sleep(delay)
+        except TelegramError as e:
+            logger.error(f"Не удалось отправить сообщение пользователю {chat_id}: {e}")
+            return False
+    logger.error(f"Исчерпаны попытки отправки пользователю {chat_id}.")
+    return False
+
+
+async def run_broadcast(
+    batches: AsyncIterable[Sequence[int]],
+    send: SendFunc,
+    concurrency: int = BROADCAST_CONCURRENCY,
+    checkpoint: CheckpointFunc | None = None,
+    result: BroadcastResult | None = None,
+) -> BroadcastResult:
+    """
+    Рассылает сообщение всем получателям из `batches` с ограниченным параллелизмом.
+    Темп задает планировщик исходящих сообщений: рассылка идет с низшим приоритетом
+    и не задерживает ответы пользователям.
+
+    Получатели приходят пачками (см. iter_audience), так что в памяти держится только
+    текущая пачка. После каждой пачки вызывается `checkpoint` с ID последнего
+    получателя пачки, поэтому получатели должны идти по возрастанию ID.
+    """
+    result = result if result is not None else BroadcastResult()
+
+    async for batch in batches:
+        batch_iter = iter(batch)
+
+        async def worker():
+            # Все воркеры берут получателей из одного итератора
+            for user_id in batch_iter:
+                if await deliver(send, user_id):
+                    result.success_count += 1
+                else:
+                    result.error_count += 1
+
+        await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+        if checkpoint:
+            await checkpoint(batch[-1], result)
+    return result
+
+
+def start_broadcast_job(bot: Bot, job_id: int) -> asyncio.Task:
+    """
+    Запускает задание рассылки в фоне (или возвращает уже запущенное).
+    Получатели берутся из БД постранично, начиная с сохраненного курсора.
+    """
+    task = _active_jobs.get(job_id)
+    if task and not task.done():
+        return task
+    task = asyncio.create_task(_run_broadcast_job(bot, job_id), name=f"broadcast-{job_id}")
+    _active_jobs[job_id] = task
+    task.add_done_callback(lambda _: _active_jobs.pop(job_id, None))
+    return task
+
+
+async def _run_broadcast_job(bot: Bot, job_id: int):
+    """Выполняет задание рассылки с сохранением прогресса и отправляет отчет администратору."""
+    job = await get_broadcast_job(job_id)
+    if not job or job['status'] != 'running':
+        return
+    if job['last_user_id']:
+        logger.info(f"Возобновляю рассылку #{job_id} после пользователя {job['last_user_id']}.")
+    batches = iter_audience(job['target'], job['last_user_id'], BROADCAST_CHECKPOINT_EVERY)
+
+    async def checkpoint(last_user_id: int, progress: BroadcastResult):
+        await update_broadcast_checkpoint(job_id, last_user_id, progress.success_count, progress.error_count)
+
+    result = BroadcastResult(job['success_count'], job['error_count'])
+    try:
+        send = make_sender(bot, job['payload'])
+        await run_broadcast(batches, send, checkpoint=checkpoint, result=result)
+    except asyncio.CancelledError:
+        # Остановка бота: задание останется незавершенным и продолжится после перезапуска
+        logger.info(f"Рассылка #{job_id} прервана, прогресс сохранен.")
+        raise
+    except Exception as e:
+        # Ошибка не в доставке отдельному пользователю (например, неверный payload):
+        # при перезапуске она повторилась бы, поэтому задание не возобновляется
+        logger.exception(f"Рассылка #{job_id} завершилась с ошибкой.")
+        await finish_broadcast_job(job_id, 'failed')
+        await _notify_admin(
+            bot, job_id, job['admin_chat_id'],
+            f"❌ Рассылка #{job_id} остановлена из-за ошибки: {type(e).__name__}: {e}\n\n"
+            f"👍 Отправлено: {result.success_count}\n👎 Ошибок: {result.error_count}"
+        )
+        return
+
+    await finish_broadcast_job(job_id)
+    logger.info(f"Рассылка #{job_id} завершена. Отправлено: {result.success_count}, ошибок: {result.error_count}.")
+    await _notify_admin(
+        bot, job_id, job['admin_chat_id'],
+        f"✅ Рассылка завершена!\n\n👍 Отправлено: {result.success_count}\n👎 Ошибок: {result.error_count}"
+    )
+
+
+async def _notify_admin(bot: Bot, job_id: int, admin_chat_id: int, text: str):
+    try:
+        await bot.send_message(chat_id=admin_chat_id, text=text)
+    except TelegramError as e:
+        logger.warning(f"Не удалось отправить отчет о рассылке #{job_id} администратору: {e}")
+
+
+async def stop_broadcast_jobs():
+    """
+    Прерывает идущие рассылки при остановке бота (до закрытия БД). Задания остаются
+    незавершенными и продолжатся с последней контрольной точки после перезапуска.
+    """
+    tasks = list(_active_jobs.values())
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def resume_broadcast_jobs(bot: Bot) -> int:
+    """Возобновляет все незавершенные задания рассылки. Возвращает их количество."""
+    job_ids = await get_unfinished_broadcast_jobs()
+    for job_id in job_ids:
+        start_broadcast_job(bot, job_id)
+    return len(job_ids)
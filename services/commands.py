@@ -0,0 +1,112 @@
+import asyncio
+import hashlib
+import json
+import logging
+
+from telegram import Bot, BotCommand, BotCommandScopeChat
+from telegram.error import RetryAfter, TelegramError
+
+from config import SUPER_ADMIN_ID, COMMANDS_RATE_LIMIT
+from services.async_database import admin_cache, get_command_hashes, save_command_hash, delete_command_hash
+from services.rate_limiter import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+ADMIN_COMMANDS = [
+    BotCommand("admin", "Открыть панель администратора"),
+    BotCommand("sync_status", "Состояние синхронизации подписчиков"),
+    BotCommand("sync_cancel", "Отменить синхронизацию подписчиков"),
+    BotCommand("profile", "Профилирование бота"),
+]
+# Предполагаем, что команда для управления админами - /manage_admins
+SUPER_ADMIN_COMMANDS = ADMIN_COMMANDS + [
+    BotCommand("manage_admins", "Управление администраторами"),
+]
+
+# Сколько раз повторять запрос после RetryAfter
+_MAX_RETRIES = 3
+
+commands_limiter = TokenBucket(COMMANDS_RATE_LIMIT)
+
+
+def commands_hash(commands: list[BotCommand]) -> str:
+    """Хэш набора команд: по нему определяется, нужно ли заново вызывать set_my_commands."""
+    data = json.dumps([(command.command, command.description) for command in commands], ensure_ascii=False)
+    return hashlib.sha1(data.encode()).hexdigest()
+
+
+def _desired_commands(admin_ids) -> dict[int, list[BotCommand]]:
+    """Какой набор команд должен быть у каждого чата администратора."""
+    desired = {int(admin_id): ADMIN_COMMANDS for admin_id in admin_ids}
+    if SUPER_ADMIN_ID:
+        # Команды супер-админа не перезаписываются командами обычного админа
+        desired[int(SUPER_ADMIN_ID)] = SUPER_ADMIN_COMMANDS
+    return desired
+
+
+async def _call_with_retry(func, *args, **kwargs):
+    for attempt in range(_MAX_RETRIES + 1):
+        await commands_limiter.acquire()
+        try:
+            return await func(*args, **kwargs)
+        except RetryAfter as e:
+            if attempt == _MAX_RETRIES:
+                raise
+            commands_limiter.pause(float(e.retry_after))
+
+
+async def _set_commands(bot: Bot, chat_id: int, commands: list[BotCommand], new_hash: str) -> bool:
+    try:
+        await _call_with_retry(bot.set_my_commands, commands, scope=BotCommandScopeChat(chat_id=chat_id))
+    except TelegramError as e:
+        logger.warning(f"Не удалось установить команды для чата {chat_id}: {e}")
+        return False
+    await save_command_hash(chat_id, new_hash)
+    return True
+
+
+async def _delete_commands(bot: Bot, chat_id: int) -> bool:
+    try:
+        await _call_with_retry(bot.delete_my_commands, scope=BotCommandScopeChat(chat_id=chat_id))
+    except TelegramError as e:
+        logger.warning(f"Не удалось удалить команды для чата {chat_id}: {e}")
+        return False
+    await delete_command_hash(chat_id)
+    return True
+
+
+async def sync_admin_commands(bot: Bot) -> tuple[int, int]:
+    """
+    Приводит команды в чатах администраторов к нужному набору. Чаты, у которых
+    хэш установленного набора не изменился, пропускаются; остальные запросы
+    выполняются параллельно с ограничением скорости. Возвращает (обновлено, удалено).
+    """
+    desired = _desired_commands(await admin_cache.get_async())
+    stored = await get_command_hashes()
+
+    to_set = []
+    for chat_id, commands in desired.items():
+        new_hash = commands_hash(commands)
+        if stored.get(chat_id) != new_hash:
+            to_set.append(_set_commands(bot, chat_id, commands, new_hash))
+    # Бывшие администраторы (например, удаленные, пока бот был выключен)
+    to_delete = [_delete_commands(bot, chat_id) for chat_id in stored if chat_id not in desired]
+
+    results = await asyncio.gather(*to_set, *to_delete)
+    updated, deleted = sum(results[:len(to_set)]), sum(results[len(to_set):])
+    logger.info(
+        f"Команды администраторов: обновлено {updated}, удалено {deleted}, "
+        f"без изменений {len(desired) - len(to_set)}."
+    )
+    return updated, deleted
+
+
+async def update_admin_commands(bot: Bot, user_id: int):
+    """Обновляет команды одного чата после назначения или снятия администратора."""
+    user_id = int(user_id)
+    desired = _desired_commands(await admin_cache.get_async())
+    if user_id in desired:
+        commands = desired[user_id]
+        await _set_commands(bot, user_id, commands, commands_hash(commands))
+    else:
+        await _delete_commands(bot, user_id)
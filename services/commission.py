@@ -0,0 +1,97 @@
+import bisect
+import math
+from typing import NamedTuple, Sequence
+
+# NumPy нужен только для расчета больших таблиц цен; без него работает построчный расчет
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class CommissionSegment(NamedTuple):
+    """
+    Участок шкалы комиссии: цены до `upper` включительно.
+    Процент = max(percent - ((цена - start) / step) * decrement, 0);
+    для постоянного процента decrement = 0.
+    """
+    upper: float
+    percent: float
+    start: float = 0.0
+    step: float = 1.0
+    decrement: float = 0.0
+
+
+# Шкала комиссии по возрастанию верхней границы цены
+COMMISSION_TABLE = (
+    CommissionSegment(100000, 10.0),
+    # От 10% минус 0,15 п.п. за каждые 50 000 сверх 100 000
+    CommissionSegment(1700000, 10.0, start=100000, step=50000, decrement=0.15),
+    CommissionSegment(1800000, 5.2),
+    CommissionSegment(1900000, 5.1),
+    CommissionSegment(3050000, 5.0),
+    # От 5% минус 0,02 п.п. за каждые 50 000 сверх 3 050 000
+    CommissionSegment(6000000, 5.0, start=3050000, step=50000, decrement=0.02),
+    CommissionSegment(float('inf'), 2.8),  # Для всех цен выше 6 000 000
+)
+
+# Границы участков для поиска bisect'ом
+_UPPER_BOUNDS = [segment.upper for segment in COMMISSION_TABLE]
+
+# Та же шкала в виде массивов для векторного расчета
+if np is not None:
+    _NP_BOUNDS = np.array(_UPPER_BOUNDS, dtype=np.float64)
+    _NP_PERCENT, _NP_START, _NP_STEP, _NP_DECREMENT = (
+        np.array([getattr(segment, field) for segment in COMMISSION_TABLE], dtype=np.float64)
+        for field in ('percent', 'start', 'step', 'decrement')
+    )
+
+
+def is_valid_price(price) -> bool:
+    return isinstance(price, (int, float)) and math.isfinite(price) and price > 0
+
+
+def calculate_commission(price: float) -> tuple[float, float]:
+    """
+    Рассчитывает процент и сумму комиссии для одной цены.
+
+    Raises:
+        ValueError: Если цена не является положительным числом.
+    """
+    if not is_valid_price(price):
+        raise ValueError("Сумма должна быть положительным числом.")
+
+    segment = COMMISSION_TABLE[bisect.bisect_left(_UPPER_BOUNDS, price)]
+    commission_percent = max(segment.percent - ((price - segment.start) / segment.step) * segment.decrement, 0)
+    commission_amount = price * commission_percent / 100
+    return commission_percent, commission_amount
+
+
+def calculate_commissions(prices: Sequence[float]) -> tuple[list[float], list[float]]:
+    """
+    Рассчитывает комиссию для списка цен. Возвращает (проценты, суммы);
+    для некорректных цен (не число, не больше нуля) в обоих списках NaN.
+
+    С NumPy расчет выполняется над массивами теми же операциями в том же порядке,
+    что и в calculate_commission, поэтому результаты совпадают до бита.
+    """
+    if np is None:
+        percents, amounts = [], []
+        for price in prices:
+            percent, amount = calculate_commission(price) if is_valid_price(price) else (math.nan, math.nan)
+            percents.append(percent)
+            amounts.append(amount)
+        return percents, amounts
+
+    values = np.asarray(prices, dtype=np.float64)
+    valid = np.isfinite(values) & (values > 0)
+    index = np.searchsorted(_NP_BOUNDS, values, side='left').clip(max=len(COMMISSION_TABLE) - 1)
+    # NaN и бесконечности дают NaN в результате, такие цены все равно отбрасываются ниже
+    with np.errstate(invalid='ignore'):
+        percents = np.maximum(
+            _NP_PERCENT[index] - ((values - _NP_START[index]) / _NP_STEP[index]) * _NP_DECREMENT[index], 0
+        )
+        amounts = values * percents / 100
+    percents[~valid] = np.nan
+    amounts[~valid] = np.nan
+    return percents.tolist(), amounts.tolist()
@@ -1,26 +1,79 @@
 # c:\Users\Lenovo\Desktop\bottravel\services\database.py
 
+import json
 import sqlite3
 import logging
+import threading
+from array import array
 from contextlib import contextmanager
+from typing import Iterable, Iterator
+
+from services.segments import is_segment_target, load_segment, required_channels, compile_segment
 
 DB_NAME = 'bot_database.db'
 logger = logging.getLogger(__name__)
 
+# Размер страничного кэша SQLite в КиБ и число подготовленных выражений, которые держит соединение
+DB_CACHE_SIZE_KIB = 16384
+DB_CACHED_STATEMENTS = 256
+# Размер страницы при постраничном переборе пользователей
+AUDIENCE_PAGE_SIZE = 1000
+
+# Одно долгоживущее соединение на процесс. Доступ к нему сериализуется блокировкой,
+# поэтому его можно использовать из разных потоков.
+_connection: sqlite3.Connection | None = None
+_connection_lock = threading.RLock()
+
+def _open_connection() -> sqlite3.Connection:
+    """Открывает соединение и настраивает SQLite: WAL, synchronous=NORMAL, размер кэша."""
+    conn = sqlite3.connect(DB_NAME, check_same_thread=False, cached_statements=DB_CACHED_STATEMENTS)
+    conn.row_factory = sqlite3.Row
+    # WAL позволяет читать во время записи, а synchronous=NORMAL в режиме WAL
+    # не делает fsync на каждый коммит, оставаясь устойчивым к сбоям процесса
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA cache_size=-{DB_CACHE_SIZE_KIB}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA busy_timeout=5000")
+    return conn
+
 @contextmanager
 def db_connection():
-    """Контекстный менеджер для работы с базой данных."""
-    conn = None
-    try:
-        conn = sqlite3.connect(DB_NAME)
-        conn.row_factory = sqlite3.Row
-        yield conn
-    except sqlite3.Error as e:
-        logger.error(f"Database error: {e}")
-        raise
-    finally:
-        if conn:
-            conn.close()
+    """
+    Контекстный менеджер для работы с базой данных.
+    Выдает общее долгоживущее соединение; незакоммиченные изменения откатываются при выходе.
+    """
+    global _connection
+    with _connection_lock:
+        try:
+            if _connection is None:
+                _connection = _open_connection()
+            conn = _connection
+        except sqlite3.Error as e:
+            logger.error(f"Database error: {e}")
+            raise
+        try:
+            yield conn
+        except sqlite3.Error as e:
+            logger.error(f"Database error: {e}")
+            raise
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+
+def close_db():
+    """Закрывает общее соединение с базой данных (при остановке бота)."""
+    global _connection
+    with _connection_lock:
+        if _connection is not None:
+            _connection.close()
+            _connection = None
+
+def _ensure_column(cursor: sqlite3.Cursor, table: str, column: str, column_type: str):
+    """Добавляет колонку в существующую таблицу, если ее там еще нет."""
+    cursor.execute(f"PRAGMA table_info({table})")
+    if column not in {row[1] for row in cursor.fetchall()}:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
 
 def init_db():
     """Инициализирует таблицы в базе данных, если они не существуют."""
@@ -31,7 +84,8 @@ def init_db():
             CREATE TABLE IF NOT EXISTS users (
                 user_id INTEGER PRIMARY KEY,
                 username TEXT,
-                first_name TEXT
+                first_name TEXT,
+                last_verified_at TEXT
             )
         ''')
         # Таблица подписок
@@ -39,38 +93,159 @@ def init_db():
             CREATE TABLE IF NOT EXISTS subscriptions (
                 user_id INTEGER,
                 channel_id INTEGER,
+                last_verified_at TEXT,
                 PRIMARY KEY (user_id, channel_id)
             )
         ''')
+        # Миграция баз, созданных до появления отметок о проверке подписок
+        _ensure_column(cursor, 'users', 'last_verified_at', 'TEXT')
+        _ensure_column(cursor, 'subscriptions', 'last_verified_at', 'TEXT')
         # Новая таблица администраторов
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS admins (
                 user_id INTEGER PRIMARY KEY
             )
         ''')
+        # Задания рассылки: last_user_id — курсор, до которого включительно рассылка уже выполнена
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS broadcast_jobs (
+                job_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                admin_chat_id INTEGER NOT NULL,
+                target TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'running',
+                last_user_id INTEGER NOT NULL DEFAULT 0,
+                success_count INTEGER NOT NULL DEFAULT 0,
+                error_count INTEGER NOT NULL DEFAULT 0,
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                finished_at TEXT
+            )
+        ''')
+        # Кэш ссылок-приглашений: config_hash — отпечаток записи канала в CHANNEL_BUTTONS_CONFIG
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS invite_links (
+                channel_id INTEGER PRIMARY KEY,
+                invite_link TEXT NOT NULL,
+                config_hash TEXT NOT NULL,
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        # Хэши наборов команд, установленных через set_my_commands для чатов администраторов
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS command_scopes (
+                chat_id INTEGER PRIMARY KEY,
+                commands_hash TEXT NOT NULL
+            )
+        ''')
+        # Индексы: выборка подписчиков канала (по возрастанию user_id) и поиск устаревших проверок
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_subscriptions_channel ON subscriptions (channel_id, user_id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_subscriptions_verified ON subscriptions (last_verified_at)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_verified ON users (last_verified_at)")
+        # Счетчики для статистики: 'users' (channel_id = 0) и 'subscribers' по каналам.
+        # Поддерживаются триггерами, поэтому любые вставки/удаления (add/remove/resync/пакетная запись)
+        # обновляют их в той же транзакции.
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS counters (
+                name TEXT NOT NULL,
+                channel_id INTEGER NOT NULL DEFAULT 0,
+                value INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (name, channel_id)
+            )
+        ''')
+        for trigger_sql in _COUNTER_TRIGGERS_SQL:
+            cursor.execute(trigger_sql)
+        cursor.execute("SELECT 1 FROM counters LIMIT 1")
+        if cursor.fetchone() is None:
+            # Новая таблица счетчиков (или пустая база): заполняем по текущим данным
+            _rebuild_counters(cursor)
+        conn.commit()
+
+_COUNTER_TRIGGERS_SQL = [
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_users_insert AFTER INSERT ON users BEGIN
+        INSERT INTO counters (name, channel_id, value) VALUES ('users', 0, 1)
+        ON CONFLICT (name, channel_id) DO UPDATE SET value = value + 1;
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_users_delete AFTER DELETE ON users BEGIN
+        UPDATE counters SET value = value - 1 WHERE name = 'users' AND channel_id = 0;
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_subscriptions_insert AFTER INSERT ON subscriptions BEGIN
+        INSERT INTO counters (name, channel_id, value) VALUES ('subscribers', NEW.channel_id, 1)
+        ON CONFLICT (name, channel_id) DO UPDATE SET value = value + 1;
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_subscriptions_delete AFTER DELETE ON subscriptions BEGIN
+        UPDATE counters SET value = value - 1 WHERE name = 'subscribers' AND channel_id = OLD.channel_id;
+    END
+    ''',
+]
+
+def _rebuild_counters(cursor: sqlite3.Cursor):
+    """Пересчитывает счетчики по таблицам users и subscriptions."""
+    cursor.execute("DELETE FROM counters")
+    cursor.execute("INSERT INTO counters (name, channel_id, value) SELECT 'users', 0, COUNT(*) FROM users")
+    cursor.execute(
+        "INSERT INTO counters (name, channel_id, value) "
+        "SELECT 'subscribers', channel_id, COUNT(*) FROM subscriptions GROUP BY channel_id"
+    )
+
+def rebuild_counters():
+    """Пересчитывает счетчики статистики (если они разошлись с данными после ручных правок БД)."""
+    with db_connection() as conn:
+        _rebuild_counters(conn.cursor())
         conn.commit()
 
 # --- Функции для пользователей и подписок (остаются без изменений) ---
 
+# UPSERT, а не INSERT OR REPLACE, чтобы не сбрасывать last_verified_at при каждом /start
+_UPSERT_USER_SQL = (
+    "INSERT INTO users (user_id, username, first_name) VALUES (?, ?, ?) "
+    "ON CONFLICT(user_id) DO UPDATE SET username = excluded.username, first_name = excluded.first_name"
+)
+# Событие о вступлении — это тоже проверка подписки
+_UPSERT_SUBSCRIPTION_SQL = (
+    "INSERT INTO subscriptions (user_id, channel_id, last_verified_at) VALUES (?, ?, CURRENT_TIMESTAMP) "
+    "ON CONFLICT(user_id, channel_id) DO UPDATE SET last_verified_at = excluded.last_verified_at"
+)
+_DELETE_SUBSCRIPTION_SQL = "DELETE FROM subscriptions WHERE user_id = ? AND channel_id = ?"
+
 def add_user(user_id: int, username: str, first_name: str):
     with db_connection() as conn:
         cursor = conn.cursor()
-        cursor.execute(
-            "INSERT OR REPLACE INTO users (user_id, username, first_name) VALUES (?, ?, ?)",
-            (user_id, username, first_name)
-        )
+        cursor.execute(_UPSERT_USER_SQL, (user_id, username, first_name))
         conn.commit()
 
 def add_subscription(user_id: int, channel_id: int):
     with db_connection() as conn:
         cursor = conn.cursor()
-        cursor.execute("INSERT OR IGNORE INTO subscriptions (user_id, channel_id) VALUES (?, ?)", (user_id, channel_id))
+        cursor.execute(_UPSERT_SUBSCRIPTION_SQL, (user_id, channel_id))
         conn.commit()
 
 def remove_subscription(user_id: int, channel_id: int):
     with db_connection() as conn:
         cursor = conn.cursor()
-        cursor.execute("DELETE FROM subscriptions WHERE user_id = ? AND channel_id = ?", (user_id, channel_id))
+        cursor.execute(_DELETE_SUBSCRIPTION_SQL, (user_id, channel_id))
+        conn.commit()
+
+def apply_write_batch(
+    users: list[tuple[int, str, str]],
+    joined: list[tuple[int, int]],
+    left: list[tuple[int, int]],
+):
+    """
+    Применяет накопленные записи одной транзакцией.
+    users — (user_id, username, first_name); joined/left — пары (user_id, channel_id).
+    """
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.executemany(_UPSERT_USER_SQL, users)
+        cursor.executemany(_UPSERT_SUBSCRIPTION_SQL, joined)
+        cursor.executemany(_DELETE_SUBSCRIPTION_SQL, left)
         conn.commit()
 
 def get_user_ids_by_channel(channel_id: int) -> list[int]:
@@ -85,10 +260,18 @@ def get_all_users() -> list[int]:
         cursor.execute("SELECT user_id FROM users")
         return [row[0] for row in cursor.fetchall()]
 
+def get_user_count() -> int:
+    """Возвращает число пользователей бота по счетчику (без подсчета строк)."""
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT value FROM counters WHERE name = 'users' AND channel_id = 0")
+        row = cursor.fetchone()
+        return row[0] if row else 0
+
 def get_channel_stats() -> dict[int, int]:
     with db_connection() as conn:
         cursor = conn.cursor()
-        cursor.execute("SELECT channel_id, COUNT(user_id) FROM subscriptions GROUP BY channel_id")
+        cursor.execute("SELECT channel_id, value FROM counters WHERE name = 'subscribers' AND value > 0")
         return dict(cursor.fetchall())
 
 def full_resync_channel_members(channel_id: int, member_ids: list[int]):
@@ -96,7 +279,302 @@ def full_resync_channel_members(channel_id: int, member_ids: list[int]):
         cursor = conn.cursor()
         cursor.execute("DELETE FROM subscriptions WHERE channel_id = ?", (channel_id,))
         if member_ids:
-            cursor.executemany("INSERT OR IGNORE INTO subscriptions (user_id, channel_id) VALUES (?, ?)", [(user_id, channel_id) for user_id in member_ids])
+            cursor.executemany(
+                "INSERT OR IGNORE INTO subscriptions (user_id, channel_id, last_verified_at) VALUES (?, ?, CURRENT_TIMESTAMP)",
+                [(user_id, channel_id) for user_id in member_ids]
+            )
+        conn.commit()
+
+# --- Функции для инкрементальной синхронизации подписок ---
+
+def _stale_cutoff(max_age_seconds: int) -> str:
+    return f"-{max_age_seconds} seconds"
+
+def _placeholders(values) -> str:
+    return ", ".join("?" * len(values))
+
+def count_stale_users(max_age_seconds: int) -> int:
+    """Считает пользователей, которые ни разу не проверялись или проверялись раньше, чем max_age_seconds назад."""
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT COUNT(*) FROM users WHERE last_verified_at IS NULL OR last_verified_at < datetime('now', ?)",
+            (_stale_cutoff(max_age_seconds),)
+        )
+        return cursor.fetchone()[0]
+
+def get_stale_users_page(max_age_seconds: int, after_user_id: int = 0, limit: int = AUDIENCE_PAGE_SIZE) -> array:
+    """Возвращает следующую страницу (по возрастанию user_id) пользователей с устаревшей проверкой."""
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT user_id FROM users "
+            "WHERE (last_verified_at IS NULL OR last_verified_at < datetime('now', ?)) AND user_id > ? "
+            "ORDER BY user_id LIMIT ?",
+            (_stale_cutoff(max_age_seconds), after_user_id, limit)
+        )
+        return array('q', (row[0] for row in cursor))
+
+_STALE_SUBSCRIPTIONS_WHERE = (
+    "(s.last_verified_at IS NULL OR s.last_verified_at < datetime('now', ?)) "
+    "AND u.last_verified_at >= datetime('now', ?)"
+)
+
+def count_stale_subscriptions(max_age_seconds: int, channel_ids: list[int]) -> int:
+    """
+    Считает подписки в каналах channel_ids с устаревшей проверкой.
+    Пользователи, которые сами требуют полной проверки (см. get_stale_users_page), не учитываются.
+    """
+    if not channel_ids:
+        return 0
+    cutoff = _stale_cutoff(max_age_seconds)
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT COUNT(*) FROM subscriptions s JOIN users u ON u.user_id = s.user_id "
+            f"WHERE {_STALE_SUBSCRIPTIONS_WHERE} AND s.channel_id IN ({_placeholders(channel_ids)})",
+            (cutoff, cutoff, *channel_ids)
+        )
+        return cursor.fetchone()[0]
+
+def get_stale_subscriptions_page(
+    max_age_seconds: int,
+    channel_ids: list[int],
+    after: tuple[int, int] = (0, 0),
+    limit: int = AUDIENCE_PAGE_SIZE,
+) -> list[tuple[int, int]]:
+    """
+    Возвращает следующую страницу пар (channel_id, user_id) с устаревшей проверкой подписки.
+    Пагинация по ключу: after — последняя пара (user_id, channel_id) предыдущей страницы.
+    """
+    if not channel_ids:
+        return []
+    cutoff = _stale_cutoff(max_age_seconds)
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT s.channel_id, s.user_id FROM subscriptions s JOIN users u ON u.user_id = s.user_id "
+            f"WHERE {_STALE_SUBSCRIPTIONS_WHERE} AND s.channel_id IN ({_placeholders(channel_ids)}) "
+            "AND (s.user_id, s.channel_id) > (?, ?) "
+            "ORDER BY s.user_id, s.channel_id LIMIT ?",
+            (cutoff, cutoff, *channel_ids, *after, limit)
+        )
+        return [(row[0], row[1]) for row in cursor]
+
+def apply_subscription_checks(results: list[tuple[int, int, bool]], verified_user_ids: Iterable[int]):
+    """
+    Применяет результаты проверки подписок одной транзакцией.
+    results — тройки (channel_id, user_id, is_member); verified_user_ids — пользователи,
+    проверенные во всех каналах, для них обновляется users.last_verified_at.
+    """
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.executemany(
+            _UPSERT_SUBSCRIPTION_SQL,
+            [(user_id, channel_id) for channel_id, user_id, is_member in results if is_member]
+        )
+        cursor.executemany(
+            _DELETE_SUBSCRIPTION_SQL,
+            [(user_id, channel_id) for channel_id, user_id, is_member in results if not is_member]
+        )
+        cursor.executemany(
+            "UPDATE users SET last_verified_at = CURRENT_TIMESTAMP WHERE user_id = ?",
+            [(user_id,) for user_id in verified_user_ids]
+        )
+        conn.commit()
+
+def remove_unknown_users_subscriptions(channel_ids: list[int]) -> int:
+    """
+    Удаляет из каналов channel_ids подписки пользователей, которых нет в таблице users
+    (полная синхронизация проверяет только пользователей бота). Возвращает число удаленных строк.
+    """
+    if not channel_ids:
+        return 0
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            f"DELETE FROM subscriptions WHERE channel_id IN ({_placeholders(channel_ids)}) "
+            "AND user_id NOT IN (SELECT user_id FROM users)",
+            tuple(channel_ids)
+        )
+        conn.commit()
+        return cursor.rowcount
+
+# --- Функции для заданий рассылки ---
+
+def create_broadcast_job(admin_chat_id: int, target: str, payload: dict) -> int:
+    """Создает задание рассылки и возвращает его ID."""
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "INSERT INTO broadcast_jobs (admin_chat_id, target, payload) VALUES (?, ?, ?)",
+            (admin_chat_id, target, json.dumps(payload, ensure_ascii=False))
+        )
+        conn.commit()
+        return cursor.lastrowid
+
+def update_broadcast_checkpoint(job_id: int, last_user_id: int, success_count: int, error_count: int):
+    """Сохраняет прогресс рассылки: всем получателям с ID <= last_user_id сообщение уже отправлено."""
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "UPDATE broadcast_jobs SET last_user_id = ?, success_count = ?, error_count = ? WHERE job_id = ?",
+            (last_user_id, success_count, error_count, job_id)
+        )
+        conn.commit()
+
+def finish_broadcast_job(job_id: int, status: str = 'done'):
+    """Помечает задание рассылки завершенным ('done') или остановленным из-за ошибки ('failed')."""
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "UPDATE broadcast_jobs SET status = ?, finished_at = CURRENT_TIMESTAMP WHERE job_id = ?",
+            (status, job_id)
+        )
+        conn.commit()
+
+def get_broadcast_job(job_id: int) -> dict | None:
+    """Возвращает задание рассылки или None, если его нет."""
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT * FROM broadcast_jobs WHERE job_id = ?", (job_id,))
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job['payload'] = json.loads(job['payload'])
+        return job
+
+def get_unfinished_broadcast_jobs() -> list[int]:
+    """Возвращает ID заданий рассылки, которые не были завершены (например, из-за перезапуска)."""
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT job_id FROM broadcast_jobs WHERE status = 'running' ORDER BY job_id")
+        return [row[0] for row in cursor.fetchall()]
+
+def _compile_audience_segment(cursor, target: str) -> tuple[str, list, str]:
+    """
+    Компилирует сегмент в запрос. Если сегмент требует подписки на конкретные каналы,
+    перебор идет по подписчикам самого маленького из них (по счетчикам).
+    """
+    segment = load_segment(target)
+    channels = required_channels(segment)
+    driver = None
+    if channels:
+        cursor.execute(
+            f"SELECT channel_id, value FROM counters WHERE name = 'subscribers' AND channel_id IN ({_placeholders(channels)})",
+            tuple(channels)
+        )
+        sizes = dict(cursor.fetchall())
+        # Канала нет в счетчиках — у него нет подписчиков
+        driver = min(channels, key=lambda channel_id: sizes.get(channel_id, 0))
+    return compile_segment(segment, driver)
+
+def get_audience_page(target: str, after_user_id: int = 0, limit: int = AUDIENCE_PAGE_SIZE) -> array:
+    """
+    Возвращает следующую страницу получателей (не больше limit, с ID больше after_user_id,
+    по возрастанию) в компактном массиве. `target` — 'all', ID канала или сегмент (services/segments.py).
+    """
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        if is_segment_target(target):
+            query, params, key = _compile_audience_segment(cursor, target)
+            cursor.execute(f"{query} AND {key} > ? ORDER BY {key} LIMIT ?", (*params, after_user_id, limit))
+        elif target == 'all':
+            cursor.execute("SELECT user_id FROM users WHERE user_id > ? ORDER BY user_id LIMIT ?", (after_user_id, limit))
+        else:
+            cursor.execute(
+                "SELECT user_id FROM subscriptions WHERE channel_id = ? AND user_id > ? ORDER BY user_id LIMIT ?",
+                (int(target), after_user_id, limit)
+            )
+        return array('q', (row[0] for row in cursor))
+
+def iter_audience(target: str, after_user_id: int = 0, page_size: int = AUDIENCE_PAGE_SIZE) -> Iterator[array]:
+    """Постранично перебирает получателей, не загружая всю аудиторию в память."""
+    while page := get_audience_page(target, after_user_id, page_size):
+        yield page
+        after_user_id = page[-1]
+
+def get_audience_size(target: str) -> int:
+    """
+    Возвращает размер аудитории. Для 'all' и ID канала — по счетчикам, для сегмента
+    считается тем же запросом, что выбирает получателей (без выгрузки ID в Python).
+    """
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        if is_segment_target(target):
+            query, params, _ = _compile_audience_segment(cursor, target)
+            cursor.execute(f"SELECT COUNT(*) FROM ({query})", params)
+        elif target == 'all':
+            cursor.execute("SELECT value FROM counters WHERE name = 'users' AND channel_id = 0")
+        else:
+            cursor.execute("SELECT value FROM counters WHERE name = 'subscribers' AND channel_id = ?", (int(target),))
+        row = cursor.fetchone()
+        return row[0] if row else 0
+
+# --- Ссылки-приглашения ---
+
+def get_invite_link(channel_id: int, config_hash: str, max_age_seconds: int) -> tuple[str, int] | None:
+    """
+    Возвращает сохраненную ссылку-приглашение канала и ее возраст в секундах или None,
+    если ссылки нет, она создана для другой конфигурации канала или старше max_age_seconds.
+    """
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT invite_link, CAST(strftime('%s', 'now') - strftime('%s', created_at) AS INTEGER) "
+            "FROM invite_links WHERE channel_id = ? AND config_hash = ? AND created_at >= datetime('now', ?)",
+            (int(channel_id), config_hash, _stale_cutoff(max_age_seconds))
+        )
+        row = cursor.fetchone()
+        return (row[0], row[1]) if row else None
+
+def save_invite_link(channel_id: int, invite_link: str, config_hash: str):
+    """Сохраняет (или заменяет) ссылку-приглашение канала."""
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "INSERT OR REPLACE INTO invite_links (channel_id, invite_link, config_hash, created_at) "
+            "VALUES (?, ?, ?, CURRENT_TIMESTAMP)",
+            (int(channel_id), invite_link, config_hash)
+        )
+        conn.commit()
+
+def delete_invite_links_except(channel_ids: list[int]) -> int:
+    """Удаляет ссылки каналов, которых больше нет в конфигурации. Возвращает число удаленных строк."""
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            f"DELETE FROM invite_links WHERE channel_id NOT IN ({_placeholders(channel_ids)})",
+            tuple(int(channel_id) for channel_id in channel_ids)
+        )
+        conn.commit()
+        return cursor.rowcount
+
+# --- Команды бота в чатах администраторов ---
+
+def get_command_hashes() -> dict[int, str]:
+    """Возвращает хэши наборов команд, установленных для чатов: {chat_id: hash}."""
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT chat_id, commands_hash FROM command_scopes")
+        return {row[0]: row[1] for row in cursor.fetchall()}
+
+def save_command_hash(chat_id: int, commands_hash: str):
+    """Запоминает хэш набора команд, установленного для чата."""
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "INSERT OR REPLACE INTO command_scopes (chat_id, commands_hash) VALUES (?, ?)",
+            (int(chat_id), commands_hash)
+        )
+        conn.commit()
+
+def delete_command_hash(chat_id: int):
+    """Забывает набор команд чата (после delete_my_commands)."""
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM command_scopes WHERE chat_id = ?", (int(chat_id),))
         conn.commit()
 
 # --- Новые функции для управления администраторами ---
@@ -0,0 +1,107 @@
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+# Каталог проекта: по нему в трейсбеке ищется код бота (а не библиотек)
+_PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def truncate(text: str, limit: int, tail: bool = False) -> str:
+    """Обрезает текст до `limit` символов (при tail=True сохраняется конец текста)."""
+    if len(text) <= limit:
+        return text
+    if tail:
+        return "…" + text[-(limit - 1):]
+    return text[:limit - 1] + "…"
+
+
+def _is_project_file(filename: str) -> bool:
+    # Виртуальное окружение может лежать внутри каталога проекта
+    return filename.startswith(_PROJECT_DIR + os.sep) and 'site-packages' not in filename
+
+
+def error_fingerprint(error: BaseException) -> tuple[str, str]:
+    """
+    Отпечаток ошибки: тип исключения и место в коде бота, откуда она пришла — самый
+    глубокий кадр трейсбека из каталога проекта. Ошибки Bot API выбрасываются в одной и
+    той же строке библиотеки, поэтому место в библиотеке (верхний кадр стека) берется,
+    только если кадров проекта нет.
+    Трейсбек не форматируется — только проход по цепочке кадров.
+    """
+    error_type = f"{type(error).__module__}.{type(error).__qualname__}"
+    tb = error.__traceback__
+    if tb is None:
+        return error_type, "?"
+    project_tb = None
+    while True:
+        if _is_project_file(tb.tb_frame.f_code.co_filename):
+            project_tb = tb
+        if tb.tb_next is None:
+            break
+        tb = tb.tb_next
+    if project_tb is not None:
+        code = project_tb.tb_frame.f_code
+        return error_type, f"{os.path.relpath(code.co_filename, _PROJECT_DIR)}:{project_tb.tb_lineno} in {code.co_name}"
+    code = tb.tb_frame.f_code
+    return error_type, f"{code.co_filename}:{tb.tb_lineno} in {code.co_name}"
+
+
+@dataclass
+class ErrorRecord:
+    """Сводка по одной повторяющейся ошибке."""
+    error_type: str
+    location: str
+    message: str
+    count: int = 0
+    # Сколько повторов уже учтено в отправленных отчетах
+    reported_count: int = 0
+    first_seen: float = field(default_factory=time.time)
+    last_seen: float = field(default_factory=time.time)
+
+    @property
+    def unreported(self) -> int:
+        return self.count - self.reported_count
+
+
+class ErrorStore:
+    """
+    Ограниченное хранилище ошибок в памяти. При переполнении вытесняются
+    ошибки, которые дольше всех не повторялись.
+    """
+
+    def __init__(self, max_entries: int, message_limit: int = 300):
+        self.max_entries = max_entries
+        self.message_limit = message_limit
+        self._records: OrderedDict[tuple[str, str], ErrorRecord] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def record(self, error: BaseException) -> tuple[ErrorRecord, bool]:
+        """Учитывает ошибку. Возвращает ее запись и признак первого появления."""
+        key = error_fingerprint(error)
+        record = self._records.get(key)
+        is_new = record is None
+        if is_new:
+            record = ErrorRecord(key[0], key[1], truncate(str(error), self.message_limit))
+            self._records[key] = record
+            if len(self._records) > self.max_entries:
+                self._records.popitem(last=False)
+        else:
+            self._records.move_to_end(key)
+            record.last_seen = time.time()
+        record.count += 1
+        return record, is_new
+
+    def take_digest(self) -> list[tuple[ErrorRecord, int]]:
+        """
+        Возвращает ошибки, повторявшиеся после прошлого отчета, с числом новых повторов
+        и помечает эти повторы учтенными.
+        """
+        digest = []
+        for record in self._records.values():
+            if record.unreported > 0:
+                digest.append((record, record.unreported))
+                record.reported_count = record.count
+        return digest
@@ -0,0 +1,84 @@
+import asyncio
+import hashlib
+import logging
+import time
+
+from telegram import Bot
+
+from config import CHANNEL_BUTTONS_CONFIG, INVITE_LINK_TTL
+from services.async_database import get_invite_link, save_invite_link, delete_invite_links_except
+
+logger = logging.getLogger(__name__)
+
+
+def config_fingerprint(group_id, text: str, emoji: str) -> str:
+    """Отпечаток записи канала в CHANNEL_BUTTONS_CONFIG: при его изменении ссылка создается заново."""
+    return hashlib.sha1(f"{group_id}|{text}|{emoji}".encode()).hexdigest()
+
+
+class InviteLinkCache:
+    """
+    Кэш ссылок-приглашений на каналы.
+
+    Ссылки хранятся в БД (переживают перезапуск) и в памяти. Создание ссылки
+    выполняется не более одного раза одновременно для каждого канала: параллельные
+    промахи кэша ждут один и тот же вызов create_chat_invite_link.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        # channel_id -> (ссылка, отпечаток конфигурации, момент устаревания по time.monotonic)
+        self._links: dict[int, tuple[str, str, float]] = {}
+        self._pending: dict[int, asyncio.Task] = {}
+
+    def invalidate(self, channel_id: int | None = None):
+        """Сбрасывает ссылку канала (или все ссылки) в памяти."""
+        if channel_id is None:
+            self._links.clear()
+        else:
+            self._links.pop(int(channel_id), None)
+
+    async def get(self, bot: Bot, channel_id, fingerprint: str) -> str:
+        """Возвращает действующую ссылку-приглашение канала, при необходимости создавая ее."""
+        channel_id = int(channel_id)
+        cached = self._links.get(channel_id)
+        if cached and cached[1] == fingerprint and time.monotonic() < cached[2]:
+            return cached[0]
+        task = self._pending.get(channel_id)
+        if task is None:
+            task = asyncio.create_task(self._load_or_create(bot, channel_id, fingerprint))
+            self._pending[channel_id] = task
+            task.add_done_callback(lambda _: self._pending.pop(channel_id, None))
+        # shield: отмена одного из ожидающих не должна прерывать общий запрос
+        return await asyncio.shield(task)
+
+    async def _load_or_create(self, bot: Bot, channel_id: int, fingerprint: str) -> str:
+        stored = await get_invite_link(channel_id, fingerprint, int(self.ttl))
+        if stored:
+            url, age = stored
+            self._links[channel_id] = (url, fingerprint, time.monotonic() + self.ttl - age)
+            return url
+        link_obj = await bot.create_chat_invite_link(chat_id=channel_id)
+        url = link_obj.invite_link
+        await save_invite_link(channel_id, url, fingerprint)
+        self._links[channel_id] = (url, fingerprint, time.monotonic() + self.ttl)
+        logger.info(f"Создана и сохранена новая ссылка-приглашение для канала {channel_id}.")
+        return url
+
+    async def prune(self, channel_ids: list) -> int:
+        """Удаляет из БД ссылки каналов, которых больше нет в конфигурации."""
+        self.invalidate()
+        return await delete_invite_links_except([int(channel_id) for channel_id in channel_ids])
+
+
+invite_links = InviteLinkCache(ttl=INVITE_LINK_TTL)
+
+
+async def get_channel_invite_link(bot: Bot, group_id, text: str, emoji: str) -> str:
+    """Возвращает ссылку-приглашение для записи канала из CHANNEL_BUTTONS_CONFIG."""
+    return await invite_links.get(bot, group_id, config_fingerprint(group_id, text, emoji))
+
+
+async def prune_invite_links() -> int:
+    """Удаляет сохраненные ссылки каналов, убранных из CHANNEL_BUTTONS_CONFIG."""
+    return await invite_links.prune([group_id for group_id, _, _ in CHANNEL_BUTTONS_CONFIG if group_id])
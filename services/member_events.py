@@ -0,0 +1,139 @@
+import asyncio
+import logging
+from collections import Counter, deque
+from typing import Awaitable, Callable
+
+from telegram import Bot
+
+from services.write_buffer import WriteBehindBuffer
+
+logger = logging.getLogger(__name__)
+
+# send_welcome(bot, user_id, first_name, channel_title)
+WelcomeFunc = Callable[[Bot, int, str, str], Awaitable[None]]
+
+
+class MemberEventIngestor:
+    """
+    Прием событий вступления/выхода из каналов (chat_member).
+
+    Обработчик обновления только регистрирует событие и сразу возвращается:
+    - изменение подписки уходит в буфер отложенной записи, где события одной пары
+      (пользователь, канал) схлопываются и пишутся в БД пачкой;
+    - приветствия копятся `window` секунд: если пользователь за это время вышел,
+      приветствие не отправляется, повторные вступления дают одно приветствие;
+      затем приветствия отправляются в фоне не более чем `welcome_concurrency` одновременно;
+    - вместо строки лога на каждое событие раз в окно пишется сводка по каналам.
+    """
+
+    def __init__(
+        self,
+        subscriptions: WriteBehindBuffer,
+        send_welcome: WelcomeFunc,
+        window: float,
+        welcome_concurrency: int,
+        max_pending_welcomes: int,
+    ):
+        self._subscriptions = subscriptions
+        self._send_welcome = send_welcome
+        self.window = window
+        self.welcome_concurrency = welcome_concurrency
+        self.max_pending_welcomes = max_pending_welcomes
+        # (user_id, channel_id) -> (bot, first_name, channel_title), ждут конца окна
+        self._pending_welcomes: dict[tuple[int, int], tuple[Bot, str, str]] = {}
+        # Приветствия, переданные на отправку: (bot, user_id, first_name, channel_title)
+        self._welcome_queue: deque[tuple[Bot, int, str, str]] = deque()
+        self._welcome_workers: list[asyncio.Task] = []
+        # Статистика текущего окна для сводки в логе
+        self._joins: Counter[int] = Counter()
+        self._leaves: Counter[int] = Counter()
+        self._titles: dict[int, str] = {}
+        self._dropped_welcomes = 0
+        self._flusher: asyncio.Task | None = None
+
+    @property
+    def queued_welcomes(self) -> int:
+        return len(self._pending_welcomes) + len(self._welcome_queue)
+
+    def joined(self, bot: Bot, user_id: int, first_name: str, channel_id: int, channel_title: str, welcome: bool):
+        self._subscriptions.set_subscription(user_id, channel_id, True)
+        self._joins[channel_id] += 1
+        self._titles[channel_id] = channel_title
+        if welcome:
+            if self.queued_welcomes < self.max_pending_welcomes:
+                self._pending_welcomes[(user_id, channel_id)] = (bot, first_name, channel_title)
+            else:
+                self._dropped_welcomes += 1
+        self._after_event()
+
+    def left(self, user_id: int, channel_id: int, channel_title: str):
+        self._subscriptions.set_subscription(user_id, channel_id, False)
+        self._leaves[channel_id] += 1
+        self._titles[channel_id] = channel_title
+        # Вышел, не дождавшись приветствия — не отправляем
+        self._pending_welcomes.pop((user_id, channel_id), None)
+        self._after_event()
+
+    def _after_event(self):
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._run(), name="member-events-flusher")
+
+    async def _run(self):
+        """Раз в окно передает приветствия на отправку; завершается, когда событий больше нет."""
+        while True:
+            await asyncio.sleep(self.window)
+            if not self._flush():
+                return
+
+    def _flush(self) -> bool:
+        """Закрывает текущее окно. Возвращает False, если в окне не было событий."""
+        if not self._joins and not self._leaves:
+            return False
+        self._log_summary()
+        for (user_id, channel_id), (bot, first_name, channel_title) in self._pending_welcomes.items():
+            self._welcome_queue.append((bot, user_id, first_name, channel_title))
+        self._pending_welcomes = {}
+        while len(self._welcome_workers) < min(self.welcome_concurrency, len(self._welcome_queue)):
+            self._welcome_workers.append(asyncio.create_task(self._welcome_worker(), name="welcome-sender"))
+        return True
+
+    def _log_summary(self):
+        for channel_id in self._joins.keys() | self._leaves.keys():
+            logger.info(
+                f"Канал '{self._titles.get(channel_id)}' (ID: {channel_id}) за {self.window:g} с: "
+                f"вступили {self._joins[channel_id]}, вышли {self._leaves[channel_id]}."
+            )
+        if self._dropped_welcomes:
+            logger.warning(f"Очередь приветствий переполнена, пропущено приветствий: {self._dropped_welcomes}.")
+        self._joins.clear()
+        self._leaves.clear()
+        self._titles.clear()
+        self._dropped_welcomes = 0
+
+    async def _welcome_worker(self):
+        try:
+            while self._welcome_queue:
+                bot, user_id, first_name, channel_title = self._welcome_queue.popleft()
+                try:
+                    await self._send_welcome(bot, user_id, first_name, channel_title)
+                except Exception:
+                    logger.exception(f"Ошибка при отправке приветствия пользователю {user_id}.")
+        finally:
+            self._welcome_workers.remove(asyncio.current_task())
+
+    async def close(self):
+        """Останавливает прием: пишет сводку, неотправленные приветствия отбрасываются."""
+        if self._flusher is not None:
+            self._flusher.cancel()
+            self._flusher = None
+        if self._joins or self._leaves:
+            self._log_summary()
+        dropped = self.queued_welcomes
+        self._pending_welcomes = {}
+        self._welcome_queue.clear()
+        workers = list(self._welcome_workers)
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        if dropped:
+            logger.info(f"Бот остановлен, не отправлено приветствий: {dropped}.")
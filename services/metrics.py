@@ -0,0 +1,239 @@
+# Метрики в формате Prometheus: число вызовов, ошибки и гистограммы задержек
+# обработчиков, запросов к БД и запросов к Bot API, а также глубина очереди
+# обновлений. Отдаются локальным HTTP-эндпоинтом (METRICS_PORT, путь /metrics).
+# При METRICS_ENABLED=0 обработчики и запросы не оборачиваются вовсе,
+# а в потоке БД остается одна проверка флага.
+import asyncio
+import functools
+import logging
+import time
+from bisect import bisect_left
+from typing import Any, Callable
+
+from telegram.ext import Application, ApplicationHandlerStop, BaseHandler, ConversationHandler
+from telegram.request import HTTPXRequest
+
+from config import METRICS_ENABLED, METRICS_LISTEN, METRICS_PORT
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограмм, секунды
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+    """Гистограмма задержек с метками (по одному набору корзин на каждое значение меток)."""
+
+    def __init__(self, name: str, help_text: str, label: str, buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.buckets = buckets
+        # значение метки -> [счетчики корзин..., сумма, ошибки]
+        self._series: dict[str, list] = {}
+
+    def observe(self, label_value: str, seconds: float, error: bool = False):
+        series = self._series.get(label_value)
+        if series is None:
+            series = self._series[label_value] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+        # Последняя корзина — +Inf
+        series[bisect_left(self.buckets, seconds)] += 1
+        series[-2] += seconds
+        if error:
+            series[-1] += 1
+
+    def render(self) -> list[str]:
+        lines = [
+            f"# HELP {self.name}_seconds {self.help_text}",
+            f"# TYPE {self.name}_seconds histogram",
+        ]
+        errors = [
+            f"# HELP {self.name}_errors_total {self.help_text}: ошибки",
+            f"# TYPE {self.name}_errors_total counter",
+        ]
+        for label_value, series in sorted(self._series.items()):
+            label = f'{self.label}="{_escape_label(label_value)}"'
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f'{self.name}_seconds_bucket{{{label},le="{bound}"}} {cumulative}')
+            cumulative += series[len(self.buckets)]
+            lines.append(f'{self.name}_seconds_bucket{{{label},le="+Inf"}} {cumulative}')
+            lines.append(f"{self.name}_seconds_sum{{{label}}} {series[-2]:.6f}")
+            lines.append(f"{self.name}_seconds_count{{{label}}} {cumulative}")
+            errors.append(f"{self.name}_errors_total{{{label}}} {series[-1]}")
+        return lines + errors
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+handler_latency = Histogram("bot_handler", "Время выполнения обработчиков обновлений", "handler")
+db_latency = Histogram("bot_db_query", "Время выполнения запросов к БД (в потоке БД)", "function")
+api_latency = Histogram("bot_api_request", "Время запросов к Telegram Bot API", "method")
+
+# Датчики, значение которых читается в момент запроса метрик
+_gauges: dict[str, tuple[str, Callable[[], float]]] = {}
+
+
+def register_gauge(name: str, help_text: str, read: Callable[[], float]):
+    _gauges[name] = (help_text, read)
+
+
+def render_metrics() -> str:
+    """Текст всех метрик в формате Prometheus."""
+    lines = []
+    for histogram in (handler_latency, db_latency, api_latency):
+        lines.extend(histogram.render())
+    for name, (help_text, read) in _gauges.items():
+        lines.extend([f"# HELP {name} {help_text}", f"# TYPE {name} gauge", f"{name} {read()}"])
+    return "\n".join(lines) + "\n"
+
+
+# --- Инструментирование ---
+
+def timed_call(histogram: Histogram, name: str, func: Callable[..., Any], *args, **kwargs) -> Any:
+    """Вызывает синхронную функцию и записывает ее время в гистограмму (если метрики включены)."""
+    if not METRICS_ENABLED:
+        return func(*args, **kwargs)
+    started = time.perf_counter()
+    error = False
+    try:
+        return func(*args, **kwargs)
+    except Exception:
+        error = True
+        raise
+    finally:
+        histogram.observe(name, time.perf_counter() - started, error)
+
+
+def _wrap_callback(callback: Callable[..., Any], name: str | None = None) -> Callable[..., Any]:
+    name = name or getattr(callback, "__qualname__", repr(callback))
+
+    @functools.wraps(callback)
+    async def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        error = False
+        try:
+            return await callback(*args, **kwargs)
+        except ApplicationHandlerStop:
+            raise
+        except Exception:
+            error = True
+            raise
+        finally:
+            handler_latency.observe(name, time.perf_counter() - started, error)
+    wrapper.__metrics_wrapped__ = True
+    return wrapper
+
+
+def _instrument_handler(handler: BaseHandler):
+    if isinstance(handler, ConversationHandler):
+        for nested in handler.entry_points + handler.fallbacks:
+            _instrument_handler(nested)
+        for state_handlers in handler.states.values():
+            for nested in state_handlers:
+                _instrument_handler(nested)
+        return
+    if not getattr(handler.callback, "__metrics_wrapped__", False):
+        handler.callback = _wrap_callback(handler.callback)
+
+
+def instrument_application(application: Application):
+    """
+    Оборачивает все зарегистрированные обработчики (включая состояния ConversationHandler)
+    и обработчики ошибок, регистрирует датчик очереди обновлений. Вызывать после
+    регистрации обработчиков. При выключенных метриках ничего не делает.
+    """
+    if not METRICS_ENABLED:
+        return
+    for handlers in application.handlers.values():
+        for handler in handlers:
+            _instrument_handler(handler)
+    error_handlers = dict(application.error_handlers)
+    for callback, block in error_handlers.items():
+        application.remove_error_handler(callback)
+        application.add_error_handler(_wrap_callback(callback), block=block)
+    register_gauge(
+        "bot_pending_updates", "Обновлений в очереди, ожидающих обработки",
+        lambda: application.update_queue.qsize(),
+    )
+    processor = application.update_processor
+    register_gauge(
+        "bot_updates_in_progress", "Обновлений, обрабатываемых сейчас",
+        lambda: processor.current_concurrent_updates,
+    )
+    rate_limiter = application.bot.rate_limiter
+    if rate_limiter is not None and hasattr(rate_limiter, 'waiting'):
+        register_gauge(
+            "bot_outbound_waiting", "Исходящих сообщений, ожидающих общего лимита скорости",
+            lambda: rate_limiter.waiting,
+        )
+
+
+class InstrumentedRequest(HTTPXRequest):
+    """HTTP-клиент Bot API, измеряющий время каждого запроса по имени метода."""
+
+    async def do_request(self, url: str, method: str, *args, **kwargs) -> tuple[int, bytes]:
+        api_method = url.rsplit('/', 1)[-1]
+        started = time.perf_counter()
+        error = True
+        try:
+            code, payload = await super().do_request(url, method, *args, **kwargs)
+            error = code >= 400
+            return code, payload
+        finally:
+            api_latency.observe(api_method, time.perf_counter() - started, error)
+
+
+def make_request() -> HTTPXRequest | None:
+    """HTTP-клиент для ApplicationBuilder.request() или None, если метрики выключены."""
+    if not METRICS_ENABLED:
+        return None
+    # Размер пула как у клиента по умолчанию в ApplicationBuilder
+    return InstrumentedRequest(connection_pool_size=256)
+
+
+# --- HTTP-эндпоинт ---
+
+_server: asyncio.AbstractServer | None = None
+
+
+async def _handle_http(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+        # Заголовки запроса не нужны, но их нужно дочитать
+        while (await asyncio.wait_for(reader.readline(), timeout=5)) not in (b"\r\n", b"\n", b""):
+            pass
+        parts = request_line.decode("latin-1").split()
+        if len(parts) >= 2 and parts[0] == "GET" and parts[1].split('?')[0] == "/metrics":
+            status, body = "200 OK", render_metrics().encode()
+        else:
+            status, body = "404 Not Found", b"not found\n"
+        writer.write(
+            f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+    except (asyncio.TimeoutError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def start_metrics_server():
+    """Запускает эндпоинт /metrics (если метрики включены)."""
+    global _server
+    if not METRICS_ENABLED or _server is not None:
+        return
+    _server = await asyncio.start_server(_handle_http, METRICS_LISTEN, METRICS_PORT)
+    logger.info(f"Метрики доступны на http://{METRICS_LISTEN}:{METRICS_PORT}/metrics")
+
+
+async def stop_metrics_server():
+    global _server
+    if _server is not None:
+        _server.close()
+        await _server.wait_closed()
+        _server = None
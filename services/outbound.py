@@ -0,0 +1,113 @@
+import logging
+from enum import IntEnum
+from typing import Any, Callable, Coroutine
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+from config import OUTBOUND_RATE_LIMIT, OUTBOUND_PER_CHAT_INTERVAL, OUTBOUND_MAX_RETRIES, BROADCAST_RATE_LIMIT
+from services.rate_limiter import BotRateLimiter, TokenBucket
+
+logger = logging.getLogger(__name__)
+
+
+class Lane(IntEnum):
+    """
+    Класс исходящего сообщения; при нехватке лимита меньшее значение отправляется раньше.
+    Передается в методы бота как `rate_limit_args=Lane.BULK`; без него — INTERACTIVE.
+    """
+    INTERACTIVE = 0  # ответы на действия пользователя
+    WELCOME = 1      # приветствия новым подписчикам
+    ALERT = 2        # уведомления администраторов об ошибках
+    BULK = 3         # рассылки
+
+
+# Методы, создающие или меняющие сообщения: на них действует лимит Telegram ~30 сообщений/с.
+# Остальные запросы (get_chat_member, answer_callback_query, ...) проходят без очереди.
+MESSAGE_ENDPOINTS = frozenset({
+    'sendMessage', 'sendPhoto', 'sendVideo', 'sendDocument', 'sendAudio', 'sendAnimation',
+    'sendVoice', 'sendVideoNote', 'sendSticker', 'sendMediaGroup', 'sendLocation', 'sendVenue',
+    'sendContact', 'sendPoll', 'sendDice', 'copyMessage', 'copyMessages', 'forwardMessage',
+    'forwardMessages', 'editMessageText', 'editMessageCaption', 'editMessageMedia',
+    'editMessageReplyMarkup',
+})
+
+
+class OutboundScheduler(BaseRateLimiter[Lane]):
+    """
+    Общий планировщик исходящих сообщений бота (подключается как rate_limiter приложения,
+    поэтому через него проходят все вызовы context.bot и application.bot).
+
+    - общий лимит скорости; ожидающие сообщения получают его в порядке Lane;
+    - отдельный потолок скорости для некоторых классов (рассылка);
+    - интервал между фоновыми сообщениями в один чат;
+    - после RetryAfter приостанавливаются все отправки, запрос повторяется.
+    """
+
+    def __init__(
+        self,
+        global_rate: float = OUTBOUND_RATE_LIMIT,
+        per_chat_interval: float = OUTBOUND_PER_CHAT_INTERVAL,
+        lane_rates: dict[Lane, float] | None = None,
+        max_retries: int = OUTBOUND_MAX_RETRIES,
+    ):
+        self.limiter = BotRateLimiter(global_rate=global_rate, per_chat_interval=per_chat_interval)
+        self.lane_limits = {lane: TokenBucket(rate) for lane, rate in (lane_rates or {}).items()}
+        self.max_retries = max_retries
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    @property
+    def waiting(self) -> int:
+        """Сколько сообщений ждут общего лимита."""
+        return self.limiter.bucket.waiting
+
+    @staticmethod
+    def _cost(endpoint: str, data: dict[str, Any]) -> float:
+        # Медиагруппа и пакетное копирование расходуют лимит за каждое сообщение
+        if endpoint == 'sendMediaGroup':
+            return len(data.get('media') or ()) or 1
+        if endpoint in ('copyMessages', 'forwardMessages'):
+            return len(data.get('message_ids') or ()) or 1
+        return 1
+
+    async def _acquire(self, lane: Lane, chat_id, cost: float):
+        lane_limit = self.lane_limits.get(lane)
+        if lane_limit is not None:
+            await lane_limit.acquire(cost)
+        # Ответ пользователю не ждет интервала чата: он и так вызван его действием
+        await self.limiter.acquire(None if lane == Lane.INTERACTIVE else chat_id, cost, priority=lane)
+
+    async def process_request(
+        self,
+        callback: Callable[..., Coroutine[Any, Any, bool | dict[str, Any] | list[dict[str, Any]]]],
+        args: Any,
+        kwargs: dict[str, Any],
+        endpoint: str,
+        data: dict[str, Any],
+        rate_limit_args: Lane | None,
+    ) -> bool | dict[str, Any] | list[dict[str, Any]]:
+        if endpoint not in MESSAGE_ENDPOINTS:
+            return await callback(*args, **kwargs)
+
+        lane = Lane(rate_limit_args) if rate_limit_args is not None else Lane.INTERACTIVE
+        chat_id = data.get('chat_id')
+        cost = self._cost(endpoint, data)
+        for attempt in range(self.max_retries + 1):
+            await self._acquire(lane, chat_id, cost)
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as e:
+                # Флуд-контроль действует на весь бот, поэтому ставим на паузу все отправки
+                logger.warning(f"Флуд-контроль ({endpoint}, {lane.name}), пауза {e.retry_after} с.")
+                self.limiter.pause(float(e.retry_after))
+                if attempt == self.max_retries:
+                    raise
+
+
+# Планировщик приложения: рассылка дополнительно ограничена BROADCAST_RATE_LIMIT
+outbound_scheduler = OutboundScheduler(lane_rates={Lane.BULK: BROADCAST_RATE_LIMIT})
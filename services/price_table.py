@@ -0,0 +1,444 @@
+import csv
+import html
+import io
+import math
+import posixpath
+import re
+import zipfile
+import zlib
+
+from services.commission import calculate_commissions
+
+# Заголовки, по которым узнается столбец с ценой (без учета регистра)
+PRICE_HEADERS = ('цена', 'стоимость', 'сумма', 'price', 'amount')
+PERCENT_HEADER = 'Процент комиссии'
+AMOUNT_HEADER = 'Комиссия'
+
+
+class PriceTableError(ValueError):
+    """Файл не удалось разобрать как таблицу цен."""
+
+
+class _UnsupportedXlsx(Exception):
+    """Разметку листа не удалось обработать напрямую — файл обрабатывается через openpyxl."""
+
+
+class PriceTable:
+    """Строки загруженного файла и номер столбца с ценой."""
+
+    def __init__(self, rows: list[list], price_column: int, has_header: bool, delimiter: str = ';'):
+        self.rows = rows
+        self.price_column = price_column
+        self.has_header = has_header
+        self.delimiter = delimiter
+
+    @property
+    def data_rows(self) -> list[list]:
+        return self.rows[1:] if self.has_header else self.rows
+
+
+def parse_price(value) -> float | None:
+    """Число из ячейки: допускает запятую как разделитель дробной части и пробелы между разрядами."""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if not isinstance(value, str):
+        return None
+    text = value.replace('\xa0', '').replace(' ', '').replace(',', '.')
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+
+def _find_price_column(rows: list[list]) -> tuple[int, bool]:
+    """Определяет столбец с ценой и есть ли в таблице строка заголовка."""
+    first = rows[0]
+    for column, cell in enumerate(first):
+        if isinstance(cell, str) and cell.strip().lower() in PRICE_HEADERS:
+            return column, True
+    # Заголовка с известным названием нет: первый столбец с числом в первой строке с данными
+    for row in rows[:2]:
+        for column, cell in enumerate(row):
+            if parse_price(cell) is not None:
+                return column, row is not first
+    raise PriceTableError("Не найден столбец с ценами.")
+
+
+def _table(rows: list[list], delimiter: str = ';') -> PriceTable:
+    rows = [row for row in rows if any(cell not in (None, '') for cell in row)]
+    if not rows:
+        raise PriceTableError("Файл пуст.")
+    price_column, has_header = _find_price_column(rows)
+    return PriceTable(rows, price_column, has_header, delimiter)
+
+
+def read_csv(data: bytes) -> PriceTable:
+    try:
+        text = data.decode('utf-8-sig')
+    except UnicodeDecodeError:
+        # CSV из Excel в русской локали
+        try:
+            text = data.decode('cp1251')
+        except UnicodeDecodeError as e:
+            raise PriceTableError("Не удалось определить кодировку файла, сохраните его в UTF-8.") from e
+    try:
+        delimiter = csv.Sniffer().sniff(text[:4096], delimiters=';,\t').delimiter
+    except csv.Error:
+        delimiter = ';'
+    try:
+        rows = list(csv.reader(io.StringIO(text), delimiter=delimiter))
+    except csv.Error as e:
+        raise PriceTableError(f"Не удалось разобрать CSV: {e}") from e
+    return _table(rows, delimiter)
+
+
+def read_xlsx(data: bytes) -> PriceTable:
+    # openpyxl нужен только для файлов Excel
+    from openpyxl import load_workbook
+
+    try:
+        workbook = load_workbook(io.BytesIO(data), read_only=True, data_only=True)
+    except Exception as e:
+        raise PriceTableError(f"Не удалось открыть файл Excel: {e}") from e
+    try:
+        rows = [list(row) for row in workbook.active.iter_rows(values_only=True)]
+    except Exception as e:
+        raise PriceTableError(f"Не удалось прочитать файл Excel: {e}") from e
+    finally:
+        workbook.close()
+    return _table(rows)
+
+
+def read_price_table(data: bytes, filename: str) -> PriceTable:
+    """Читает CSV или XLSX (по расширению файла)."""
+    if filename.lower().endswith('.xlsx'):
+        return read_xlsx(data)
+    if filename.lower().endswith(('.csv', '.txt')):
+        return read_csv(data)
+    raise PriceTableError("Поддерживаются файлы .csv и .xlsx.")
+
+
+def add_commission_columns(table: PriceTable) -> int:
+    """
+    Дописывает к каждой строке столбцы с процентом и суммой комиссии.
+    Строки с некорректной ценой получают пустые ячейки. Возвращает число рассчитанных строк.
+    """
+    width = max(len(row) for row in table.rows)
+    data_rows = table.data_rows
+    prices = [
+        parse_price(row[table.price_column]) if table.price_column < len(row) else None
+        for row in data_rows
+    ]
+    percents, amounts = calculate_commissions(prices)
+
+    if table.has_header:
+        header = table.rows[0]
+        header.extend([None] * (width - len(header)))
+        header.extend([PERCENT_HEADER, AMOUNT_HEADER])
+    calculated = 0
+    for row, percent, amount in zip(data_rows, percents, amounts):
+        row.extend([None] * (width - len(row)))
+        if math.isnan(percent):
+            row.extend([None, None])
+        else:
+            row.extend([percent, amount])
+            calculated += 1
+    return calculated
+
+
+def write_csv(table: PriceTable) -> bytes:
+    output = io.StringIO()
+    writer = csv.writer(output, delimiter=table.delimiter)
+    # С разделителем «;» (Excel в русской локали) дробная часть отделяется запятой.
+    # None csv пишет пустой ячейкой, float — кратчайшей записью, которая читается
+    # обратно в то же самое число
+    if table.delimiter == ';':
+        writer.writerows(
+            [str(cell).replace('.', ',') if type(cell) is float else cell for cell in row] for row in table.rows
+        )
+    else:
+        writer.writerows(table.rows)
+    # BOM, чтобы Excel правильно определил кодировку
+    return output.getvalue().encode('utf-8-sig')
+
+
+def write_xlsx(table: PriceTable) -> bytes:
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    for row in table.rows:
+        sheet.append(row)
+    output = io.BytesIO()
+    workbook.save(output)
+    return output.getvalue()
+
+
+# Разметка листа XLSX (SpreadsheetML) для прямой обработки без openpyxl
+_ROW_NUMBER_RE = re.compile(rb'\br="(\d+)"')
+_CELL_RE = re.compile(rb'<c\b([^>]*?)(?:/>|>(.*?)</c>)', re.S)
+_LAST_CELL_RE = re.compile(rb'.*<c\b[^>]*?\br="([A-Z]+)\d+"', re.S)
+_ATTR_RE = re.compile(rb'\b(r|s|t)="([^"]*)"')
+_VALUE_RE = re.compile(rb'<v>(.*?)</v>', re.S)
+_TEXT_RE = re.compile(rb'<t(?:\s[^>]*)?(?<!/)>(.*?)</t>', re.S)
+# В строке есть хотя бы одно непустое значение
+_HAS_VALUE_RE = re.compile(rb'<v>[^<]|<t(?:\s[^>]*)?(?<!/)>[^<]')
+_SHARED_STRING_RE = re.compile(rb'<si>(.*?)</si>', re.S)
+_NUM_FMT_RE = re.compile(rb'<numFmt\b[^>]*?\bnumFmtId="(\d+)"[^>]*?\bformatCode="([^"]*)"')
+_CELL_XFS_RE = re.compile(rb'<cellXfs\b[^>]*>(.*?)</cellXfs>', re.S)
+_XF_RE = re.compile(rb'<xf\b([^>]*)>')
+_XF_NUM_FMT_RE = re.compile(rb'\bnumFmtId="(\d+)"')
+_CELL_REF_RE = re.compile(r'([A-Z]+)(\d+)')
+_DIMENSION_RE = re.compile(rb'<dimension ref="([A-Z]+\d+)(?::[A-Z]+\d+)?"/>')
+
+
+def _column_index(letters: str) -> int:
+    index = 0
+    for letter in letters:
+        index = index * 26 + ord(letter) - ord('A') + 1
+    return index - 1
+
+
+def _column_letters(index: int) -> str:
+    letters = ''
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(ord('A') + remainder) + letters
+    return letters
+
+
+def _xml_text(raw: bytes) -> str:
+    return html.unescape(raw.decode('utf-8'))
+
+
+def _xlsx_sheet_path(archive: zipfile.ZipFile) -> str:
+    """Путь к активному листу книги внутри архива."""
+    workbook = archive.read('xl/workbook.xml')
+    active = re.search(rb'<workbookView\b[^>]*\bactiveTab="(\d+)"', workbook)
+    sheets = re.findall(rb'<sheet\b[^>]*\br:id="([^"]+)"', workbook)
+    if not sheets:
+        raise _UnsupportedXlsx()
+    sheet_id = sheets[int(active.group(1)) if active else 0]
+    rels = archive.read('xl/_rels/workbook.xml.rels')
+    for rel in re.findall(rb'<Relationship\b[^>]*>', rels):
+        if re.search(rb'\bId="' + re.escape(sheet_id) + rb'"', rel):
+            target = re.search(rb'\bTarget="([^"]+)"', rel).group(1).decode()
+            return target.lstrip('/') if target.startswith('/') else posixpath.normpath(posixpath.join('xl', target))
+    raise _UnsupportedXlsx()
+
+
+def _xlsx_date_styles(archive: zipfile.ZipFile) -> frozenset[int]:
+    """
+    Номера стилей ячеек (атрибут s), формат которых — дата или время. Числа в таких
+    ячейках openpyxl возвращает как даты, а не как цены.
+    """
+    from openpyxl.styles.numbers import BUILTIN_FORMATS, is_date_format
+
+    if 'xl/styles.xml' not in archive.namelist():
+        return frozenset()
+    styles = archive.read('xl/styles.xml')
+    formats = {int(fmt_id): _xml_text(code) for fmt_id, code in _NUM_FMT_RE.findall(styles)}
+    cell_xfs = _CELL_XFS_RE.search(styles)
+    if cell_xfs is None:
+        return frozenset()
+    date_styles = set()
+    for index, attrs in enumerate(_XF_RE.findall(cell_xfs.group(1))):
+        fmt_id = _XF_NUM_FMT_RE.search(attrs)
+        if fmt_id is None:
+            continue
+        fmt_id = int(fmt_id.group(1))
+        code = formats.get(fmt_id, BUILTIN_FORMATS.get(fmt_id))
+        if code and is_date_format(code):
+            date_styles.add(index)
+    return frozenset(date_styles)
+
+
+def _cell_value(attributes: dict[bytes, bytes], body: bytes | None, shared_strings: list[str], date_styles: frozenset[int]):
+    """
+    Значение ячейки так же, как его возвращает openpyxl с data_only=True; вместо дат — None
+    (как цена дата все равно не разбирается).
+    """
+    cell_type = attributes.get(b't')
+    if not body:
+        return None
+    if cell_type == b'inlineStr':
+        return ''.join(_xml_text(text) for text in _TEXT_RE.findall(body))
+    value = _VALUE_RE.search(body)
+    if value is None or not value.group(1):
+        return None
+    raw = value.group(1)
+    if cell_type == b's':
+        return shared_strings[int(raw)]
+    if cell_type in (b'str', b'e', b'd'):
+        return _xml_text(raw)
+    if cell_type == b'b':
+        return raw == b'1'
+    if int(attributes.get(b's', b'0')) in date_styles:
+        return None
+    return float(raw)
+
+
+def _parse_cells(row_body: bytes, shared_strings: list[str], date_styles: frozenset[int]) -> dict[int, object]:
+    """Значения ячеек строки: номер столбца -> значение (пустые ячейки пропускаются)."""
+    cells = {}
+    for attrs, body in _CELL_RE.findall(row_body):
+        attributes = dict(_ATTR_RE.findall(attrs))
+        ref = _CELL_REF_RE.fullmatch(attributes.get(b'r', b'').decode())
+        if ref is None:
+            # Ячейки без адреса встречаются редко; их обрабатывает openpyxl
+            raise _UnsupportedXlsx()
+        value = _cell_value(attributes, body, shared_strings, date_styles)
+        if value not in (None, ''):
+            cells[_column_index(ref.group(1))] = value
+    return cells
+
+
+def _iter_sheet_rows(sheet: bytes):
+    """Строки листа: (атрибуты <row>, начало и конец разметки ячеек; для пустой строки None)."""
+    position = sheet.find(b'<sheetData')
+    end_of_data = sheet.find(b'</sheetData>')
+    if position == -1 or end_of_data == -1:
+        return
+    while True:
+        position = sheet.find(b'<row', position, end_of_data)
+        if position == -1:
+            return
+        tag_end = sheet.find(b'>', position)
+        attrs = sheet[position + 4:tag_end]
+        if attrs.endswith(b'/'):
+            yield attrs, None, None
+            position = tag_end
+            continue
+        row_end = sheet.find(b'</row>', tag_end)
+        if row_end == -1:
+            raise _UnsupportedXlsx()
+        yield attrs, tag_end + 1, row_end
+        position = row_end
+
+
+def calculate_xlsx(data: bytes) -> tuple[bytes, int, int]:
+    """
+    Быстрый расчет для XLSX: лист разбирается и дополняется напрямую в XML, не создавая
+    объектов ячеек openpyxl, поэтому остальное содержимое книги (стили, формулы, другие
+    листы) сохраняется без изменений. Файлы с нестандартной разметкой листа
+    обрабатываются через openpyxl.
+    """
+    try:
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            return _calculate_xlsx_archive(archive)
+    except (PriceTableError, _UnsupportedXlsx):
+        raise
+    except KeyError as e:
+        # В архиве нет ожидаемой части книги — возможно, нестандартная структура
+        raise _UnsupportedXlsx() from e
+    except (zipfile.BadZipFile, zlib.error) as e:
+        raise PriceTableError(f"Не удалось открыть файл Excel: {e}") from e
+    except (ValueError, IndexError, UnicodeDecodeError) as e:
+        raise PriceTableError(f"Файл Excel поврежден: {e}") from e
+
+
+def _calculate_xlsx_archive(archive: zipfile.ZipFile) -> tuple[bytes, int, int]:
+    sheet_path = _xlsx_sheet_path(archive)
+    sheet = archive.read(sheet_path)
+    date_styles = _xlsx_date_styles(archive)
+    shared_strings = []
+    if 'xl/sharedStrings.xml' in archive.namelist():
+        shared_strings = [
+            ''.join(_xml_text(text) for text in _TEXT_RE.findall(item))
+            for item in _SHARED_STRING_RE.findall(archive.read('xl/sharedStrings.xml'))
+        ]
+
+    # Непустые строки листа: (номер строки, начало и конец разметки ячеек).
+    # Полностью разбираются только строки заголовка, в остальных — только ячейка с ценой
+    rows = []
+    width = 0
+    for attrs, start, end in _iter_sheet_rows(sheet):
+        row_number = _ROW_NUMBER_RE.search(attrs)
+        if row_number is None:
+            raise _UnsupportedXlsx()
+        if start is None or not _HAS_VALUE_RE.search(sheet, start, end):
+            continue
+        last_cell = _LAST_CELL_RE.match(sheet, start, end)
+        if last_cell is None:
+            raise _UnsupportedXlsx()
+        width = max(width, _column_index(last_cell.group(1).decode()) + 1)
+        rows.append((int(row_number.group(1)), start, end))
+    if not rows:
+        # Пустой лист или разметка с префиксами пространств имен — решит openpyxl
+        raise _UnsupportedXlsx()
+
+    header_rows = [_parse_cells(sheet[start:end], shared_strings, date_styles) for _, start, end in rows[:2]]
+    price_column, has_header = _find_price_column(
+        [[cells.get(column) for column in range(width)] for cells in header_rows]
+    )
+    data_rows = rows[1:] if has_header else rows
+    price_cell_re = re.compile(
+        rb'<c\b([^>]*?\br="' + _column_letters(price_column).encode() + rb'\d+"[^>]*?)(?:/>|>(.*?)</c>)', re.S
+    )
+    prices = []
+    for _, start, end in data_rows:
+        cell = price_cell_re.search(sheet, start, end)
+        value = None
+        if cell is not None:
+            value = _cell_value(dict(_ATTR_RE.findall(cell.group(1))), cell.group(2), shared_strings, date_styles)
+        prices.append(parse_price(value))
+    percents, amounts = calculate_commissions(prices)
+
+    # Новые ячейки дописываются в конец строк; repr(float) — кратчайшая запись,
+    # которая читается обратно в то же самое число
+    percent_column, amount_column = _column_letters(width), _column_letters(width + 1)
+    new_cells = f'<c r="{percent_column}{{0}}"><v>{{1!r}}</v></c><c r="{amount_column}{{0}}"><v>{{2!r}}</v></c>'
+    parts, position = [], 0
+    if has_header:
+        row_number, _, end = rows[0]
+        header_cells = ''.join(
+            f'<c r="{column}{row_number}" t="inlineStr"><is><t>{html.escape(text)}</t></is></c>'
+            for column, text in ((percent_column, PERCENT_HEADER), (amount_column, AMOUNT_HEADER))
+        )
+        parts += [sheet[position:end], header_cells.encode()]
+        position = end
+    calculated = 0
+    for (row_number, _, end), percent, amount in zip(data_rows, percents, amounts):
+        if math.isnan(percent):
+            continue
+        parts += [sheet[position:end], new_cells.format(row_number, percent, amount).encode()]
+        position = end
+        calculated += 1
+    parts.append(sheet[position:])
+    patched = b''.join(parts)
+    # Диапазон листа теперь включает добавленные столбцы
+    last_row = max(row_number for row_number, _, _ in rows)
+    patched = _DIMENSION_RE.sub(
+        lambda m: m.group(1) + f":{_column_letters(width + 1)}{last_row}".encode(), patched, count=1
+    )
+
+    output = io.BytesIO()
+    with zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED) as result:
+        for item in archive.infolist():
+            if item.filename == sheet_path:
+                # Быстрое сжатие: лист большой, а размер файла здесь менее важен
+                result.writestr(item, patched, compress_type=zipfile.ZIP_DEFLATED, compresslevel=1)
+            else:
+                result.writestr(item, archive.read(item.filename))
+    return output.getvalue(), calculated, len(data_rows) - calculated
+
+
+def calculate_price_file(data: bytes, filename: str) -> tuple[bytes, int, int]:
+    """
+    Рассчитывает комиссию для файла с ценами. Возвращает файл в том же формате,
+    число рассчитанных строк и число строк с некорректной ценой.
+    """
+    if filename.lower().endswith('.xlsx'):
+        try:
+            return calculate_xlsx(data)
+        except _UnsupportedXlsx:
+            pass
+    table = read_price_table(data, filename)
+    calculated = add_commission_columns(table)
+    skipped = len(table.data_rows) - calculated
+    if filename.lower().endswith('.xlsx'):
+        return write_xlsx(table), calculated, skipped
+    return write_csv(table), calculated, skipped
@@ -0,0 +1,244 @@
+# Профилирование работающего бота без перезапуска и поиск блокировок цикла событий.
+#
+# - cProfile: детерминированный профиль потока цикла событий, отчет — текстовая
+#   таблица pstats, отсортированная по суммарному времени.
+# - sample: выборочный профилировщик (отдельный поток снимает стек потока цикла
+#   событий каждые несколько миллисекунд), отчет — collapsed stacks для flamegraph.pl
+#   или speedscope.
+# - LoopStallMonitor: сторожевой поток, который пишет в лог стек и обработчик,
+#   если цикл событий не отвечал дольше порога.
+import asyncio
+import cProfile
+import io
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from types import FrameType
+
+from config import LOOP_STALL_THRESHOLD, PROFILE_MAX_SECONDS
+
+logger = logging.getLogger(__name__)
+
+PROFILE_MODES = ('cprofile', 'sample')
+
+# Интервал выборки стека, секунды
+SAMPLE_INTERVAL = 0.005
+# Сколько строк таблицы pstats включать в отчет
+_STATS_LINES = 200
+
+# Каталог проекта: по нему в стеке ищется код бота (а не библиотек)
+_PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_HANDLERS_DIR = os.path.join(_PROJECT_DIR, 'handlers')
+
+
+def _frame_label(frame: FrameType) -> str:
+    code = frame.f_code
+    filename = code.co_filename
+    if filename.startswith(_PROJECT_DIR):
+        filename = os.path.relpath(filename, _PROJECT_DIR)
+    else:
+        filename = os.path.basename(filename)
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+
+def _collapsed_stack(frame: FrameType) -> str:
+    """Стек в формате collapsed stacks: от корня к вершине через ';'."""
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+def _culprit(frame: FrameType) -> str:
+    """Ближайший к вершине стека кадр из handlers/, иначе из кода проекта, иначе вершина стека."""
+    project_frame = None
+    current = frame
+    while current is not None:
+        filename = current.f_code.co_filename
+        if filename.startswith(_HANDLERS_DIR):
+            return _frame_label(current)
+        if project_frame is None and filename.startswith(_PROJECT_DIR):
+            project_frame = current
+        current = current.f_back
+    return _frame_label(project_frame or frame)
+
+
+@dataclass
+class ProfileSession:
+    """Сеанс профилирования: по времени (seconds) или по числу обработанных обновлений (updates)."""
+    mode: str
+    seconds: float | None = None
+    updates: int | None = None
+    processed: int = 0
+    started_at: float = field(default_factory=time.monotonic)
+    done: asyncio.Event = field(default_factory=asyncio.Event)
+    # Почему сеанс закончился раньше заданного предела: 'stopped' (/profile stop) или 'timeout'
+    interrupted: str | None = None
+
+    def describe(self) -> str:
+        limit = f"{self.seconds:g} с" if self.seconds is not None else f"{self.updates} обновлений"
+        return f"{self.mode}, {limit}"
+
+    def describe_result(self) -> str:
+        """Описание сеанса с фактическим объемом, если он был прерван."""
+        if self.interrupted is None:
+            return self.describe()
+        elapsed = time.monotonic() - self.started_at
+        reason = "остановлен командой" if self.interrupted == 'stopped' else "истек лимит времени"
+        progress = f"{self.processed} обновлений за " if self.updates is not None else ""
+        return f"{self.describe()} — {reason}, снято {progress}{elapsed:.0f} с"
+
+
+class _StackSampler(threading.Thread):
+    """Поток, который снимает стек заданного потока с интервалом SAMPLE_INTERVAL."""
+
+    def __init__(self, thread_id: int):
+        super().__init__(name="profile-sampler", daemon=True)
+        self.thread_id = thread_id
+        self.stacks: Counter[str] = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(SAMPLE_INTERVAL):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[_collapsed_stack(frame)] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+class Profiler:
+    """Запускает не более одного сеанса профилирования одновременно."""
+
+    def __init__(self):
+        self.session: ProfileSession | None = None
+
+    def update_processed(self):
+        """Вызывается после обработки каждого обновления (см. PerChatUpdateProcessor)."""
+        session = self.session
+        if session is not None and session.updates is not None:
+            session.processed += 1
+            if session.processed >= session.updates:
+                session.done.set()
+
+    def stop(self) -> bool:
+        """Досрочно завершает текущий сеанс (отчет строится по уже собранным данным)."""
+        session = self.session
+        if session is None or session.done.is_set():
+            return False
+        session.interrupted = 'stopped'
+        session.done.set()
+        return True
+
+    async def run(self, session: ProfileSession, max_seconds: float = PROFILE_MAX_SECONDS) -> tuple[str, bytes]:
+        """
+        Выполняет сеанс и возвращает (имя файла, содержимое отчета).
+        Сеанс по числу обновлений длится не дольше `max_seconds`, даже если обновлений нет.
+        Бросает RuntimeError, если уже идет другой сеанс.
+        """
+        if self.session is not None:
+            raise RuntimeError("Профилирование уже выполняется.")
+        self.session = session
+        profile = sampler = None
+        try:
+            if session.mode == 'cprofile':
+                profile = cProfile.Profile()
+                profile.enable()
+            else:
+                sampler = _StackSampler(threading.get_ident())
+                sampler.start()
+            try:
+                await asyncio.wait_for(session.done.wait(), min(session.seconds or max_seconds, max_seconds))
+            except asyncio.TimeoutError:
+                # Для сеанса по времени это штатное завершение
+                if session.seconds is None:
+                    session.interrupted = 'timeout'
+        finally:
+            if profile is not None:
+                profile.disable()
+            if sampler is not None:
+                sampler.stop()
+            self.session = None
+
+        elapsed = time.monotonic() - session.started_at
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        if profile is not None:
+            out = io.StringIO()
+            out.write(f"# cProfile, {session.describe_result()}, длительность {elapsed:.1f} с\n")
+            pstats.Stats(profile, stream=out).sort_stats(pstats.SortKey.CUMULATIVE).print_stats(_STATS_LINES)
+            return f"profile-{stamp}.txt", out.getvalue().encode()
+        lines = [f"{stack} {count}" for stack, count in sampler.stacks.most_common()]
+        return f"profile-{stamp}.folded", ("\n".join(lines) + "\n").encode()
+
+
+profiler = Profiler()
+
+
+class LoopStallMonitor:
+    """
+    Сторожевой поток: если цикл событий не обновлял отметку дольше `threshold` секунд,
+    пишет в лог длительность блокировки, обработчик и стек, на котором цикл стоит.
+    """
+
+    def __init__(self, threshold: float, check_interval: float | None = None):
+        self.threshold = threshold
+        self.check_interval = check_interval or max(threshold / 4, 0.01)
+        self._beat = time.monotonic()
+        self._loop_thread_id: int | None = None
+        self._heartbeat_task: asyncio.Task | None = None
+        self._thread: threading.Thread | None = None
+        self._stop_event = threading.Event()
+
+    async def _heartbeat(self):
+        while True:
+            self._beat = time.monotonic()
+            await asyncio.sleep(self.check_interval)
+
+    def _watch(self):
+        reported_beat = None
+        while not self._stop_event.wait(self.check_interval):
+            beat = self._beat
+            lag = time.monotonic() - beat
+            # Об одной блокировке сообщаем один раз
+            if lag < self.threshold or beat == reported_beat:
+                continue
+            reported_beat = beat
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            stack = "\n".join(f"  {label}" for label in _collapsed_stack(frame).split(";")[-15:])
+            logger.warning(
+                f"Цикл событий заблокирован более {lag:.2f} с. Обработчик: {_culprit(frame)}\nСтек:\n{stack}"
+            )
+
+    def start(self):
+        """Запускает наблюдение (вызывать из работающего цикла событий). Порог 0 отключает монитор."""
+        if self._thread is not None or self.threshold <= 0:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._beat = time.monotonic()
+        self._heartbeat_task = asyncio.get_running_loop().create_task(self._heartbeat())
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._watch, name="loop-stall-monitor", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop_event.set()
+        self._thread.join()
+        self._thread = None
+        if self._heartbeat_task is not None:
+            self._heartbeat_task.cancel()
+            self._heartbeat_task = None
+
+
+stall_monitor = LoopStallMonitor(LOOP_STALL_THRESHOLD)
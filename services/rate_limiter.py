@@ -0,0 +1,148 @@
+import asyncio
+import heapq
+import itertools
+import time
+
+# Лимиты Telegram Bot API: ~30 сообщений в секунду суммарно и ~1 сообщение в секунду в один чат.
+# Берем глобальный лимит с небольшим запасом, чтобы не упираться в 429.
+DEFAULT_GLOBAL_RATE = 25.0
+DEFAULT_PER_CHAT_INTERVAL = 1.0
+
+# Сколько записей о чатах держим в памяти, прежде чем чистить устаревшие
+_CHAT_STATE_PRUNE_THRESHOLD = 10000
+
+
+class TokenBucket:
+    """
+    Асинхронное «ведро токенов»: пропускает не более `rate` операций в секунду
+    с допустимым всплеском до `capacity` операций.
+    """
+
+    def __init__(self, rate: float, capacity: float | None = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        elapsed = max(0.0, now - self._updated_at)
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+        self._updated_at = max(self._updated_at, now)
+
+    def pause(self, seconds: float):
+        """Останавливает выдачу токенов на `seconds` секунд (например, после RetryAfter)."""
+        blocked_until = time.monotonic() + seconds
+        if blocked_until > self._blocked_until:
+            self._blocked_until = blocked_until
+            # Токены за время паузы не накапливаются, чтобы после нее не было всплеска
+            self._tokens = 0.0
+            self._updated_at = blocked_until
+
+    async def acquire(self, tokens: float = 1.0):
+        """Ждет, пока в ведре появится нужное количество токенов, и забирает их."""
+        tokens = min(tokens, self.capacity)
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._blocked_until:
+                    await asyncio.sleep(self._blocked_until - now)
+                    continue
+                self._refill(now)
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+
+
+class PriorityTokenBucket(TokenBucket):
+    """
+    Token bucket, в котором ожидающие получают токены в порядке приоритета
+    (меньшее число — раньше), а при равном приоритете — в порядке очереди.
+    """
+
+    def __init__(self, rate: float, capacity: float | None = None):
+        super().__init__(rate, capacity)
+        # (приоритет, порядковый номер, токены, future ожидающего)
+        self._waiters: list[tuple[int, int, float, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._dispatcher: asyncio.Task | None = None
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self, tokens: float = 1.0, priority: int = 0):
+        tokens = min(tokens, self.capacity)
+        now = time.monotonic()
+        # Без очереди и паузы токен выдается сразу
+        if not self._waiters and now >= self._blocked_until:
+            self._refill(now)
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), tokens, future))
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+        await future
+
+    async def _dispatch(self):
+        """Раздает токены ожидающим по мере их появления; завершается, когда очередь пуста."""
+        while self._waiters:
+            _, _, tokens, future = self._waiters[0]
+            if future.done():
+                # Ожидающий отменен
+                heapq.heappop(self._waiters)
+                continue
+            now = time.monotonic()
+            if now < self._blocked_until:
+                await asyncio.sleep(self._blocked_until - now)
+                continue
+            self._refill(now)
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                heapq.heappop(self._waiters)
+                future.set_result(None)
+                continue
+            # Пока ждем, в очередь может встать запрос с более высоким приоритетом
+            await asyncio.sleep((tokens - self._tokens) / self.rate)
+        self._dispatcher = None
+
+
+class BotRateLimiter:
+    """
+    Ограничитель исходящих запросов к Bot API: общий token bucket на весь бот
+    (с приоритетами ожидающих) плюс минимальный интервал между сообщениями
+    в один и тот же чат.
+    """
+
+    def __init__(self, global_rate: float = DEFAULT_GLOBAL_RATE, per_chat_interval: float = DEFAULT_PER_CHAT_INTERVAL):
+        self.bucket = PriorityTokenBucket(global_rate)
+        self.per_chat_interval = per_chat_interval
+        self._chat_next_slot: dict[int, float] = {}
+
+    def _reserve_chat_slot(self, chat_id: int) -> float:
+        """Резервирует ближайший свободный слот для чата и возвращает, сколько до него ждать."""
+        now = time.monotonic()
+        if len(self._chat_next_slot) > _CHAT_STATE_PRUNE_THRESHOLD:
+            self._chat_next_slot = {cid: slot for cid, slot in self._chat_next_slot.items() if slot > now}
+        slot = max(now, self._chat_next_slot.get(chat_id, 0.0))
+        self._chat_next_slot[chat_id] = slot + self.per_chat_interval
+        return slot - now
+
+    async def acquire(self, chat_id: int | None, cost: float = 1.0, priority: int = 0):
+        """
+        Ждет разрешения на отправку `cost` сообщений в чат `chat_id`.
+        При `chat_id=None` интервал между сообщениями в чат не соблюдается.
+        """
+        if chat_id is not None:
+            delay = self._reserve_chat_slot(chat_id)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        await self.bucket.acquire(cost, priority)
+
+    def pause(self, seconds: float):
+        """Приостанавливает все отправки (Telegram вернул RetryAfter)."""
+        self.bucket.pause(seconds)
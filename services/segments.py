@@ -0,0 +1,191 @@
+# Сегменты аудитории рассылки: выражения над множествами пользователей.
+#
+# Администратор вводит выражение, где каналы обозначены буквами (A, B, ... — в порядке
+# CHANNEL_BUTTONS_CONFIG):
+#
+#     A - B       в канале A, но не в B
+#     A | C       хотя бы в одном из A, C
+#     A & B       в обоих каналах
+#     ALL - ANY   запустили бота, но не подписаны ни на один канал
+#     !A          все пользователи, кроме подписчиков A (то же, что ALL - A)
+#
+# Выражение разбирается в дерево из JSON-совместимых списков (оно хранится в задании
+# рассылки как target) и компилируется в один SQL-запрос с проверками EXISTS по индексам
+# подписок, поэтому множества не загружаются в Python.
+import json
+import re
+
+# Узлы дерева: ["all"], ["any"], ["channel", id], ["or", l, r], ["and", l, r], ["diff", l, r]
+Segment = list
+
+SEGMENT_PREFIX = '['
+
+_TOKEN_RE = re.compile(r"\s*(?:(?P<op>[&|\-!()])|(?P<word>[A-Za-zА-Яа-яЁё_]+))")
+
+# Кириллические буквы, которые выглядят как латинские обозначения каналов
+_LOOKALIKES = str.maketrans('АВСЕ', 'ABCE')
+
+_KEYWORDS = {
+    'ALL': ['all'], 'ВСЕ': ['all'],
+    'ANY': ['any'], 'ЛЮБОЙ': ['any'],
+}
+
+
+class SegmentError(ValueError):
+    """Выражение сегмента не удалось разобрать."""
+
+
+def is_segment_target(target: str) -> bool:
+    """Задан ли target рассылки сегментом (а не 'all' или ID канала)."""
+    return target.startswith(SEGMENT_PREFIX)
+
+
+def dump_segment(segment: Segment) -> str:
+    return json.dumps(segment, separators=(',', ':'))
+
+
+def load_segment(target: str) -> Segment:
+    return json.loads(target)
+
+
+def _tokenize(text: str) -> list[str]:
+    tokens, position = [], 0
+    text = text.strip()
+    while position < len(text):
+        match = _TOKEN_RE.match(text, position)
+        if not match or match.end() == position:
+            raise SegmentError(f"Непонятный символ: «{text[position:].strip()[:10]}»")
+        tokens.append(match.group('op') or match.group('word').upper())
+        position = match.end()
+    return tokens
+
+
+def parse_segment(text: str, channels: dict[str, int]) -> Segment:
+    """
+    Разбирает выражение сегмента. `channels` — буква канала -> ID канала.
+    Приоритет операций: ! выше &, & выше | и -; операции одного уровня выполняются слева направо.
+
+    Raises:
+        SegmentError: Если выражение некорректно.
+    """
+    tokens = _tokenize(text)
+    if not tokens:
+        raise SegmentError("Пустое выражение.")
+    position = 0
+
+    def peek():
+        return tokens[position] if position < len(tokens) else None
+
+    def take():
+        nonlocal position
+        position += 1
+        return tokens[position - 1]
+
+    def parse_union():
+        node = parse_intersection()
+        while peek() in ('|', '-'):
+            op = take()
+            node = ['or' if op == '|' else 'diff', node, parse_intersection()]
+        return node
+
+    def parse_intersection():
+        node = parse_unary()
+        while peek() == '&':
+            take()
+            node = ['and', node, parse_unary()]
+        return node
+
+    def parse_unary():
+        token = peek()
+        if token is None:
+            raise SegmentError("Выражение оборвано.")
+        take()
+        if token == '!':
+            return ['diff', ['all'], parse_unary()]
+        if token == '(':
+            node = parse_union()
+            if peek() != ')':
+                raise SegmentError("Не хватает закрывающей скобки.")
+            take()
+            return node
+        if token in _KEYWORDS:
+            return list(_KEYWORDS[token])
+        if len(token) == 1:
+            token = token.translate(_LOOKALIKES)
+        if token in channels:
+            return ['channel', int(channels[token])]
+        raise SegmentError(f"Неизвестный канал или слово: «{token}»")
+
+    segment = parse_union()
+    if position != len(tokens):
+        raise SegmentError(f"Лишнее в конце выражения: «{' '.join(tokens[position:])}»")
+    return segment
+
+
+def describe_segment(segment: Segment, names: dict[int, str]) -> str:
+    """Человекочитаемая запись сегмента с названиями каналов."""
+    kind = segment[0]
+    if kind == 'all':
+        return "все пользователи"
+    if kind == 'any':
+        return "подписчики любого канала"
+    if kind == 'channel':
+        return f"«{names.get(segment[1], segment[1])}»"
+    symbol = {'or': '∪', 'and': '∩', 'diff': '−'}[kind]
+    return f"({describe_segment(segment[1], names)} {symbol} {describe_segment(segment[2], names)})"
+
+
+def required_channels(segment: Segment) -> set[int]:
+    """Каналы, подписка на которые обязательна для любого пользователя сегмента."""
+    kind = segment[0]
+    if kind == 'channel':
+        return {segment[1]}
+    if kind == 'and':
+        return required_channels(segment[1]) | required_channels(segment[2])
+    if kind == 'diff':
+        return required_channels(segment[1])
+    if kind == 'or':
+        return required_channels(segment[1]) & required_channels(segment[2])
+    return set()
+
+
+def _predicate(segment: Segment, params: list) -> str:
+    """Условие на пользователя u.user_id; проверки подписок идут по первичному ключу (user_id, channel_id)."""
+    kind = segment[0]
+    if kind == 'all':
+        return "1"
+    if kind == 'any':
+        return "EXISTS (SELECT 1 FROM subscriptions s WHERE s.user_id = u.user_id)"
+    if kind == 'channel':
+        params.append(segment[1])
+        return "EXISTS (SELECT 1 FROM subscriptions s WHERE s.user_id = u.user_id AND s.channel_id = ?)"
+    left = _predicate(segment[1], params)
+    right = _predicate(segment[2], params)
+    if kind == 'or':
+        return f"({left} OR {right})"
+    if kind == 'and':
+        return f"({left} AND {right})"
+    if kind == 'diff':
+        return f"({left} AND NOT {right})"
+    raise SegmentError(f"Неизвестный узел сегмента: {kind}")
+
+
+def compile_segment(segment: Segment, driver_channel: int | None = None) -> tuple[str, list, str]:
+    """
+    Компилирует сегмент в запрос `SELECT <ключ> ... WHERE ...`. Возвращает (запрос, параметры, ключ):
+    запрос можно дополнить условием на ключ (курсор страницы) и ORDER BY по ключу.
+
+    Если задан `driver_channel` (один из required_channels), перебираются только его
+    подписчики по индексу (channel_id, user_id); иначе — все пользователи по первичному ключу.
+    Пользователи сегмента всегда берутся из таблицы users: писать можно только тем, кто запускал бота.
+    """
+    params: list = []
+    if driver_channel is not None:
+        params.append(driver_channel)
+        key = "d.user_id"
+        source = "FROM subscriptions d JOIN users u ON u.user_id = d.user_id WHERE d.channel_id = ?"
+    else:
+        key = "u.user_id"
+        source = "FROM users u WHERE 1"
+    predicate = _predicate(segment, params)
+    return f"SELECT {key} {source} AND {predicate}", params, key
@@ -0,0 +1,180 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Sequence
+
+from telegram import Bot
+from telegram.error import RetryAfter
+
+from config import SYNC_CONCURRENCY, SYNC_RATE_LIMIT, SYNC_PROGRESS_INTERVAL, SYNC_MAX_AGE, SYNC_PAGE_SIZE
+from services.async_database import (
+    get_user_count,
+    iter_audience,
+    count_stale_users,
+    iter_stale_users,
+    count_stale_subscriptions,
+    iter_stale_subscriptions,
+    apply_subscription_checks,
+    remove_unknown_users_subscriptions,
+)
+from services.rate_limiter import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Статусы, при которых пользователь считается подписчиком канала
+MEMBER_STATUSES = ('member', 'administrator', 'creator')
+
+# Сколько раз повторять проверку после RetryAfter
+_MAX_RETRIES = 3
+
+# Общий ограничитель запросов get_chat_member для всех каналов
+sync_limiter = TokenBucket(SYNC_RATE_LIMIT)
+
+
+@dataclass
+class SyncProgress:
+    """Прогресс синхронизации."""
+    total: int
+    done: int = 0
+    started_at: float = field(default_factory=time.monotonic)
+
+    @property
+    def rate(self) -> float:
+        """Скорость проверки, запросов в секунду."""
+        elapsed = time.monotonic() - self.started_at
+        return self.done / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def eta(self) -> float | None:
+        """Оценка оставшегося времени в секундах (None, пока скорость неизвестна)."""
+        rate = self.rate
+        return (self.total - self.done) / rate if rate > 0 else None
+
+
+ProgressFunc = Callable[[SyncProgress], Awaitable[None]]
+
+
+@dataclass
+class SyncResult:
+    """Итог синхронизации: сколько пар проверено и сколько подписок найдено среди них."""
+    checked: int
+    subscriptions: int
+
+
+async def _is_member(bot: Bot, channel_id, user_id: int, limiter: TokenBucket) -> bool:
+    """Проверяет, состоит ли пользователь в канале. Ошибки (кроме RetryAfter) означают «не состоит»."""
+    for _ in range(_MAX_RETRIES + 1):
+        await limiter.acquire()
+        try:
+            member = await bot.get_chat_member(chat_id=channel_id, user_id=user_id)
+            return member.status in MEMBER_STATUSES
+        except RetryAfter as e:
+            logger.warning(f"Флуд-контроль при синхронизации, пауза {e.retry_after} с.")
+            limiter.pause(float(e.retry_after))
+        except Exception:
+            return False
+    return False
+
+
+class _PairChecker:
+    """
+    Проверяет пачки пар (канал, пользователь) параллельно, с ограничением параллелизма
+    и общей скоростью запросов, и ведет общий прогресс по всем пачкам.
+    `on_progress` вызывается не чаще раза в SYNC_PROGRESS_INTERVAL секунд.
+    """
+
+    def __init__(self, bot: Bot, total: int, on_progress: ProgressFunc | None, concurrency: int, limiter: TokenBucket):
+        self.bot = bot
+        self.progress = SyncProgress(total=total)
+        self.on_progress = on_progress
+        self.concurrency = max(1, concurrency)
+        self.limiter = limiter
+        # Первый отчет отправляется сразу после первой проверки
+        self._last_report = float('-inf')
+
+    async def check(self, pairs: Sequence[tuple[int, int]]) -> list[tuple[int, int, bool]]:
+        """Проверяет пачку пар и возвращает тройки (channel_id, user_id, is_member)."""
+        results = []
+        pairs_iter = iter(pairs)
+
+        async def worker():
+            # Все воркеры берут пары из одного итератора
+            for channel_id, user_id in pairs_iter:
+                results.append((channel_id, user_id, await _is_member(self.bot, channel_id, user_id, self.limiter)))
+                self.progress.done += 1
+                now = time.monotonic()
+                if self.on_progress and now - self._last_report >= SYNC_PROGRESS_INTERVAL:
+                    self._last_report = now
+                    await self.on_progress(self.progress)
+
+        await asyncio.gather(*(worker() for _ in range(self.concurrency)))
+        return results
+
+
+async def run_subscriber_sync(
+    bot: Bot,
+    channel_ids: list,
+    on_progress: ProgressFunc | None = None,
+    concurrency: int = SYNC_CONCURRENCY,
+    limiter: TokenBucket = sync_limiter,
+) -> SyncResult:
+    """
+    Полная синхронизация: проверяет всех пользователей бота во всех каналах.
+    Пользователи читаются из БД постранично, а результаты каждой страницы сразу
+    записываются, поэтому потребление памяти не зависит от числа пользователей.
+    В итоге в каналах остаются только подтвержденные подписчики из числа пользователей бота.
+    """
+    channel_ids = [int(channel_id) for channel_id in channel_ids]
+    checker = _PairChecker(bot, await get_user_count() * len(channel_ids), on_progress, concurrency, limiter)
+    checked = subscriptions = 0
+
+    async for user_ids in iter_audience('all', page_size=SYNC_PAGE_SIZE):
+        results = await checker.check([(channel_id, user_id) for user_id in user_ids for channel_id in channel_ids])
+        await apply_subscription_checks(results, user_ids)
+        checked += len(results)
+        subscriptions += sum(1 for _, _, is_member in results if is_member)
+
+    await remove_unknown_users_subscriptions(channel_ids)
+    logger.info(f"Полная синхронизация завершена. Проверено пар: {checked}, найдено подписок: {subscriptions}.")
+    return SyncResult(checked=checked, subscriptions=subscriptions)
+
+
+async def run_incremental_sync(
+    bot: Bot,
+    channel_ids: list,
+    max_age: int = SYNC_MAX_AGE,
+    on_progress: ProgressFunc | None = None,
+    concurrency: int = SYNC_CONCURRENCY,
+    limiter: TokenBucket = sync_limiter,
+) -> SyncResult:
+    """
+    Инкрементальная синхронизация: перепроверяет только пользователей, которые
+    ни разу не проверялись или проверялись давнее `max_age` секунд (во всех каналах),
+    и подписки с устаревшей отметкой проверки. Остальное актуально благодаря
+    отслеживанию вступлений/выходов в реальном времени.
+    """
+    channel_ids = [int(channel_id) for channel_id in channel_ids]
+    stale_users_count = await count_stale_users(max_age)
+    total = stale_users_count * len(channel_ids) + await count_stale_subscriptions(max_age, channel_ids)
+    checker = _PairChecker(bot, total, on_progress, concurrency, limiter)
+    checked = confirmed = 0
+
+    # Сначала пользователи, требующие полной проверки, затем отдельные устаревшие подписки
+    async for user_ids in iter_stale_users(max_age, page_size=SYNC_PAGE_SIZE):
+        results = await checker.check([(channel_id, user_id) for user_id in user_ids for channel_id in channel_ids])
+        await apply_subscription_checks(results, user_ids)
+        checked += len(results)
+        confirmed += sum(1 for _, _, is_member in results if is_member)
+
+    async for pairs in iter_stale_subscriptions(max_age, channel_ids, page_size=SYNC_PAGE_SIZE):
+        results = await checker.check(pairs)
+        await apply_subscription_checks(results, [])
+        checked += len(results)
+        confirmed += sum(1 for _, _, is_member in results if is_member)
+
+    logger.info(
+        f"Инкрементальная синхронизация завершена. Проверено пар: {checked} "
+        f"(пользователей целиком: {stale_users_count}), подтверждено подписок: {confirmed}."
+    )
+    return SyncResult(checked=checked, subscriptions=confirmed)
@@ -0,0 +1,70 @@
+import asyncio
+from typing import Any, Awaitable
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+from services.profiling import profiler
+
+
+class PerChatUpdateProcessor(BaseUpdateProcessor):
+    """
+    Параллельная обработка обновлений с сохранением порядка внутри одного чата.
+
+    Обновления одного чата (или пользователя, если чата нет) обрабатываются строго
+    по очереди, поэтому состояние диалогов ConversationHandler не портится. Обновления
+    разных чатов выполняются параллельно, но не более `max_concurrent_handlers` одновременно.
+    `max_pending_updates` ограничивает число обновлений, принятых в работу (включая
+    ожидающие своей очереди в чате).
+    """
+
+    def __init__(self, max_concurrent_handlers: int, max_pending_updates: int):
+        super().__init__(max_concurrent_updates=max(max_pending_updates, max_concurrent_handlers))
+        self._handler_slots = asyncio.BoundedSemaphore(max_concurrent_handlers)
+        # ключ -> [блокировка, число обновлений, ожидающих или выполняющихся под ней]
+        self._locks: dict[int, list] = {}
+
+    @staticmethod
+    def _ordering_key(update: object) -> int | None:
+        if not isinstance(update, Update):
+            return None
+        if update.effective_chat:
+            return update.effective_chat.id
+        if update.effective_user:
+            return update.effective_user.id
+        return None
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        try:
+            await self._process_in_order(update, coroutine)
+        finally:
+            # Сеанс профилирования «на N обновлений» считает обработанные обновления
+            profiler.update_processed()
+
+    async def _process_in_order(self, update: object, coroutine: Awaitable[Any]) -> None:
+        key = self._ordering_key(update)
+        if key is None:
+            async with self._handler_slots:
+                await coroutine
+            return
+
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            # Сначала очередь чата, потом общий слот: ожидающие обновления одного чата
+            # не занимают слоты, нужные другим пользователям
+            async with entry[0]:
+                async with self._handler_slots:
+                    await coroutine
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[key]
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
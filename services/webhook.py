@@ -0,0 +1,142 @@
+# Режим webhook: Telegram сам присылает обновления на HTTP-сервер бота.
+# Модуль импортируется только в этом режиме. Сервер (Tornado, ставится вместе
+# с python-telegram-bot[webhooks]) обслуживает два адреса: WEBHOOK_PATH для
+# обновлений и WEBHOOK_HEALTH_PATH для проверки состояния из обратного прокси.
+#
+# Локальная проверка: запустите бота с BOT_MODE=webhook и пустым WEBHOOK_URL
+# (webhook в Telegram не регистрируется) и отправьте записанное обновление:
+#   curl -X POST -H "Content-Type: application/json" \
+#        -H "X-Telegram-Bot-Api-Secret-Token: $WEBHOOK_SECRET_TOKEN" \
+#        --data @update.json http://127.0.0.1:8080/telegram
+import asyncio
+import hmac
+import json
+import logging
+import secrets
+import signal
+import time
+
+import tornado.web
+from tornado.httpserver import HTTPServer
+from telegram import Update
+from telegram.ext import Application
+
+from config import (
+    WEBHOOK_URL,
+    WEBHOOK_LISTEN,
+    WEBHOOK_PORT,
+    WEBHOOK_PATH,
+    WEBHOOK_HEALTH_PATH,
+    WEBHOOK_SECRET_TOKEN,
+    WEBHOOK_MAX_CONNECTIONS,
+)
+
+logger = logging.getLogger(__name__)
+
+SECRET_TOKEN_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class TelegramUpdateHandler(tornado.web.RequestHandler):
+    """Принимает обновления от Telegram и кладет их в очередь приложения."""
+
+    # self.application в Tornado занят его собственным приложением
+    def initialize(self, ptb_application: Application, secret_token: str):
+        self.ptb_application = ptb_application
+        self.secret_token = secret_token
+
+    def check_xsrf_cookie(self):
+        # Запросы приходят от Telegram, XSRF-защита не применяется
+        pass
+
+    async def post(self):
+        received = self.request.headers.get(SECRET_TOKEN_HEADER, "")
+        if not hmac.compare_digest(received.encode(), self.secret_token.encode()):
+            logger.warning(f"Запрос к webhook с неверным секретным токеном от {self.request.remote_ip}.")
+            raise tornado.web.HTTPError(403)
+        try:
+            update = Update.de_json(json.loads(self.request.body), self.ptb_application.bot)
+        except Exception as e:
+            logger.warning(f"Не удалось разобрать обновление из webhook: {e}")
+            raise tornado.web.HTTPError(400)
+        await self.ptb_application.update_queue.put(update)
+        self.set_status(200)
+
+
+class HealthHandler(tornado.web.RequestHandler):
+    """Отвечает 200, пока приложение запущено, иначе 503."""
+
+    def initialize(self, ptb_application: Application, started_at: float):
+        self.ptb_application = ptb_application
+        self.started_at = started_at
+
+    def get(self):
+        running = self.ptb_application.running
+        self.set_status(200 if running else 503)
+        self.write({
+            "status": "ok" if running else "stopped",
+            "uptime": round(time.monotonic() - self.started_at, 1),
+            "pending_updates": self.ptb_application.update_queue.qsize(),
+        })
+
+
+def make_webhook_app(application: Application, secret_token: str) -> tornado.web.Application:
+    """Создает Tornado-приложение с адресами для обновлений и проверки состояния."""
+    return tornado.web.Application([
+        (WEBHOOK_PATH, TelegramUpdateHandler, {"ptb_application": application, "secret_token": secret_token}),
+        (WEBHOOK_HEALTH_PATH, HealthHandler, {"ptb_application": application, "started_at": time.monotonic()}),
+    ])
+
+
+async def _wait_for_stop_signal():
+    """Ждет SIGINT/SIGTERM."""
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            # Windows: остановка по Ctrl+C придет как KeyboardInterrupt
+            pass
+    await stop.wait()
+
+
+async def serve_webhook(application: Application):
+    """
+    Запускает приложение в режиме webhook и работает до сигнала остановки.
+    Повторяет жизненный цикл run_polling: post_init после инициализации,
+    post_stop и post_shutdown после остановки.
+    """
+    # Если токен не задан, генерируем его на время работы процесса
+    secret_token = WEBHOOK_SECRET_TOKEN or secrets.token_urlsafe(32)
+
+    await application.initialize()
+    try:
+        if application.post_init:
+            await application.post_init(application)
+        if WEBHOOK_URL:
+            await application.bot.set_webhook(
+                url=WEBHOOK_URL.rstrip('/') + WEBHOOK_PATH,
+                secret_token=secret_token,
+                max_connections=WEBHOOK_MAX_CONNECTIONS,
+                allowed_updates=Update.ALL_TYPES,
+            )
+            logger.info(f"Webhook зарегистрирован: {WEBHOOK_URL.rstrip('/')}{WEBHOOK_PATH}")
+        else:
+            logger.warning("WEBHOOK_URL не задан: webhook в Telegram не регистрируется (локальный режим).")
+
+        await application.start()
+        server = HTTPServer(make_webhook_app(application, secret_token), xheaders=True)
+        server.listen(WEBHOOK_PORT, address=WEBHOOK_LISTEN)
+        logger.info(f"Webhook-сервер слушает {WEBHOOK_LISTEN}:{WEBHOOK_PORT}")
+        try:
+            await _wait_for_stop_signal()
+        finally:
+            server.stop()
+            await server.close_all_connections()
+            await application.stop()
+            if application.post_stop:
+                await application.post_stop(application)
+    finally:
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
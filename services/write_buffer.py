@@ -0,0 +1,105 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+ApplyFunc = Callable[[list, list, list], Awaitable[None]]
+
+
+class WriteBehindBuffer:
+    """
+    Буфер отложенной записи пользователей и подписок.
+
+    Записи накапливаются в памяти и применяются одной транзакцией раз в
+    `flush_interval` секунд или при достижении `max_size` записей.
+    Вступление и выход одного пользователя из одного канала в пределах окна
+    взаимно гасятся. Если запись не удалась, пачка возвращается в буфер и
+    повторяется при следующем сбросе.
+    """
+
+    def __init__(self, apply: ApplyFunc, flush_interval: float, max_size: int):
+        self._apply = apply
+        self.flush_interval = flush_interval
+        self.max_size = max_size
+        # user_id -> (username, first_name); повторный /start перезаписывает данные
+        self._users: dict[int, tuple[str | None, str | None]] = {}
+        # (user_id, channel_id) -> True (вступил) / False (вышел)
+        self._subscriptions: dict[tuple[int, int], bool] = {}
+        self._full = asyncio.Event()
+        self._flusher: asyncio.Task | None = None
+        self._closing = False
+
+    def __len__(self) -> int:
+        return len(self._users) + len(self._subscriptions)
+
+    def add_user(self, user_id: int, username: str | None, first_name: str | None):
+        self._users[user_id] = (username, first_name)
+        self._after_enqueue()
+
+    def set_subscription(self, user_id: int, channel_id: int, subscribed: bool):
+        key = (user_id, channel_id)
+        pending = self._subscriptions.get(key)
+        if pending is not None and pending != subscribed:
+            # Вступление и выход в одном окне: состояние в БД не меняется
+            del self._subscriptions[key]
+        else:
+            self._subscriptions[key] = subscribed
+        self._after_enqueue()
+
+    def _after_enqueue(self):
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._run(), name="write-behind-flusher")
+        if len(self) >= self.max_size:
+            self._full.set()
+
+    async def _run(self):
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._full.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._full.clear()
+            await self.flush()
+
+    async def flush(self):
+        """Применяет все накопленные записи."""
+        if not self._users and not self._subscriptions:
+            return
+        users, subscriptions = self._users, self._subscriptions
+        self._users, self._subscriptions = {}, {}
+        try:
+            await self._apply(
+                [(user_id, username, first_name) for user_id, (username, first_name) in users.items()],
+                [key for key, subscribed in subscriptions.items() if subscribed],
+                [key for key, subscribed in subscriptions.items() if not subscribed],
+            )
+        except Exception:
+            logger.exception(
+                f"Не удалось записать в БД {len(users)} пользователей и {len(subscriptions)} изменений подписок, "
+                f"повтор при следующем сбросе."
+            )
+            self._restore(users, subscriptions)
+
+    def _restore(self, users: dict, subscriptions: dict):
+        """
+        Возвращает незаписанную пачку в буфер. Транзакция откатилась, поэтому в БД
+        ничего из пачки не попало; более новые записи по тем же ключам, поступившие
+        во время записи, важнее и не перезаписываются.
+        """
+        for user_id, data in users.items():
+            self._users.setdefault(user_id, data)
+        for key, subscribed in subscriptions.items():
+            self._subscriptions.setdefault(key, subscribed)
+
+    async def close(self):
+        """Останавливает фоновую запись и сбрасывает все накопленное."""
+        # Не отменяем задачу, чтобы не потерять пачку, которая уже записывается
+        self._closing = True
+        self._full.set()
+        if self._flusher is not None:
+            await self._flusher
+            self._flusher = None
+        await self.flush()
+        if len(self):
+            logger.error(f"При остановке не удалось записать в БД {len(self)} накопленных изменений, они потеряны.")
@@ -0,0 +1,17 @@
+import os
+
+import pytest
+
+# config.py останавливает запуск без токена; для тестов подойдет любой
+os.environ.setdefault("BOT_TOKEN", "test-token")
+
+from services import database
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """Пустая база данных во временном каталоге."""
+    monkeypatch.setattr(database, "DB_NAME", str(tmp_path / "bot_database.db"))
+    database.init_db()
+    yield database
+    database.close_db()
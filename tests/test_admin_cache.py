@@ -0,0 +1,36 @@
+import asyncio
+
+from services.admin_cache import AdminCache
+
+
+def _cache(admins):
+    calls = []
+
+    def load():
+        calls.append('sync')
+        return admins
+
+    async def load_async():
+        calls.append('async')
+        return admins
+
+    return AdminCache(load, load_async), calls
+
+
+def test_cold_cache_without_loop_loads_synchronously():
+    cache, calls = _cache({1, 2})
+    assert cache.contains(1)
+    assert calls == ['sync']
+
+
+def test_cold_cache_in_loop_does_not_block():
+    cache, calls = _cache({1, 2})
+
+    async def scenario():
+        first = cache.contains(1)
+        await asyncio.sleep(0)
+        return first, cache.contains(1)
+
+    assert asyncio.run(scenario()) == (False, True)
+    assert calls == ['async']
+
@@ -0,0 +1,60 @@
+import math
+import random
+import struct
+
+import pytest
+
+from services import commission
+from services.commission import COMMISSION_TABLE, calculate_commission, calculate_commissions
+
+
+def _bits(value: float) -> bytes:
+    return struct.pack('<d', value)
+
+
+def _boundary_prices() -> list[float]:
+    prices = []
+    for segment in COMMISSION_TABLE:
+        for point in (segment.upper, segment.start):
+            if not math.isfinite(point) or point <= 0:
+                continue
+            prices += [point, math.nextafter(point, 0), math.nextafter(point, math.inf)]
+            prices += [point - epsilon for epsilon in (0.01, 0.5, 1)]
+            prices += [point + epsilon for epsilon in (0.01, 0.5, 1)]
+    return prices
+
+
+def _random_prices() -> list[float]:
+    rng = random.Random(20240101)
+    prices = [rng.uniform(0.01, 10_000_000) for _ in range(20_000)]
+    prices += [round(rng.uniform(1, 10_000_000), 2) for _ in range(20_000)]
+    prices += [float(rng.randrange(1, 10_000_000)) for _ in range(10_000)]
+    prices += [5e-324, 1e-9, 1.0, 1e12, 1e300]
+    return prices
+
+
+@pytest.mark.parametrize("prices", [_boundary_prices(), _random_prices()], ids=["boundaries", "random"])
+def test_vector_matches_scalar_bitwise(prices):
+    percents, amounts = calculate_commissions(prices)
+    for price, percent, amount in zip(prices, percents, amounts):
+        expected_percent, expected_amount = calculate_commission(price)
+        assert _bits(percent) == _bits(expected_percent), price
+        assert _bits(amount) == _bits(expected_amount), price
+
+
+def test_pure_python_fallback_matches_scalar(monkeypatch):
+    monkeypatch.setattr(commission, 'np', None)
+    prices = _boundary_prices()
+    percents, amounts = calculate_commissions(prices)
+    assert [_bits(value) for value in percents] == [_bits(calculate_commission(price)[0]) for price in prices]
+    assert [_bits(value) for value in amounts] == [_bits(calculate_commission(price)[1]) for price in prices]
+
+
+@pytest.mark.parametrize("price", [0.0, -1.0, math.nan, math.inf, -math.inf, None])
+def test_invalid_prices(price):
+    percents, amounts = calculate_commissions([price, 150000.0])
+    assert math.isnan(percents[0]) and math.isnan(amounts[0])
+    assert (percents[1], amounts[1]) == calculate_commission(150000.0)
+    if isinstance(price, float):
+        with pytest.raises(ValueError):
+            calculate_commission(price)
@@ -0,0 +1,40 @@
+import json
+
+from services.error_reports import error_fingerprint
+
+
+def _decode(text):
+    # Исключение выбрасывается внутри библиотеки (json), а не в коде проекта
+    return json.loads(text)
+
+
+def _capture(func):
+    try:
+        func()
+    except Exception as e:
+        return e
+    raise AssertionError("ожидалось исключение")
+
+
+def test_library_errors_from_different_call_sites_differ():
+    first = _capture(lambda: json.loads("{"))
+    second = _capture(lambda: json.loads("["))
+    assert error_fingerprint(first) != error_fingerprint(second)
+    assert error_fingerprint(first)[1].startswith("tests/test_error_reports.py:")
+
+
+def test_same_call_site_gives_same_fingerprint():
+    errors = [_capture(lambda text=text: _decode(text)) for text in ("{", "[", "x")]
+    fingerprints = {error_fingerprint(error) for error in errors}
+    assert len(fingerprints) == 1
+    assert "in _decode" in fingerprints.pop()[1]
+
+
+def test_error_without_project_frames_uses_raising_frame():
+    error = _capture(lambda: json.loads("{"))
+    error.__traceback__ = error.__traceback__.tb_next
+    while error.__traceback__ and "json" not in error.__traceback__.tb_frame.f_code.co_filename:
+        error.__traceback__ = error.__traceback__.tb_next
+    error_type, location = error_fingerprint(error)
+    assert error_type == "json.decoder.JSONDecodeError"
+    assert "json" in location
@@ -0,0 +1,108 @@
+import datetime
+import io
+import zipfile
+
+import pytest
+from openpyxl import Workbook, load_workbook
+
+from services import price_table
+from services.price_table import PriceTableError, calculate_price_file
+
+
+def _workbook(rows, number_format=None) -> bytes:
+    workbook = Workbook()
+    sheet = workbook.active
+    for row in rows:
+        sheet.append(row)
+    if number_format:
+        for row in sheet.iter_rows():
+            for cell in row:
+                if isinstance(cell.value, (int, float)) and not isinstance(cell.value, bool):
+                    cell.number_format = number_format
+    output = io.BytesIO()
+    workbook.save(output)
+    return output.getvalue()
+
+
+def _replace_in_sheet(data: bytes, old: bytes, new: bytes) -> bytes:
+    source = zipfile.ZipFile(io.BytesIO(data))
+    output = io.BytesIO()
+    with zipfile.ZipFile(output, 'w') as result:
+        for item in source.infolist():
+            content = source.read(item.filename)
+            if item.filename == 'xl/worksheets/sheet1.xml':
+                assert old in content
+                content = content.replace(old, new)
+            result.writestr(item, content)
+    return output.getvalue()
+
+
+def _commission_columns(rows, first_column: int) -> list[tuple]:
+    """Добавленные столбцы непустых строк; отсутствующие и пустые ячейки — None."""
+    columns = []
+    for row in rows:
+        if all(cell in (None, '') for cell in row):
+            continue
+        cells = list(row[first_column:first_column + 2]) + [None, None]
+        columns.append(tuple(cells[:2]))
+    return columns
+
+
+WORKBOOKS = {
+    # Без заголовка, первый столбец — дата: цена должна браться из второго
+    'date_first': _workbook([
+        [datetime.datetime(2024, 1, 1), 150000],
+        [datetime.datetime(2024, 1, 2), 2500000.5],
+        [datetime.datetime(2024, 1, 3), 'нет цены'],
+    ]),
+    'header': _workbook([
+        [None],
+        ['Товар', 'Описание', 'Цена'],
+        ['a', 'x', '1 234,50'],
+        [],
+        ['b', None, 99999.99],
+        ['c', None, -5],
+        ['d', None, 7000000],
+        ['e', 'x', None, None, True],
+    ]),
+    'no_header': _workbook([['n', 100], ['n', 2500.5], ['n', 'bad'], ['n', 70000]]),
+    # Цены с пользовательским форматом числа (не дата) остаются ценами
+    'styled_numbers': _workbook([['Цена'], [150000], [3100000]], number_format='#,##0.00 "₽"'),
+    # Столбец цены в формате даты: такие значения не цены ни в одном из путей
+    'dated_prices': _workbook([['Цена'], [45292], [150000]], number_format='dd.mm.yyyy'),
+}
+
+
+@pytest.mark.parametrize("name", WORKBOOKS)
+def test_fast_xlsx_matches_openpyxl(name):
+    data = WORKBOOKS[name]
+    result, calculated, skipped = price_table.calculate_xlsx(data)
+
+    table = price_table.read_xlsx(data)
+    expected_calculated = price_table.add_commission_columns(table)
+    assert (calculated, skipped) == (expected_calculated, len(table.data_rows) - expected_calculated)
+
+    fast_rows = [list(row) for row in load_workbook(io.BytesIO(result), read_only=True).active.iter_rows(values_only=True)]
+    first_column = len(table.rows[0]) - 2
+    assert _commission_columns(fast_rows, first_column) == _commission_columns(table.rows, first_column)
+
+
+def test_date_column_is_not_taken_for_price():
+    _, calculated, skipped = price_table.calculate_xlsx(WORKBOOKS['date_first'])
+    table = price_table.read_xlsx(WORKBOOKS['date_first'])
+    assert table.price_column == 1
+    assert (calculated, skipped) == (2, 1)
+
+
+@pytest.mark.parametrize("filename, data", [
+    ('bad_number.xlsx', _replace_in_sheet(WORKBOOKS['no_header'], b'<v>100</v>', b'<v>1.5e5x</v>')),
+    ('bad_shared_string.xlsx', _replace_in_sheet(
+        WORKBOOKS['no_header'], b'<c r="B1" t="n"><v>100</v></c>', b'<c r="B1" t="s"><v>99</v></c>'
+    )),
+    ('not_a_zip.xlsx', b'PK\x03\x04garbage'),
+    ('undecodable.csv', b'\x98\x98;1\n'),
+    ('prices.pdf', b'%PDF'),
+])
+def test_malformed_files_raise_price_table_error(filename, data):
+    with pytest.raises(PriceTableError):
+        calculate_price_file(data, filename)
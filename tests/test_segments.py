@@ -0,0 +1,130 @@
+from types import SimpleNamespace
+
+import pytest
+
+from services.segments import (
+    SegmentError, compile_segment, dump_segment, load_segment, parse_segment, required_channels,
+)
+
+A, B, C = -1001, -1002, -1003
+CHANNELS = {'A': A, 'B': B, 'C': C}
+USERS = range(1, 121)
+
+# Выражение -> ожидаемое множество получателей через операции над множествами Python
+CASES = [
+    ("A", lambda s: s.A),
+    ("A - B", lambda s: s.A - s.B),
+    ("A | B & C", lambda s: s.A | (s.B & s.C)),
+    ("(A | B) & C", lambda s: (s.A | s.B) & s.C),
+    ("A - B | C", lambda s: (s.A - s.B) | s.C),
+    ("A - (B | C)", lambda s: s.A - (s.B | s.C)),
+    ("A & B & C", lambda s: s.A & s.B & s.C),
+    ("!A", lambda s: s.ALL - s.A),
+    ("!A & !B", lambda s: (s.ALL - s.A) & (s.ALL - s.B)),
+    ("ALL - ANY", lambda s: s.ALL - s.ANY),
+    ("ANY - A", lambda s: s.ANY - s.A),
+    ("ALL", lambda s: s.ALL),
+    ("C & (A - B)", lambda s: s.C & (s.A - s.B)),
+]
+
+
+@pytest.fixture
+def audience(db):
+    """
+    Пользователи 1..120; A — четные, B — кратные 3, C — кратные 5.
+    Есть подписки пользователей, не запускавших бота: они в сегменты не попадают.
+    """
+    members = {
+        A: {u for u in USERS if u % 2 == 0},
+        B: {u for u in USERS if u % 3 == 0},
+        C: {u for u in USERS if u % 5 == 0},
+    }
+    for user_id in USERS:
+        db.add_user(user_id, f"user{user_id}", "Test")
+    for channel_id, user_ids in members.items():
+        for user_id in user_ids:
+            db.add_subscription(user_id, channel_id)
+    for user_id in (1000, 1001):
+        db.add_subscription(user_id, A)
+        db.add_subscription(user_id, C)
+    return SimpleNamespace(
+        A=members[A], B=members[B], C=members[C],
+        ALL=set(USERS), ANY=members[A] | members[B] | members[C],
+    )
+
+
+def _segment_users(db, segment, driver) -> list[int]:
+    """Получатели сегмента при заданном ведущем канале, постранично (как get_audience_page)."""
+    query, params, key = compile_segment(segment, driver)
+    result, after = [], 0
+    with db.db_connection() as conn:
+        while True:
+            page = [row[0] for row in conn.execute(
+                f"{query} AND {key} > ? ORDER BY {key} LIMIT ?", (*params, after, 7)
+            )]
+            if not page:
+                return result
+            result += page
+            after = page[-1]
+
+
+@pytest.mark.parametrize("text, expected", CASES)
+def test_segment_matches_set_operations(audience, db, text, expected):
+    target = dump_segment(parse_segment(text, CHANNELS))
+    users = [user_id for page in db.iter_audience(target, page_size=7) for user_id in page]
+    assert users == sorted(expected(audience))
+    assert db.get_audience_size(target) == len(expected(audience))
+
+
+@pytest.mark.parametrize("text, expected", CASES)
+def test_segment_same_result_for_every_driver(audience, db, text, expected):
+    segment = parse_segment(text, CHANNELS)
+    # Без ведущего канала и с каждым обязательным каналом результат один и тот же
+    for driver in [None, *required_channels(segment)]:
+        assert _segment_users(db, segment, driver) == sorted(expected(audience)), driver
+
+
+def test_driver_is_smallest_required_channel(audience, db):
+    segment = parse_segment("A & B & C", CHANNELS)
+    with db.db_connection() as conn:
+        _, params, _ = db._compile_audience_segment(conn.cursor(), dump_segment(segment))
+    # C (кратные 5) — самый маленький из трех каналов
+    assert params[0] == C
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("A", {A}),
+    ("A & B", {A, B}),
+    ("A | B", set()),
+    ("A & B | A & C", {A}),
+    ("(A | B) & C", {C}),
+    ("A - B", {A}),
+    ("!A", set()),
+    ("ALL - A", set()),
+    ("ANY & B", {B}),
+])
+def test_required_channels(text, expected):
+    assert required_channels(parse_segment(text, CHANNELS)) == expected
+
+
+@pytest.mark.parametrize("text, expected", [
+    # & связывает сильнее | и -, операции одного уровня — слева направо
+    ("A | B & C", ['or', ['channel', A], ['and', ['channel', B], ['channel', C]]]),
+    ("A - B | C", ['or', ['diff', ['channel', A], ['channel', B]], ['channel', C]]),
+    ("!A & B", ['and', ['diff', ['all'], ['channel', A]], ['channel', B]]),
+    # Кириллические буквы, похожие на латинские, и русские ключевые слова
+    ("А - В", ['diff', ['channel', A], ['channel', B]]),
+    ("с", ['channel', C]),
+    ("ВСЕ - ЛЮБОЙ", ['diff', ['all'], ['any']]),
+    ("all-any", ['diff', ['all'], ['any']]),
+])
+def test_parse_segment(text, expected):
+    segment = parse_segment(text, CHANNELS)
+    assert segment == expected
+    assert load_segment(dump_segment(segment)) == segment
+
+
+@pytest.mark.parametrize("text", ["", "   ", "A -", "(A | B", "A B", "D", "A $ B", "()", "A & | B"])
+def test_parse_segment_errors(text):
+    with pytest.raises(SegmentError):
+        parse_segment(text, CHANNELS)